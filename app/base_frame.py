@@ -1,5 +1,5 @@
 from PyQt6.QtWidgets import QWidget, QVBoxLayout
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QThread, pyqtSignal
 
 class BaseFrame(QWidget):
     def __init__(self, parent=None):
@@ -17,3 +17,20 @@ class BaseFrame(QWidget):
     def apply_styles(self):
         """Override this method to apply specific styles"""
         pass
+
+
+class PreflightThread(QThread):
+    """Runs a header-only preflight estimate off the GUI thread and emits its result (None when it failed)"""
+    estimated = pyqtSignal(object)
+
+    def __init__(self, estimate):
+        super().__init__()
+        self.estimate = estimate
+
+    def run(self):
+        try:
+            result = self.estimate()
+        except Exception:
+            # Unreadable inputs are reported by the conversion itself
+            result = None
+        self.estimated.emit(result)
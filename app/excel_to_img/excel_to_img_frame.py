@@ -4,8 +4,7 @@ from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdi
                              QProgressDialog, QCheckBox)
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
 
-from app.base_frame import BaseFrame
-from core.excel_to_img import excel_to_img
+from app.base_frame import BaseFrame, PreflightThread
 
 class ExcelToImgFrame(BaseFrame):
     def __init__(self, parent=None):
@@ -32,9 +31,13 @@ class ExcelToImgFrame(BaseFrame):
         form_layout.addRow("Excel 文件:", file_layout)
         
         # 2. Sheet Selection
+        sheet_layout = QHBoxLayout()
         self.sheet_combo = QComboBox()
         self.sheet_combo.currentIndexChanged.connect(self.on_sheet_selected)
-        form_layout.addRow("选择 Sheet:", self.sheet_combo)
+        sheet_layout.addWidget(self.sheet_combo, 1)
+        self.row_count_label = QLabel("")
+        sheet_layout.addWidget(self.row_count_label)
+        form_layout.addRow("选择 Sheet:", sheet_layout)
         
         # 3. Naming Field (Mandatory)
         naming_layout = QHBoxLayout()
@@ -46,6 +49,11 @@ class ExcelToImgFrame(BaseFrame):
         self.group_checkbox = QCheckBox("是否分组")
         self.group_checkbox.setChecked(False) # Default No
         form_layout.addRow("", self.group_checkbox)
+
+        # Incremental mode: skip rows whose image is already up to date
+        self.incremental_checkbox = QCheckBox("增量生成（跳过未变化的行）")
+        self.incremental_checkbox.setChecked(False)
+        form_layout.addRow("", self.incremental_checkbox)
         
         # 5. Shared Directory
         share_layout = QHBoxLayout()
@@ -58,6 +66,13 @@ class ExcelToImgFrame(BaseFrame):
         share_layout.addWidget(self.select_share_btn)
         
         form_layout.addRow("共享目录:", share_layout)
+
+        # How shared files are placed into each group folder
+        self.share_strategy_combo = QComboBox()
+        for label, key in (("自动（优先链接）", "auto"), ("写时复制 (reflink)", "reflink"),
+                           ("硬链接", "hardlink"), ("符号链接", "symlink"), ("复制", "copy")):
+            self.share_strategy_combo.addItem(label, key)
+        form_layout.addRow("共享方式:", self.share_strategy_combo)
         
         self.layout.addLayout(form_layout)
         
@@ -87,6 +102,8 @@ class ExcelToImgFrame(BaseFrame):
         
         # Load Sheets
         try:
+            # pandas is only loaded once the first workbook is opened
+            from core.excel_to_img import excel_to_img
             sheets = excel_to_img.get_excel_sheets(filepath)
             self.sheet_combo.clear()
             self.sheet_combo.addItems(sheets)
@@ -107,9 +124,14 @@ class ExcelToImgFrame(BaseFrame):
             return
             
         try:
+            from core.excel_to_img import excel_to_img
+
+            # Header and row count come from the workbook parsed once in get_excel_sheets
             columns = excel_to_img.get_sheet_columns(excel_path, sheet_name)
             self.naming_combo.clear()
-            self.naming_combo.addItems(columns)
+            self.naming_combo.addItems([str(c) for c in columns])
+            row_count = excel_to_img.get_sheet_row_count(excel_path, sheet_name)
+            self.row_count_label.setText(f"共 {row_count} 行" if row_count is not None else "")
         except Exception as e:
             QMessageBox.critical(self, "错误", f"读取 Sheet 列名失败:\n{str(e)}")
 
@@ -140,22 +162,61 @@ class ExcelToImgFrame(BaseFrame):
             return
 
         is_grouped = self.group_checkbox.isChecked()
+        incremental = self.incremental_checkbox.isChecked()
+        share_strategy = self.share_strategy_combo.currentData()
         group_field = naming_field if is_grouped else None
             
         share_dir = self.share_dir_input.text()
         if not share_dir:
             share_dir = None
-            
+
         self.generate_btn.setEnabled(False)
         self.generate_btn.setText("生成中...")
         
-        # Create indeterminate progress dialog
-        self.progress = QProgressDialog("正在生成图片，请稍候...", "取消", 0, 0, self)
+        # Create progress dialog
+        self.progress = QProgressDialog("正在预检...", "取消", 0, 100, self)
         self.progress.setWindowModality(Qt.WindowModality.WindowModal)
         self.progress.setCancelButton(None) # Disable cancel for now as backend might not support it
         self.progress.show()
-        
-        self.thread = GenerateThread(excel_path, sheet_name, output_dir, naming_field, is_grouped, share_dir)
+
+        def estimate():
+            from core.common.preflight import fits_in_memory
+            from core.excel_to_img.preflight import preflight_excel
+            report = preflight_excel(excel_path, sheet_name)
+            peak = report.peak_rss_bytes(streaming=False, workers=None)
+            if not fits_in_memory(peak) and report.supports_streaming:
+                return True, report.peak_rss_bytes(streaming=True, workers=None)
+            return False, peak
+
+        # Header-only estimate: fall back to streaming reads when the whole sheet would not fit in memory.
+        # Reading the sheet header can be slow for large workbooks, so it runs off the GUI thread
+        self.preflight_thread = PreflightThread(estimate)
+        self.preflight_thread.estimated.connect(
+            lambda result: self.start_generate(result, excel_path, sheet_name, output_dir, naming_field, is_grouped,
+                                               share_dir, incremental, share_strategy))
+        self.preflight_thread.start()
+
+    def start_generate(self, result, excel_path, sheet_name, output_dir, naming_field, is_grouped, share_dir,
+                       incremental, share_strategy):
+        from core.common.preflight import fits_in_memory, format_bytes
+
+        # Unreadable workbooks are reported by the generation itself
+        streaming, peak = result or (False, None)
+        if peak is not None and not fits_in_memory(peak):
+            answer = QMessageBox.question(
+                self, "内存可能不足",
+                f"预计需要约 {format_bytes(peak)} 内存，超过当前可用内存。是否仍然继续？")
+            if answer != QMessageBox.StandardButton.Yes:
+                self.progress.close()
+                self.generate_btn.setEnabled(True)
+                self.generate_btn.setText("生成图片")
+                return
+        self.progress.setLabelText("正在生成图片，请稍候...")
+
+        self.thread = GenerateThread(excel_path, sheet_name, output_dir, naming_field, is_grouped, share_dir,
+                                     incremental, share_strategy, streaming)
+        self.thread.progress_updated.connect(self.progress.setValue)
+        self.thread.status_updated.connect(self.progress.setLabelText)
         self.thread.finished_signal.connect(self.on_finished)
         self.thread.error_signal.connect(self.on_error)
         self.thread.start()
@@ -173,10 +234,13 @@ class ExcelToImgFrame(BaseFrame):
         QMessageBox.critical(self, "错误", f"生成图片失败:\n{msg}")
 
 class GenerateThread(QThread):
+    progress_updated = pyqtSignal(int)
+    status_updated = pyqtSignal(str)
     finished_signal = pyqtSignal()
     error_signal = pyqtSignal(str)
     
-    def __init__(self, excel_path, sheet_name, output_dir, naming_field, is_grouped, share_dir):
+    def __init__(self, excel_path, sheet_name, output_dir, naming_field, is_grouped, share_dir, incremental=False,
+                 share_strategy='auto', streaming=False):
         super().__init__()
         self.excel_path = excel_path
         self.sheet_name = sheet_name
@@ -184,16 +248,30 @@ class GenerateThread(QThread):
         self.naming_field = naming_field
         self.is_grouped = is_grouped
         self.share_dir = share_dir
+        self.incremental = incremental
+        self.share_strategy = share_strategy
+        self.streaming = streaming
         
     def run(self):
         try:
+            def callback(value, msg):
+                self.progress_updated.emit(value)
+                self.status_updated.emit(msg)
+
+            from core.excel_to_img import excel_to_img
             excel_to_img.generate_images(
                 excel_path=self.excel_path,
                 sheet_name=self.sheet_name,
                 output_dir=self.output_dir,
                 naming_field=self.naming_field,
                 is_grouped=self.is_grouped,
-                share_dir=self.share_dir
+                share_dir=self.share_dir,
+                # Render batches are admitted by the process-wide scheduler shared with other jobs
+                workers=None,
+                progress_callback=callback,
+                incremental=self.incremental,
+                share_strategy=self.share_strategy,
+                streaming=self.streaming,
             )
             self.finished_signal.emit()
         except Exception as e:
@@ -3,28 +3,41 @@ from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdi
                              QPushButton, QTreeWidget, QTreeWidgetItem, QHeaderView, 
                              QComboBox, QFileDialog, QMessageBox, QSplitter, QFrame,
                              QAbstractItemView, QDialog, QFormLayout, QDialogButtonBox,
-                             QProgressDialog, QSizePolicy)
-from PyQt6.QtCore import Qt, QSize, QThread, pyqtSignal
-from PyQt6.QtGui import QPixmap, QImage, QAction, QDragEnterEvent, QDropEvent
+                             QProgressDialog, QSizePolicy, QCheckBox)
+from PyQt6.QtCore import Qt, QSize, QThread, QObject, QTimer, pyqtSignal
+from PyQt6.QtGui import QPixmap, QImage, QIcon, QAction, QDragEnterEvent, QDropEvent
 from PIL import Image
+from PIL.ImageQt import ImageQt
 
-from app.base_frame import BaseFrame
+from app.base_frame import BaseFrame, PreflightThread
+from core.common.thumbnail_service import ThumbnailService, PRIORITY_SELECTED, PRIORITY_VISIBLE
+from core.config import (PREVIEW_SIZE, THUMBNAIL_SIZE, TIF_COLOR_MODE_OPTIONS, TIF_COMPRESSION_OPTIONS,
+                         TIF_TILE_SIZE_OPTIONS)
+from core.common.preflight import fits_in_memory, format_bytes
 from core.image_to_tif import image_to_tif
+from core.image_to_tif.page_cache import get_page_cache
+
+
+class ThumbnailBridge(QObject):
+    """Forwards ThumbnailService callbacks from its worker threads to the GUI thread"""
+    ready = pyqtSignal(object, object, object)
+
+    def __call__(self, request, image, error):
+        self.ready.emit(request, image, error)
+
 
 class ImageToTifFrame(BaseFrame):
-    COMPRESSION_OPTIONS = {
-        "raw": "Raw (无压缩) - 速度快，文件大",
-        "lzw": "LZW (无损) - 适用于线条图、文本",
-        "jpeg": "JPEG (有损) - 适用于照片，可调质量",
-        "deflate": "Deflate (无损) - 通用压缩，效果好",
-        "packbits": "PackBits (无损) - 适用于重复数据",
-        "tiff_adobe_deflate": "Adobe Deflate (无损) - 兼容性更好的Deflate",
-        "ccittfax4": "CCITT Fax4 (无损) - 适用于黑白图像"
-    }
+    COMPRESSION_OPTIONS = TIF_COMPRESSION_OPTIONS
 
     def __init__(self, parent=None):
         self.image_paths = []
+        self.preview_pixmap = None
+        self.preview_request = None
+        self.icon_requests = {}  # path -> pending list thumbnail request
+        self.thumbnail_service = ThumbnailService()
+        self.thumbnail_bridge = ThumbnailBridge()
         super().__init__(parent)
+        self.thumbnail_bridge.ready.connect(self.on_thumbnail_ready)
 
     def setup_ui(self):
         # Top Area: Directory Selection
@@ -59,6 +72,8 @@ class ImageToTifFrame(BaseFrame):
         self.tree_widget.setAcceptDrops(True)
         self.tree_widget.setDragDropMode(QAbstractItemView.DragDropMode.InternalMove)
         self.tree_widget.itemSelectionChanged.connect(self.on_selection_changed)
+        self.tree_widget.setIconSize(QSize(48, 48))
+        self.tree_widget.verticalScrollBar().valueChanged.connect(self.request_visible_thumbnails)
         
         list_layout.addWidget(self.tree_widget)
         splitter.addWidget(list_container)
@@ -121,6 +136,11 @@ class ImageToTifFrame(BaseFrame):
             QMessageBox.critical(self, "错误", str(e))
 
     def update_tree_view(self):
+        # Drop everything queued for the previous folder
+        self.thumbnail_service.cancel_all()
+        self.icon_requests.clear()
+        self.preview_request = None
+
         self.tree_widget.clear()
         for i, path in enumerate(self.image_paths, 1):
             filename = os.path.basename(path)
@@ -128,6 +148,37 @@ class ImageToTifFrame(BaseFrame):
             item.setData(0, Qt.ItemDataRole.UserRole, path) # Store full path
             self.tree_widget.addTopLevelItem(item)
 
+        # Wait for the layout pass so visible_items() sees the real viewport
+        QTimer.singleShot(0, self.request_visible_thumbnails)
+
+    def visible_items(self):
+        viewport_rect = self.tree_widget.viewport().rect()
+        item = self.tree_widget.itemAt(viewport_rect.topLeft())
+        while item is not None and self.tree_widget.visualItemRect(item).top() <= viewport_rect.bottom():
+            yield item
+            item = self.tree_widget.itemBelow(item)
+
+    def find_item(self, path):
+        for i in range(self.tree_widget.topLevelItemCount()):
+            item = self.tree_widget.topLevelItem(i)
+            if item.data(0, Qt.ItemDataRole.UserRole) == path:
+                return item
+        return None
+
+    def request_visible_thumbnails(self):
+        """Queue list thumbnails for the rows on screen and cancel the ones scrolled away"""
+        visible_paths = set()
+        for item in self.visible_items():
+            path = item.data(0, Qt.ItemDataRole.UserRole)
+            visible_paths.add(path)
+            if item.icon(1).isNull() and path not in self.icon_requests:
+                self.icon_requests[path] = self.thumbnail_service.request(
+                    path, THUMBNAIL_SIZE, self.thumbnail_bridge, priority=PRIORITY_VISIBLE)
+
+        for path in list(self.icon_requests):
+            if path not in visible_paths:
+                self.thumbnail_service.cancel(self.icon_requests.pop(path))
+
     def on_selection_changed(self):
         selected_items = self.tree_widget.selectedItems()
         if not selected_items:
@@ -136,26 +187,48 @@ class ImageToTifFrame(BaseFrame):
         item = selected_items[0]
         path = item.data(0, Qt.ItemDataRole.UserRole)
         
-        # Preview image
-        try:
-            # We can use QPixmap directly or PIL
-            pixmap = QPixmap(path)
+        # Preview image, decoded in the background at PREVIEW_SIZE (also handles PDFs)
+        if self.preview_request is not None:
+            self.thumbnail_service.cancel(self.preview_request)
+        self.preview_pixmap = None
+        self.preview_label.setPixmap(QPixmap())
+        self.preview_label.setText("加载中...")
+        self.preview_request = self.thumbnail_service.request(
+            path, PREVIEW_SIZE, self.thumbnail_bridge, priority=PRIORITY_SELECTED)
+
+    def on_thumbnail_ready(self, request, image, error):
+        if request is self.preview_request:
+            self.preview_request = None
+            if error is not None:
+                self.preview_label.setText(f"预览错误: {error}")
+                return
+            pixmap = QPixmap.fromImage(ImageQt(image))
             if not pixmap.isNull():
-                # Scale to fit label
-                scaled_pixmap = pixmap.scaled(self.preview_label.size(), 
-                                              Qt.AspectRatioMode.KeepAspectRatio, 
-                                              Qt.TransformationMode.SmoothTransformation)
-                self.preview_label.setPixmap(scaled_pixmap)
-                self.preview_label.setText("")
+                self.preview_pixmap = pixmap
+                self.show_preview()
             else:
                 self.preview_label.setText("无法加载预览")
-        except Exception as e:
-            self.preview_label.setText(f"预览错误: {e}")
+        elif self.icon_requests.get(request.path) is request:
+            del self.icon_requests[request.path]
+            item = self.find_item(request.path)
+            if item is not None and error is None:
+                item.setIcon(1, QIcon(QPixmap.fromImage(ImageQt(image))))
+
+    def show_preview(self):
+        if self.preview_pixmap is None:
+            return
+        # Scale to fit label
+        scaled_pixmap = self.preview_pixmap.scaled(self.preview_label.size(), 
+                                                   Qt.AspectRatioMode.KeepAspectRatio, 
+                                                   Qt.TransformationMode.SmoothTransformation)
+        self.preview_label.setPixmap(scaled_pixmap)
+        self.preview_label.setText("")
 
     def resizeEvent(self, event):
-        # Update preview when resized
+        # Only rescale the cached preview when resized, never re-decode the file
         super().resizeEvent(event)
-        self.on_selection_changed()
+        self.show_preview()
+        self.request_visible_thumbnails()
 
     def get_ordered_image_paths(self):
         paths = []
@@ -186,7 +259,8 @@ class ImageToTifFrame(BaseFrame):
             params = dialog.get_params()
             self.do_save_tif(compression_key, **params)
 
-    def do_save_tif(self, compression_key, dpi, jpeg_quality):
+    def do_save_tif(self, compression_key, dpi, jpeg_quality, tile_size=None, color_mode='rgb',
+                    jpeg_passthrough=True, use_page_cache=False):
         default_filename = ""
         directory = self.path_entry.text()
         if directory:
@@ -197,12 +271,52 @@ class ImageToTifFrame(BaseFrame):
             return
 
         # Create progress dialog
-        progress = QProgressDialog("正在处理...", "取消", 0, 100, self)
+        progress = QProgressDialog("正在预检...", "取消", 0, 100, self)
         progress.setWindowModality(Qt.WindowModality.WindowModal)
         progress.show()
 
+        image_paths = list(self.image_paths)
+
+        def estimate():
+            from core.image_to_tif.preflight import preflight_tif
+            report = preflight_tif(image_paths, dpi=dpi, color_mode=color_mode)
+            return (report.peak_rss_bytes(compression_key, workers=None, tile_size=tile_size,
+                                          jpeg_passthrough=jpeg_passthrough),
+                    report.output_bytes(compression_key, jpeg_passthrough))
+
+        # Header-only estimate, so a job that cannot fit in memory is flagged before anything is decoded;
+        # it opens every input, which can take a while for many large PDFs, so it runs off the GUI thread
+        self.preflight_thread = PreflightThread(estimate)
+        self.preflight_thread.estimated.connect(
+            lambda result: self.start_save(result, progress, image_paths, filepath, compression_key, dpi,
+                                           jpeg_quality, tile_size, color_mode, jpeg_passthrough, use_page_cache))
+        self.preflight_thread.start()
+
+    def start_save(self, result, progress, image_paths, filepath, compression_key, dpi, jpeg_quality, tile_size,
+                   color_mode, jpeg_passthrough, use_page_cache):
+        # Unreadable inputs are reported by the save itself
+        peak, output_bytes = result or (None, None)
+        if peak is not None and not fits_in_memory(peak):
+            answer = QMessageBox.question(
+                self, "内存可能不足",
+                f"预计需要约 {format_bytes(peak)} 内存，超过当前可用内存。\n"
+                f"可以选择分块写入或减少页面数量后再保存。是否仍然继续？")
+            if answer != QMessageBox.StandardButton.Yes:
+                progress.close()
+                return
+        progress.setLabelText("正在处理...")
+
+        # The page cache writes every encoded page a second time, so it is opt-in and skipped for outputs
+        # that would not fit in its budget (they would only evict everything else)
+        page_cache = None
+        if use_page_cache:
+            page_cache = get_page_cache()
+            if output_bytes is not None and output_bytes > page_cache.max_bytes:
+                page_cache = None
+
         # Run in thread to avoid freezing UI
-        self.thread = SaveThread(self.image_paths, filepath, compression_key, dpi, jpeg_quality)
+        self.thread = SaveThread(image_paths, filepath, compression_key, dpi, jpeg_quality, tile_size,
+                                 color_mode, jpeg_passthrough, page_cache)
         self.thread.progress_updated.connect(progress.setValue)
         self.thread.status_updated.connect(progress.setLabelText)
         self.thread.finished_signal.connect(lambda msg: self.on_save_finished(msg, progress))
@@ -224,7 +338,7 @@ class CompressionParamDialog(QDialog):
         super().__init__(parent)
         self.compression_key = compression_key
         self.setWindowTitle("参数设置")
-        self.setFixedSize(300, 150)
+        self.setFixedSize(400, 305 if compression_key == "jpeg" else 265)
         self.setup_ui()
 
     def setup_ui(self):
@@ -236,9 +350,31 @@ class CompressionParamDialog(QDialog):
         layout.addRow("DPI:", self.dpi_input)
         
         self.jpeg_quality_input = None
+        self.jpeg_passthrough_check = None
         if self.compression_key == "jpeg":
             self.jpeg_quality_input = QLineEdit("75")
             layout.addRow("JPEG 质量 (1-100):", self.jpeg_quality_input)
+            # Embedding source JPEGs as-is avoids a lossy second compression; quality only applies to other pages
+            self.jpeg_passthrough_check = QCheckBox("原始 JPEG 直接写入（不重新压缩）")
+            self.jpeg_passthrough_check.setChecked(True)
+            layout.addRow("", self.jpeg_passthrough_check)
+
+        # Keeping bilevel / grayscale scans in their own mode avoids inflating them to RGB
+        self.color_mode_combo = QComboBox()
+        for key, desc in TIF_COLOR_MODE_OPTIONS.items():
+            self.color_mode_combo.addItem(desc, key)
+        layout.addRow("色彩模式:", self.color_mode_combo)
+
+        # Tiled output lets viewers decode only the visible region of very large pages
+        self.tile_size_combo = QComboBox()
+        for size, desc in TIF_TILE_SIZE_OPTIONS.items():
+            self.tile_size_combo.addItem(desc, size)
+        layout.addRow("分块:", self.tile_size_combo)
+
+        # Reusing encoded pages speeds up re-saving a reordered list, at the cost of writing each page twice
+        self.page_cache_check = QCheckBox("缓存已编码页面（调整顺序后再次保存更快）")
+        self.page_cache_check.setChecked(False)
+        layout.addRow("", self.page_cache_check)
 
         buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
         buttons.accepted.connect(self.accept)
@@ -262,9 +398,14 @@ class CompressionParamDialog(QDialog):
         super().accept()
 
     def get_params(self):
-        params = {"dpi": int(self.dpi_input.text()), "jpeg_quality": None}
+        params = {"dpi": int(self.dpi_input.text()), "jpeg_quality": None,
+                  "tile_size": self.tile_size_combo.currentData(),
+                  "color_mode": self.color_mode_combo.currentData(),
+                  "use_page_cache": self.page_cache_check.isChecked()}
         if self.jpeg_quality_input:
             params["jpeg_quality"] = int(self.jpeg_quality_input.text())
+        if self.jpeg_passthrough_check:
+            params["jpeg_passthrough"] = self.jpeg_passthrough_check.isChecked()
         return params
 
 class SaveThread(QThread):
@@ -273,13 +414,18 @@ class SaveThread(QThread):
     finished_signal = pyqtSignal(str)
     error_signal = pyqtSignal(str)
 
-    def __init__(self, image_paths, filepath, compression, dpi, jpeg_quality):
+    def __init__(self, image_paths, filepath, compression, dpi, jpeg_quality, tile_size=None, color_mode='rgb',
+                 jpeg_passthrough=True, page_cache=None):
         super().__init__()
         self.image_paths = image_paths
         self.filepath = filepath
         self.compression = compression
         self.dpi = dpi
         self.jpeg_quality = jpeg_quality
+        self.tile_size = tile_size
+        self.color_mode = color_mode
+        self.jpeg_passthrough = jpeg_passthrough
+        self.page_cache = page_cache
 
     def run(self):
         try:
@@ -293,7 +439,17 @@ class SaveThread(QThread):
                 compression=self.compression, 
                 dpi=self.dpi,
                 jpeg_quality=self.jpeg_quality, 
-                progress_callback=callback
+                progress_callback=callback,
+                # Page decodes are admitted by the process-wide scheduler, so saves running
+                # alongside other jobs share one memory budget instead of each loading freely
+                workers=None,
+                # When enabled, pages that were only reordered or kept are copied from the encoded page cache
+                page_cache=self.page_cache,
+                tile_size=self.tile_size,
+                # Switches to BigTIFF automatically when the output may exceed 4 GB
+                bigtiff='auto',
+                color_mode=self.color_mode,
+                jpeg_passthrough=self.jpeg_passthrough,
             )
             self.finished_signal.emit("TIF 文件已保存成功！")
         except Exception as e:
@@ -1,9 +1,23 @@
+import importlib
+import json
+import os
 import sys
+import threading
+import time
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QListWidget, QStackedWidget, QLabel, QListWidgetItem)
-from PyQt6.QtCore import Qt, QSize
+from PyQt6.QtCore import Qt, QSize, QTimer
 from PyQt6.QtGui import QIcon, QFont
 
+# Heavy libraries that are preloaded in the background once the window is visible,
+# so the first conversion does not pay for importing them
+WARM_UP_MODULES = ("fitz", "pandas", "core.excel_to_img.excel_to_img")
+WARM_UP_DELAY_MS = 1000
+
+# When set to a file path, run_app records when the first window is up into that file and exits.
+# Used by benchmarks/startup.py, and works the same for the packaged executable.
+STARTUP_PROBE_ENV = "IMAGE_UTILS_STARTUP_PROBE"
+
 # Import frames (we will create these next)
 # from app.image_to_tif.image_to_tif_frame import ImageToTifFrame
 # from app.excel_to_img.excel_to_img_frame import ExcelToImgFrame
@@ -61,6 +75,8 @@ class MainWindow(QMainWindow):
         self.content_area = QStackedWidget()
         self.content_area.setObjectName("contentArea")
         main_layout.addWidget(self.content_area)
+        # Page index -> factory for pages that have not been opened yet
+        self.page_factories = {}
 
         # Apply Styles
         self.apply_styles()
@@ -72,7 +88,14 @@ class MainWindow(QMainWindow):
         self.move(qr.topLeft())
 
     def add_page(self, widget, name, icon_name=None):
-        """Add a page to the application"""
+        """
+        Add a page to the application.
+        widget may also be a callable returning the page; it is then created the first time
+        the page is opened, so its imports are not paid for at startup.
+        """
+        if not isinstance(widget, QWidget):
+            self.page_factories[self.content_area.count()] = widget
+            widget = QWidget()
         self.content_area.addWidget(widget)
         item = QListWidgetItem(name)
         item.setSizeHint(QSize(0, 50))
@@ -82,8 +105,19 @@ class MainWindow(QMainWindow):
         self.nav_list.addItem(item)
 
     def switch_page(self, index):
+        self.ensure_page(index)
         self.content_area.setCurrentIndex(index)
 
+    def ensure_page(self, index):
+        """Replace the placeholder at index with the real page if it has not been created yet"""
+        factory = self.page_factories.pop(index, None)
+        if factory is None:
+            return
+        placeholder = self.content_area.widget(index)
+        self.content_area.insertWidget(index, factory())
+        self.content_area.removeWidget(placeholder)
+        placeholder.deleteLater()
+
     def apply_styles(self):
         style_sheet = """
         QMainWindow {
@@ -197,7 +231,37 @@ class MainWindow(QMainWindow):
         """
         self.setStyleSheet(style_sheet)
 
-def run_app():
+def create_image_to_tif_frame():
+    from app.image_to_tif.image_to_tif_frame import ImageToTifFrame
+    return ImageToTifFrame()
+
+
+def create_excel_to_img_frame():
+    from app.excel_to_img.excel_to_img_frame import ExcelToImgFrame
+    return ExcelToImgFrame()
+
+
+def warm_up(modules=WARM_UP_MODULES):
+    """Import heavy modules in a background thread; failures are ignored and resurface on real use"""
+    def run():
+        for name in modules:
+            try:
+                importlib.import_module(name)
+            except Exception:
+                pass
+
+    thread = threading.Thread(target=run, daemon=True, name="warm-up")
+    thread.start()
+    return thread
+
+
+def finish_startup_probe(app, probe_path):
+    with open(probe_path, "w", encoding="utf-8") as f:
+        json.dump({"shown_at": time.time(), "modules": len(sys.modules)}, f)
+    app.quit()
+
+
+def run_app(warm_up_imports=True):
     app = QApplication(sys.argv)
     
     # Set default font
@@ -208,16 +272,19 @@ def run_app():
     
     window = MainWindow()
     
-    # Import and add pages here to avoid circular imports during class definition
-    from app.image_to_tif.image_to_tif_frame import ImageToTifFrame
-    from app.excel_to_img.excel_to_img_frame import ExcelToImgFrame
-    
-    window.add_page(ImageToTifFrame(), "影像转 TIF")
-    window.add_page(ExcelToImgFrame(), "Excel 转图片")
+    # Pages are created (and their modules imported) when first opened
+    window.add_page(create_image_to_tif_frame, "影像转 TIF")
+    window.add_page(create_excel_to_img_frame, "Excel 转图片")
     
     # Select first page
     if window.nav_list.count() > 0:
         window.nav_list.setCurrentRow(0)
         
     window.show()
+    probe_path = os.environ.get(STARTUP_PROBE_ENV)
+    if probe_path:
+        # Fires once the event loop has processed the first show
+        QTimer.singleShot(0, lambda: finish_startup_probe(app, probe_path))
+    elif warm_up_imports:
+        QTimer.singleShot(WARM_UP_DELAY_MS, warm_up)
     sys.exit(app.exec())
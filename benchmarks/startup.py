@@ -0,0 +1,199 @@
+"""
+启动性能基准：
+
+    python -m benchmarks.startup                      # 从源码启动 main.py
+    python -m benchmarks.startup --executable dist/ImageUtils
+    python -m benchmarks.startup --compare benchmarks/results/startup-abc1234.json
+
+记录三项数据并保存为 JSON（默认 benchmarks/results/startup-<commit>.json）：
+- import_time：启动过程中每个模块的导入耗时（python -X importtime），以及 KEY_MODULES
+  在新解释器中各自的导入耗时，仅源码模式
+- first_window：从启动进程到主窗口显示完成的时间，使用 Qt offscreen 平台，无需显示器
+- cold / warm：cold 为使用全新的字节码缓存目录（PYTHONPYCACHEPREFIX）的首次启动，
+  需要重新编译所有模块；warm 为之后复用该缓存的多次启动。Linux 下以 root 运行并指定
+  --drop-caches 时，每次冷启动前还会清空系统页缓存，更接近开机后的首次启动。
+打包后的程序通过 IMAGE_UTILS_STARTUP_PROBE 环境变量同样支持 first_window 测量，
+此时 cold 只在指定 --drop-caches 时有意义。
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import ROOT, environment, load_results, median, save_results
+
+STARTUP_PROBE_ENV = "IMAGE_UTILS_STARTUP_PROBE"
+
+# 单独统计导入耗时的模块：GUI 入口、命令行入口、两个转换模块和它们依赖的重量级库
+KEY_MODULES = ('app.main_window', 'core.cli', 'core.image_to_tif.image_to_tif',
+               'core.excel_to_img.excel_to_img', 'fitz', 'pandas')
+
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+
+def parse_importtime(stderr: str) -> list:
+    """
+    解析 -X importtime 的输出，返回 [{'module', 'self_us', 'cumulative_us', 'depth'}]，
+    顺序与输出一致（子模块在父模块之前）。
+    """
+    modules = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({
+                'module': name,
+                'self_us': int(self_us),
+                'cumulative_us': int(cumulative_us),
+                # 输出中每一级嵌套缩进两个空格
+                'depth': (len(indent) - 1) // 2,
+            })
+    return modules
+
+
+def module_import_time(module: str) -> int:
+    """在新的解释器中导入 module，返回其累计导入耗时（微秒）"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    for entry in reversed(parse_importtime(result.stderr)):
+        if entry['module'] == module:
+            return entry['cumulative_us']
+    # 已在解释器启动时导入的模块不会出现在输出中
+    return 0
+
+
+def _probe_env(probe_path, platform_name, pycache_prefix=None):
+    env = dict(os.environ)
+    env[STARTUP_PROBE_ENV] = probe_path
+    env['QT_QPA_PLATFORM'] = platform_name
+    if pycache_prefix:
+        env['PYTHONPYCACHEPREFIX'] = pycache_prefix
+        # 冷启动生成的字节码需要写入缓存目录，热启动才能复用
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+    return env
+
+
+def _app_command(executable=None, importtime=False):
+    if executable:
+        return [executable]
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    return command + [os.path.join(ROOT, 'main.py')]
+
+
+def run_startup(executable=None, platform_name='offscreen', pycache_prefix=None, importtime=False,
+                timeout=60) -> dict:
+    """
+    启动一次应用，等待主窗口显示后自动退出。
+    返回 {'first_window_s', 'exit_s', 'modules', 'stderr'}：first_window_s 为进程启动到窗口显示的时间。
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        probe_path = os.path.join(tmp_dir, 'probe.json')
+        started_at = time.time()
+        started = time.perf_counter()
+        result = subprocess.run(_app_command(executable, importtime), cwd=ROOT, capture_output=True, text=True,
+                                env=_probe_env(probe_path, platform_name, pycache_prefix), timeout=timeout)
+        exit_s = time.perf_counter() - started
+        if not os.path.exists(probe_path):
+            raise RuntimeError(f"应用未能显示主窗口 (exit {result.returncode}):\n{result.stderr[-2000:]}")
+        probe = load_results(probe_path)
+
+    return {
+        'first_window_s': round(probe['shown_at'] - started_at, 4),
+        'exit_s': round(exit_s, 4),
+        'modules': probe['modules'],
+        'stderr': result.stderr,
+    }
+
+
+def drop_page_cache() -> bool:
+    """清空 Linux 页缓存，需要 root 权限；不支持时返回 False"""
+    try:
+        os.sync()
+        with open('/proc/sys/vm/drop_caches', 'w') as f:
+            f.write('3\n')
+        return True
+    except OSError:
+        return False
+
+
+def measure(executable=None, runs=5, platform_name='offscreen', drop_caches=False, top=30) -> dict:
+    results = {'environment': environment(), 'target': executable or 'main.py', 'platform': platform_name}
+
+    with tempfile.TemporaryDirectory() as pycache_prefix:
+        if drop_caches:
+            results['page_cache_dropped'] = drop_page_cache()
+        cold = run_startup(executable, platform_name, pycache_prefix)
+        warm = [run_startup(executable, platform_name, pycache_prefix) for _ in range(runs)]
+
+    results['first_window'] = {
+        'cold_s': cold['first_window_s'],
+        'warm_s': [run['first_window_s'] for run in warm],
+        'warm_median_s': median([run['first_window_s'] for run in warm]),
+        'modules_loaded': cold['modules'],
+    }
+
+    if not executable:
+        # 单独启动一次统计导入耗时，-X importtime 本身会拖慢启动，不计入上面的时间
+        modules = parse_importtime(run_startup(None, platform_name, importtime=True)['stderr'])
+        top_level = [m for m in modules if m['depth'] == 0]
+        results['import_time'] = {
+            'total_us': sum(m['cumulative_us'] for m in top_level),
+            'module_count': len(modules),
+            'top_cumulative': sorted(top_level, key=lambda m: m['cumulative_us'], reverse=True)[:top],
+            'top_self': sorted(modules, key=lambda m: m['self_us'], reverse=True)[:top],
+            'key_modules_us': {name: module_import_time(name) for name in KEY_MODULES},
+        }
+    return results
+
+
+def compare(current: dict, baseline: dict) -> list:
+    """返回可读的对比结果行：启动时间和顶层模块导入耗时的变化"""
+    lines = [f"基准: {baseline['environment']['commit']}  当前: {current['environment']['commit']}"]
+    for key in ('cold_s', 'warm_median_s'):
+        old, new = baseline['first_window'][key], current['first_window'][key]
+        lines.append(f"first_window.{key}: {old:.3f}s -> {new:.3f}s ({(new - old) / old * 100:+.1f}%)")
+
+    if 'import_time' in current and 'import_time' in baseline:
+        old_modules = {m['module']: m['cumulative_us'] for m in baseline['import_time']['top_cumulative']}
+        new_modules = {m['module']: m['cumulative_us'] for m in current['import_time']['top_cumulative']}
+        old_modules.update(baseline['import_time'].get('key_modules_us', {}))
+        new_modules.update(current['import_time'].get('key_modules_us', {}))
+        for name in sorted(set(old_modules) | set(new_modules)):
+            old, new = old_modules.get(name, 0), new_modules.get(name, 0)
+            if abs(new - old) >= 5000:
+                lines.append(f"import {name}: {old / 1000:.1f}ms -> {new / 1000:.1f}ms")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.startup', description='启动性能基准')
+    parser.add_argument('--executable', default=None, help='打包后的可执行文件，默认从源码启动 main.py')
+    parser.add_argument('--runs', type=int, default=5, help='热启动次数')
+    parser.add_argument('--platform', default='offscreen', help='QT_QPA_PLATFORM，默认 offscreen')
+    parser.add_argument('--drop-caches', action='store_true', help='冷启动前清空 Linux 页缓存（需要 root）')
+    parser.add_argument('--top', type=int, default=30, help='结果中保留的耗时最多的模块数')
+    parser.add_argument('-o', '--output', default=None, help='结果文件路径')
+    parser.add_argument('--compare', default=None, help='与之前保存的结果文件对比')
+    args = parser.parse_args(argv)
+
+    results = measure(args.executable, args.runs, args.platform, args.drop_caches, args.top)
+    path = save_results('startup', results, args.output)
+
+    first_window = results['first_window']
+    print(f"cold: {first_window['cold_s']:.3f}s  warm (median of {args.runs}): {first_window['warm_median_s']:.3f}s")
+    if 'import_time' in results:
+        print(f"imports: {results['import_time']['total_us'] / 1000:.1f}ms in {results['import_time']['module_count']} modules")
+    if args.compare:
+        for line in compare(results, load_results(args.compare)):
+            print(line)
+    print(f"saved to {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+吞吐量基准：
+
+    python -m benchmarks.throughput                         # 默认规模
+    python -m benchmarks.throughput --quick                 # 小规模，几秒内完成
+    python -m benchmarks.throughput --baseline benchmarks/results/throughput-abc1234.json --threshold 0.15
+
+生成合成输入（JPEG / PNG / TIFF 扫描件、PyMuPDF 生成的多页 PDF、含中文的 N 行 M 列 xlsx），
+对保存对话框中的每种压缩方式测量 merge_images_to_tif，对分组和非分组两种模式测量 generate_images。
+每个用例在独立的子进程中运行，记录耗时、pages/s 或 rows/s、峰值内存（含工作进程）和输出大小，
+结果保存为 JSON（默认 benchmarks/results/throughput-<commit>.json）。
+指定 --baseline 时与之前的结果对比，任一用例吞吐量下降超过 --threshold 即以退出码 1 结束。
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.common import environment, load_results, save_results
+from core.common.telemetry import peak_rss_bytes
+
+try:
+    import resource
+except ImportError:
+    # Windows 下没有 resource 模块，只记录本进程的峰值内存
+    resource = None
+
+_CJK_WORDS = ['张三', '李四', '王五', '北京市', '上海市', '有限公司', '合同编号', '金额', '备注', '审核通过']
+
+
+def make_scans(directory, count, size, formats=('jpeg', 'png', 'tiff')):
+    """生成 count 张近似扫描件的图像（浅色背景 + 文字行 + 噪点），格式轮流使用 formats"""
+    from PIL import Image, ImageDraw
+
+    paths = []
+    noise = Image.effect_noise(size, 12).convert('RGB')
+    for i in range(count):
+        img = Image.blend(Image.new('RGB', size, (245, 242, 235)), noise, 0.15)
+        draw = ImageDraw.Draw(img)
+        for y in range(40, size[1] - 40, 36):
+            draw.text((40, y), f"page {i} line {y} " + "lorem ipsum dolor sit amet " * 4, fill=(30, 30, 30))
+        fmt = formats[i % len(formats)]
+        path = os.path.join(directory, f"scan_{i:04d}.{'jpg' if fmt == 'jpeg' else fmt}")
+        img.save(path, format=fmt.upper())
+        paths.append(path)
+    return paths
+
+
+def make_pdf(path, pages):
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=595, height=842)
+        for line in range(40):
+            page.insert_text((50, 60 + line * 18), f"page {i} line {line} " + "lorem ipsum dolor sit amet " * 2)
+        page.draw_rect(fitz.Rect(50, 780, 545, 800), color=(0.2, 0.2, 0.6), fill=(0.8, 0.8, 0.95))
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def make_workbook(path, rows, cols, groups):
+    """第一列为分组字段（groups 个取值），其余列为中文、数字和日期混合的内容"""
+    import pandas as pd
+
+    rng = random.Random(0)
+    data = {'编号': [f"G{rng.randrange(groups):05d}" for _ in range(rows)]}
+    for c in range(1, cols):
+        kind = c % 3
+        if kind == 0:
+            data[f"金额{c}"] = [round(rng.uniform(0, 10000), 2) for _ in range(rows)]
+        elif kind == 1:
+            data[f"备注{c}"] = ["".join(rng.choice(_CJK_WORDS) for _ in range(rng.randint(1, 6))) for _ in range(rows)]
+        else:
+            data[f"日期{c}"] = pd.date_range('2024-01-01', periods=rows, freq='h').strftime('%Y-%m-%d')
+    pd.DataFrame(data).to_excel(path, index=False)
+    return path
+
+
+def _dir_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def _peak_rss_bytes():
+    """当前进程和已结束的子进程（工作进程）中的最大常驻内存"""
+    own = peak_rss_bytes()
+    if resource is None:
+        return own
+    scale = 1 if sys.platform == 'darwin' else 1024  # Linux 以 KB 为单位，macOS 以字节为单位
+    return max(own or 0, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale)
+
+
+def _run_case(case: dict) -> dict:
+    """在独立子进程中执行单个用例，峰值内存只反映该用例"""
+    # 导入耗时由启动基准统计，不计入吞吐量
+    from core.excel_to_img.excel_to_img import generate_images
+    from core.image_to_tif.image_to_tif import merge_images_to_tif
+    import fitz  # noqa: F401  PyMuPDF 在处理第一个 PDF 时才导入
+
+    started = time.perf_counter()
+    if case['kind'] == 'tif':
+        merge_images_to_tif(case['inputs'], case['output'], compression=case['compression'],
+                            jpeg_quality=case.get('jpeg_quality'), dpi=case['dpi'], workers=case['workers'])
+    else:
+        generate_images(case['excel'], 'Sheet1', case['output'], naming_field='编号', is_grouped=case['grouped'],
+                        workers=case['workers'], streaming=case.get('streaming', False))
+    seconds = time.perf_counter() - started
+    return {'seconds': round(seconds, 4), 'peak_rss_bytes': _peak_rss_bytes(), 'output_bytes': _dir_size(case['output'])}
+
+
+def build_cases(work_dir, scans, scan_size, pdf_pages, rows, cols, groups, workers, compressions=None):
+    """生成输入文件并返回用例列表，每个用例带有 name 和计数单位"""
+    from core.config import TIF_COMPRESSION_OPTIONS
+
+    scan_dir = os.path.join(work_dir, 'scans')
+    os.makedirs(scan_dir)
+    inputs = make_scans(scan_dir, scans, scan_size)
+    inputs.append(make_pdf(os.path.join(work_dir, 'document.pdf'), pdf_pages))
+    excel_path = make_workbook(os.path.join(work_dir, 'rows.xlsx'), rows, cols, groups)
+
+    cases = []
+    for compression in compressions or TIF_COMPRESSION_OPTIONS:
+        cases.append({
+            'name': f"tif/{compression}", 'kind': 'tif', 'inputs': inputs, 'compression': compression,
+            'jpeg_quality': 85 if compression == 'jpeg' else None, 'dpi': 200, 'workers': workers,
+            'output': os.path.join(work_dir, f"out_{compression}.tif"),
+            'units': scans + pdf_pages, 'unit_name': 'pages',
+        })
+    for grouped in (False, True):
+        mode = 'grouped' if grouped else 'flat'
+        cases.append({
+            'name': f"excel/{mode}", 'kind': 'excel', 'excel': excel_path, 'grouped': grouped, 'workers': workers,
+            'output': os.path.join(work_dir, f"rows_{mode}"), 'units': rows, 'unit_name': 'rows',
+        })
+    return cases
+
+
+def run_cases(cases) -> dict:
+    results = {}
+    # spawn 保证每个用例从干净的进程开始，峰值内存互不影响
+    context = multiprocessing.get_context('spawn')
+    for case in cases:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            try:
+                measured = executor.submit(_run_case, case).result()
+            except Exception as e:
+                results[case['name']] = {'error': str(e)}
+                print(f"{case['name']:<24} 失败: {e}")
+                continue
+        rate = case['units'] / measured['seconds'] if measured['seconds'] else None
+        measured.update({'units': case['units'], 'unit_name': case['unit_name'],
+                         'throughput': round(rate, 3) if rate else None})
+        results[case['name']] = measured
+        rss = measured['peak_rss_bytes']
+        print(f"{case['name']:<24} {measured['seconds']:8.2f}s {rate:10.1f} {case['unit_name']}/s "
+              f"rss {rss / 2 ** 20 if rss else float('nan'):7.1f}MB out {measured['output_bytes'] / 2 ** 20:8.2f}MB")
+    return results
+
+
+def find_regressions(current: dict, baseline: dict, threshold: float) -> list:
+    """吞吐量比基准下降超过 threshold（比例）的用例，返回 [(name, old, new)]"""
+    regressions = []
+    for name, old in baseline['cases'].items():
+        new = current['cases'].get(name)
+        if not new or not old.get('throughput'):
+            continue
+        if not new.get('throughput') or new['throughput'] < old['throughput'] * (1 - threshold):
+            regressions.append((name, old['throughput'], new.get('throughput')))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.throughput', description='转换吞吐量基准')
+    parser.add_argument('--scans', type=int, default=30, help='合成扫描件数量')
+    parser.add_argument('--scan-size', type=int, nargs=2, default=(1700, 2200), metavar=('W', 'H'))
+    parser.add_argument('--pdf-pages', type=int, default=30)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--cols', type=int, default=8)
+    parser.add_argument('--groups', type=int, default=200, help='分组模式下的分组数')
+    parser.add_argument('--workers', type=int, default=1, help='传给转换函数的 workers，0 表示全部 CPU 核心')
+    parser.add_argument('--compression', action='append', default=None, help='只测量指定的压缩方式，可重复')
+    parser.add_argument('--quick', action='store_true', help='小规模快速运行')
+    parser.add_argument('-o', '--output', default=None, help='结果文件路径')
+    parser.add_argument('--baseline', default=None, help='用于回归检查的基准结果文件')
+    parser.add_argument('--threshold', type=float, default=0.15, help='允许的吞吐量下降比例，默认 0.15')
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.scans, args.scan_size, args.pdf_pages, args.rows, args.groups = 6, (850, 1100), 6, 200, 20
+    workers = args.workers or None
+    settings = {'scans': args.scans, 'scan_size': list(args.scan_size), 'pdf_pages': args.pdf_pages,
+                'rows': args.rows, 'cols': args.cols, 'groups': args.groups, 'workers': args.workers}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        cases = build_cases(work_dir, args.scans, tuple(args.scan_size), args.pdf_pages, args.rows, args.cols,
+                            args.groups, workers, args.compression)
+        results = {'environment': environment(), 'settings': settings, 'cases': run_cases(cases)}
+
+    path = save_results('throughput', results, args.output)
+    print(f"saved to {path}")
+
+    if args.baseline:
+        baseline = load_results(args.baseline)
+        if baseline.get('settings') != settings:
+            print("警告: 基准结果的输入规模与本次不同，对比结果仅供参考")
+        regressions = find_regressions(results, baseline, args.threshold)
+        for name, old, new in regressions:
+            print(f"回归: {name} {old} -> {new}")
+        if regressions:
+            return 1
+        print(f"未发现超过 {args.threshold:.0%} 的吞吐量下降")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,433 @@
+"""
+无界面命令行入口：python -m core
+
+    python -m core tif a.pdf scans/ -o out.tif --compression tiff_lzw
+    python -m core excel data.xlsx --sheet Sheet1 --naming-field 编号 -o out/
+    python -m core batch jobs.yaml --workers 8
+
+batch 文件为 JSON 或 YAML（需要安装 PyYAML），可以是任务列表，也可以是 {"workers": N, "jobs": [...]}：
+
+    jobs:
+      - type: tif
+        inputs: [a.pdf, scans/]
+        output: out.tif
+        compression: tiff_lzw
+        color_mode: auto      # 可选，rgb / native / auto / gray / bilevel
+        tile_size: 512        # 可选，瓦片布局
+        bigtiff: auto         # 可选，auto / true / false
+        jpeg_passthrough: true  # 可选，JPEG 压缩时基线 JPEG 来源原样写入，不重新压缩
+        force: false          # 可选，预计内存不足时仍然运行
+      - type: excel
+        excel: data.xlsx
+        sheet: Sheet1
+        output: out/
+        naming_field: 编号
+        grouped: true
+        trace: rows-trace.json
+
+任务文件中的相对路径（inputs / output / excel / share_dir / page_cache / trace）相对于任务文件所在目录。
+任务的 trace 字段（或 tif / excel 子命令的 --trace）指定时，记录各阶段耗时并保存为 Chrome Trace JSON，
+可在 chrome://tracing 或 Perfetto 中打开，各阶段汇总以 telemetry 事件输出。
+每个任务运行前先只读取文件头做预检（preflight 事件：页数 / 行数、预计峰值内存和输出大小）：
+预计峰值内存超过内存预算时该任务失败（--force 或任务的 force 字段跳过检查），
+未指定 streaming 的 excel 任务在非流式读取放不下时自动改为流式。--dry-run 只做预检，不执行转换。
+PyMuPDF 和渲染器不是线程安全的：并发运行的任务各自至少分到 2 个工作进程，在调用方进程中解码 / 渲染的任务
+（workers 为 1 或指定 tile_size 的 tif 任务）同一时刻只运行一个。
+同时运行的任务共用进程内的资源调度器（见 core.common.scheduler）：每页解码 / 每批渲染前按估计的内存申请放行，
+内存预算（默认为可用内存的 80%，--memory-limit 指定）或工作槽位不足时排队等待，结束时以 scheduler 事件输出计数。
+--progress json 时每个事件输出一行 JSON 到标准输出，例如
+{"event": "progress", "job": "1", "progress": 42, "message": "..."}。
+退出码：0 全部成功，1 有任务失败，2 参数或任务文件错误。
+本模块只依赖 core，不导入 Qt，可在没有显示器的服务器和容器中运行。
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import List, Optional
+
+from core.common.preflight import format_bytes, memory_budget
+from core.common.scheduler import configure_scheduler
+from core.common.telemetry import Telemetry
+from core.excel_to_img.share_files import SHARE_STRATEGIES
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+JOB_TYPES = ('tif', 'excel')
+
+
+class JobError(Exception):
+    """任务描述无效"""
+
+
+class ProgressReporter:
+    """线程安全地输出任务进度，json 模式下每个事件一行，便于其他程序解析"""
+
+    def __init__(self, mode: str = 'text', stream=None):
+        self.mode = mode
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def emit(self, event: str, job: Optional[str] = None, **fields):
+        if self.mode == 'none':
+            return
+        with self._lock:
+            if self.mode == 'json':
+                record = {'event': event}
+                if job is not None:
+                    record['job'] = job
+                record.update(fields)
+                self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+            else:
+                prefix = f"[{job}] " if job is not None else ""
+                detail = fields.get('message') or fields.get('error') \
+                    or ' '.join(f"{key}={value}" for key, value in fields.items())
+                if 'progress' in fields:
+                    detail = f"{fields['progress']:3d}% {detail}"
+                self.stream.write(f"{prefix}{event}: {detail}".rstrip() + '\n')
+            self.stream.flush()
+
+    def callback(self, job: str):
+        """生成传给 merge_images_to_tif / generate_images 的 progress_callback"""
+        return lambda progress, message: self.emit('progress', job, progress=progress, message=message)
+
+
+def _expand_inputs(inputs: List[str]) -> List[str]:
+    """目录按 load_images 的规则展开为其中的图像和 PDF 文件"""
+    from core.image_to_tif.image_to_tif import load_images
+
+    paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            paths.extend(load_images(path))
+        elif os.path.isfile(path):
+            paths.append(path)
+        else:
+            raise JobError(f"输入文件不存在: {path}")
+    return paths
+
+
+def run_tif_job(job: dict, workers: int, progress_callback=None, telemetry=None):
+    from core.image_to_tif.image_to_tif import merge_images_to_tif
+
+    page_cache = None
+    if job.get('page_cache'):
+        from core.image_to_tif.page_cache import EncodedPageCache, get_page_cache
+        page_cache = get_page_cache() if job['page_cache'] is True else EncodedPageCache(job['page_cache'])
+
+    merge_images_to_tif(
+        _expand_inputs(job['inputs']),
+        job['output'],
+        compression=job.get('compression', 'raw'),
+        dpi=job.get('dpi', 200),
+        jpeg_quality=job.get('jpeg_quality'),
+        progress_callback=progress_callback,
+        workers=workers,
+        page_cache=page_cache,
+        telemetry=telemetry,
+        tile_size=job.get('tile_size'),
+        bigtiff=job.get('bigtiff', 'auto'),
+        color_mode=job.get('color_mode', 'rgb'),
+        jpeg_passthrough=job.get('jpeg_passthrough', True),
+    )
+
+
+def run_excel_job(job: dict, workers: int, progress_callback=None, telemetry=None):
+    from core.excel_to_img.excel_to_img import generate_images
+
+    generate_images(
+        job['excel'],
+        job['sheet'],
+        job['output'],
+        naming_field=job.get('naming_field'),
+        is_grouped=job.get('grouped', False),
+        share_dir=job.get('share_dir'),
+        workers=workers,
+        progress_callback=progress_callback,
+        streaming=job.get('streaming', False),
+        incremental=job.get('incremental', False),
+        share_strategy=job.get('share_strategy', 'auto'),
+        telemetry=telemetry,
+    )
+
+
+def preflight_job(job: dict, workers: int, budget: Optional[int] = None) -> dict:
+    """
+    只读取文件头估计任务的规模、峰值内存和输出大小，返回 preflight 事件的字段。
+    excel 任务未指定 streaming 且非流式读取的估计超过 budget 时，改用流式读取并在结果中返回 streaming=True。
+    """
+    if job['type'] == 'tif':
+        from core.image_to_tif.preflight import preflight_tif
+
+        report = preflight_tif(_expand_inputs(job['inputs']), dpi=job.get('dpi', 200),
+                               color_mode=job.get('color_mode', 'rgb'))
+        compression = job.get('compression', 'raw')
+        passthrough = job.get('jpeg_passthrough', True)
+        return {
+            'pages': report.page_count,
+            'pixels': report.pixels,
+            'peak_rss_bytes': report.peak_rss_bytes(compression, workers=workers, tile_size=job.get('tile_size'),
+                                                    jpeg_passthrough=passthrough),
+            'output_bytes': report.output_bytes(compression, passthrough),
+        }
+
+    from core.excel_to_img.preflight import preflight_excel
+
+    report = preflight_excel(job['excel'], job['sheet'])
+    streaming = job.get('streaming')
+    peak = report.peak_rss_bytes(bool(streaming), workers)
+    if streaming is None and budget is not None and peak > budget and report.supports_streaming:
+        streaming_peak = report.peak_rss_bytes(True, workers)
+        if streaming_peak < peak:
+            streaming, peak = True, streaming_peak
+    return {
+        'rows': report.rows,
+        'pixels': report.pixels,
+        'peak_rss_bytes': peak,
+        'output_bytes': report.output_bytes(),
+        'streaming': bool(streaming),
+    }
+
+
+def _check_preflight(job: dict, estimate: dict, budget: Optional[int]):
+    if budget is not None and estimate['peak_rss_bytes'] > budget and not job.get('force'):
+        raise JobError(f"预计峰值内存 {format_bytes(estimate['peak_rss_bytes'])} 超过可用内存 {format_bytes(budget)}，"
+                       f"可减少 workers、改用分块 / 流式写入，或设置 force 跳过检查")
+
+
+def _describe_preflight(estimate: dict) -> str:
+    size = f"{estimate['pages']} 页" if 'pages' in estimate else f"{estimate['rows']} 行"
+    detail = f"{size}，预计峰值内存 {format_bytes(estimate['peak_rss_bytes'])}，输出约 {format_bytes(estimate['output_bytes'])}"
+    return detail + ("，流式读取" if estimate.get('streaming') else "")
+
+
+_RUNNERS = {'tif': run_tif_job, 'excel': run_excel_job}
+_REQUIRED = {'tif': ('inputs', 'output'), 'excel': ('excel', 'sheet', 'output')}
+
+
+def validate_job(job) -> dict:
+    if not isinstance(job, dict):
+        raise JobError(f"任务必须是对象: {job!r}")
+    job_type = job.get('type')
+    if job_type not in JOB_TYPES:
+        raise JobError(f"不支持的任务类型: {job_type!r}，可选 {', '.join(JOB_TYPES)}")
+    missing = [key for key in _REQUIRED[job_type] if not job.get(key)]
+    if missing:
+        raise JobError(f"{job_type} 任务缺少字段: {', '.join(missing)}")
+    if job_type == 'excel' and job.get('share_strategy', 'auto') not in SHARE_STRATEGIES:
+        raise JobError(f"不支持的共享文件分发方式: {job['share_strategy']!r}，可选 {', '.join(SHARE_STRATEGIES)}")
+    if job_type == 'tif' and isinstance(job['inputs'], str):
+        job = dict(job, inputs=[job['inputs']])
+    return job
+
+
+_PATH_FIELDS = ('inputs', 'output', 'excel', 'share_dir', 'page_cache', 'trace')
+
+
+def _resolve_paths(job: dict, base_dir: str) -> dict:
+    """任务文件中的相对路径相对于 base_dir（任务文件所在目录），而不是当前工作目录"""
+    resolved = dict(job)
+    for key in _PATH_FIELDS:
+        value = job.get(key)
+        if isinstance(value, str):
+            resolved[key] = os.path.join(base_dir, value)
+        elif isinstance(value, list):
+            resolved[key] = [os.path.join(base_dir, item) if isinstance(item, str) else item for item in value]
+    return resolved
+
+
+def load_job_file(path: str):
+    """读取 JSON / YAML 任务文件，返回 (任务列表, 文件中指定的 workers 或 None)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    except OSError as e:
+        raise JobError(f"无法读取任务文件: {e}")
+
+    if os.path.splitext(path)[1].lower() in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise JobError("读取 YAML 任务文件需要安装 PyYAML")
+        try:
+            data = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise JobError(f"任务文件格式错误: {e}")
+    else:
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise JobError(f"任务文件格式错误: {e}")
+
+    workers = None
+    if isinstance(data, dict):
+        workers = data.get('workers')
+        data = data.get('jobs')
+    if not isinstance(data, list) or not data:
+        raise JobError("任务文件中没有任务")
+    base_dir = os.path.dirname(os.path.abspath(path))
+    return [_resolve_paths(validate_job(job), base_dir) for job in data], workers
+
+
+def plan_workers(job_count: int, budget: int):
+    """
+    在全局进程预算内分配并发：同时运行 min(任务数, 预算 // 2) 个任务，
+    每个任务分到 预算 // 并发数 个工作进程，总进程数不超过预算。
+    workers 为 1 的任务在调用方进程中解码 / 渲染，不能与其他任务并发，因此并发时每个任务至少分到 2 个工作进程。
+    """
+    budget = max(1, budget)
+    concurrent = max(1, min(job_count, budget // 2))
+    return concurrent, max(1, budget // concurrent)
+
+
+def _runs_in_process(job: dict, workers: int) -> bool:
+    """任务是否在调用方进程中解码 / 渲染：workers 为 1，或 tif 任务指定了 tile_size（分块写入不使用工作进程）"""
+    return workers == 1 or (job['type'] == 'tif' and job.get('tile_size') is not None)
+
+
+def _format_stages(stages: dict) -> str:
+    """按总耗时从高到低排列的各阶段摘要，用于文本模式输出"""
+    ordered = sorted(stages.items(), key=lambda item: item[1]['total_s'], reverse=True)
+    return ', '.join(f"{stage} {stat['total_s']:.3f}s/{stat['count']}" for stage, stat in ordered)
+
+
+def run_jobs(jobs: List[dict], budget: int, reporter: ProgressReporter, dry_run=False,
+             memory_limit: Optional[int] = None) -> int:
+    """
+    并发运行所有任务，返回退出码；dry_run 为 True 时只做预检。
+    memory_limit 为所有任务共用的内存预算（字节），默认为 memory_budget()，由共享的调度器按页放行。
+    """
+    concurrent, per_job = plan_workers(len(jobs), budget)
+    # 调度器的槽位与 ordered_map 默认的 max_in_flight 一致，为工作进程数的两倍
+    scheduler = configure_scheduler(memory_limit or memory_budget(), slots=2 * max(budget, 1))
+    memory = scheduler.memory_bytes
+    reporter.emit('start', jobs=len(jobs), concurrent=concurrent, workers_per_job=per_job)
+    # PyMuPDF 不是线程安全的，在调用方进程中解码 / 渲染的任务和预检逐个运行
+    in_process_lock = threading.Lock()
+
+    def run(indexed_job):
+        index, job = indexed_job
+        job_id = str(job.get('id', index + 1))
+        reporter.emit('begin', job_id, type=job['type'], output=job['output'])
+        telemetry = Telemetry() if job.get('trace') else None
+        started = time.monotonic()
+        try:
+            with in_process_lock:
+                # 预检在调用方进程中打开 PDF 读取页面尺寸，同样不与其他任务的 PyMuPDF 调用并发
+                estimate = preflight_job(job, per_job, memory)
+            reporter.emit('preflight', job_id, message=_describe_preflight(estimate), **estimate)
+            _check_preflight(job, estimate, memory)
+            if 'streaming' in estimate:
+                job = dict(job, streaming=estimate['streaming'])
+            if not dry_run:
+                with in_process_lock if _runs_in_process(job, per_job) else nullcontext():
+                    _RUNNERS[job['type']](job, per_job, reporter.callback(job_id), telemetry)
+        except Exception as e:
+            reporter.emit('error', job_id, error=str(e), seconds=round(time.monotonic() - started, 3))
+            return False
+        finally:
+            if telemetry is not None:
+                # 失败的任务同样保存已记录的部分，便于定位卡在哪个阶段
+                telemetry.write_chrome_trace(job['trace'])
+                summary = telemetry.summary()
+                reporter.emit('telemetry', job_id, trace=job['trace'], message=_format_stages(summary['stages']),
+                              **summary)
+        reporter.emit('done', job_id, output=job['output'], seconds=round(time.monotonic() - started, 3))
+        return True
+
+    with ThreadPoolExecutor(max_workers=concurrent) as executor:
+        results = list(executor.map(run, enumerate(jobs)))
+
+    failed = results.count(False)
+    reporter.emit('scheduler', **scheduler.stats())
+    reporter.emit('summary', ok=len(results) - failed, failed=failed)
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m core', description='image-utils 命令行工具（无界面）')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='全局工作进程预算，默认使用全部 CPU 核心')
+    parser.add_argument('--progress', choices=('text', 'json', 'none'), default='text',
+                        help='进度输出格式，json 为每行一个事件')
+    parser.add_argument('--dry-run', action='store_true', help='只读取文件头预检各任务的内存和输出大小，不执行转换')
+    parser.add_argument('--force', action='store_true', help='预计内存不足时仍然运行')
+    parser.add_argument('--memory-limit', type=int, default=None, metavar='MB',
+                        help='所有任务共用的内存预算，默认为可用内存的 80%%')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    tif = sub.add_parser('tif', help='将图像和 PDF 合并为多页 TIFF')
+    tif.add_argument('inputs', nargs='+', help='图像、PDF 文件或目录，按顺序合并')
+    tif.add_argument('-o', '--output', required=True)
+    tif.add_argument('--compression', default='raw')
+    tif.add_argument('--dpi', type=int, default=200)
+    tif.add_argument('--jpeg-quality', type=int, default=None)
+    tif.add_argument('--page-cache', default=None, metavar='DIR',
+                     help='已编码页面缓存目录，再次生成时复用未变化的页面')
+    tif.add_argument('--color-mode', choices=('rgb', 'native', 'auto', 'gray', 'bilevel'), default='rgb',
+                     help='native 保留黑白 / 灰度等原始模式，auto 自动识别实际为灰度或黑白的页面')
+    tif.add_argument('--tile-size', type=int, default=None, help='按指定边长的瓦片写入（16 的倍数）')
+    tif.add_argument('--bigtiff', choices=('auto', 'always', 'never'), default='auto',
+                     help='auto 在预计输出接近 4GB 时使用 BigTIFF，经典 TIFF 写满 4GB 时改用 BigTIFF 重新生成')
+    tif.add_argument('--no-jpeg-passthrough', dest='jpeg_passthrough', action='store_false',
+                     help='JPEG 压缩时重新编码所有页面，而不是原样写入基线 JPEG 来源')
+    tif.add_argument('--trace', default=None, metavar='PATH', help='保存各阶段耗时的 Chrome Trace JSON')
+
+    excel = sub.add_parser('excel', help='将 Excel 每一行生成为图片')
+    excel.add_argument('excel')
+    excel.add_argument('--sheet', required=True)
+    excel.add_argument('-o', '--output', required=True)
+    excel.add_argument('--naming-field', default=None)
+    excel.add_argument('--grouped', action='store_true')
+    excel.add_argument('--share-dir', default=None)
+    excel.add_argument('--share-strategy', choices=SHARE_STRATEGIES, default='auto',
+                       help='共享文件分发方式，auto 按 reflink → hardlink → symlink → copy 选择第一个可用的方式')
+    excel.add_argument('--streaming', action='store_true', help='逐块读取 .xlsx，不指定时按预检结果自动选择')
+    excel.add_argument('--incremental', action='store_true')
+    excel.add_argument('--trace', default=None, metavar='PATH', help='保存各阶段耗时的 Chrome Trace JSON')
+
+    batch = sub.add_parser('batch', help='并发运行 JSON / YAML 任务文件中的多个任务')
+    batch.add_argument('job_file')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None, stream=None) -> int:
+    """命令行入口，stream 为进度输出位置，默认标准输出；返回退出码"""
+    args = build_parser().parse_args(argv)
+    reporter = ProgressReporter(args.progress, stream)
+    budget = args.workers
+
+    try:
+        if args.command == 'batch':
+            jobs, file_workers = load_job_file(args.job_file)
+            budget = budget or file_workers
+        elif args.command == 'tif':
+            jobs = [validate_job({'type': 'tif', 'inputs': args.inputs, 'output': args.output,
+                                  'compression': args.compression, 'dpi': args.dpi,
+                                  'jpeg_quality': args.jpeg_quality, 'page_cache': args.page_cache,
+                                  'tile_size': args.tile_size, 'color_mode': args.color_mode,
+                                  'bigtiff': {'auto': 'auto', 'always': True, 'never': False}[args.bigtiff],
+                                  'jpeg_passthrough': args.jpeg_passthrough, 'trace': args.trace})]
+        else:
+            jobs = [validate_job({'type': 'excel', 'excel': args.excel, 'sheet': args.sheet, 'output': args.output,
+                                  'naming_field': args.naming_field, 'grouped': args.grouped,
+                                  'share_dir': args.share_dir, 'share_strategy': args.share_strategy,
+                                  'streaming': args.streaming or None, 'incremental': args.incremental,
+                                  'trace': args.trace})]
+    except JobError as e:
+        if args.progress == 'json':
+            reporter.emit('error', error=str(e))
+        else:
+            print(f"错误: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    if args.force:
+        jobs = [dict(job, force=True) for job in jobs]
+    memory_limit = args.memory_limit * 1024 * 1024 if args.memory_limit else None
+    return run_jobs(jobs, budget or os.cpu_count() or 1, reporter, args.dry_run, memory_limit)
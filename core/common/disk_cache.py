@@ -0,0 +1,91 @@
+import os
+import threading
+from typing import Optional
+
+
+class DiskCache:
+    """
+    按键存取字节串的磁盘缓存，条目保存为 cache_dir/键前两位/键+suffix。
+    写入时先写临时文件再改名，并发读取不会读到写了一半的条目；
+    总大小超过 max_bytes 时按最近访问时间淘汰到上限的 90%。
+    所有方法都是线程安全的，读写失败时静默忽略（缓存只是加速手段）。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, suffix: str = ''):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._disk_bytes = None
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + self.suffix)
+
+    def read(self, key: str) -> Optional[bytes]:
+        entry_path = self.entry_path(key)
+        try:
+            with open(entry_path, 'rb') as f:
+                data = f.read()
+            # 更新访问时间，用于淘汰排序
+            os.utime(entry_path)
+            return data
+        except OSError:
+            return None
+
+    def write(self, key: str, data: bytes):
+        entry_path = self.entry_path(key)
+        try:
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, entry_path)
+        except OSError:
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(entry_size for _, entry_size, _ in self._iter_entries())
+            else:
+                self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_bytes:
+                self._evict()
+
+    def clear(self):
+        with self._lock:
+            for entry_path, _, _ in self._iter_entries():
+                try:
+                    os.remove(entry_path)
+                except OSError:
+                    pass
+            self._disk_bytes = 0
+
+    def _iter_entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for sub in os.listdir(self.cache_dir):
+            sub_dir = os.path.join(self.cache_dir, sub)
+            if not os.path.isdir(sub_dir):
+                continue
+            for name in os.listdir(sub_dir):
+                entry_path = os.path.join(sub_dir, name)
+                try:
+                    st = os.stat(entry_path)
+                except OSError:
+                    continue
+                yield entry_path, st.st_size, st.st_mtime
+
+    def _evict(self):
+        """按最近访问时间淘汰，直到总大小降到上限的 90%"""
+        entries = sorted(self._iter_entries(), key=lambda entry: entry[2])
+        total = sum(entry_size for _, entry_size, _ in entries)
+        target = self.max_bytes * 0.9
+        for entry_path, entry_size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(entry_path)
+                total -= entry_size
+            except OSError:
+                pass
+        self._disk_bytes = total
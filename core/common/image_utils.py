@@ -1,15 +1,15 @@
 import os
 from tkinter import Toplevel, Label
 
-from PIL import Image, ImageTk
+from PIL import ImageTk
 from core.config import SUPPORTED_FORMATS, THUMBNAIL_SIZE
+from core.common.thumbnail_cache import get_thumbnail_cache
 
 
 def preview_image(img_path):
     top = Toplevel()
     top.title(img_path)
-    img = Image.open(img_path)
-    img.thumbnail((800, 800))
+    img = get_thumbnail_cache().get(img_path, (800, 800))
     img_tk = ImageTk.PhotoImage(img)
 
     label = Label(top, image=img_tk)
@@ -21,8 +21,7 @@ def load_images(folder_path):
     for fname in sorted(os.listdir(folder_path)):
         if os.path.splitext(fname)[-1].lower() in SUPPORTED_FORMATS:
             full_path = os.path.join(folder_path, fname)
-            img = Image.open(full_path)
-            img.thumbnail(THUMBNAIL_SIZE)
+            img = get_thumbnail_cache().get(full_path, THUMBNAIL_SIZE)
             img_tk = ImageTk.PhotoImage(img)
             image_list.append({
                 "path": full_path,
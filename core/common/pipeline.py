@@ -0,0 +1,92 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
+
+
+def default_workers() -> int:
+    """默认并行度：使用全部 CPU 核心"""
+    return os.cpu_count() or 1
+
+
+def ordered_map(func: Callable, items: Iterable, workers: Optional[int] = None,
+                max_in_flight: Optional[int] = None, executor_cls=ProcessPoolExecutor,
+                admit: Optional[Callable] = None, initializer: Optional[Callable] = None) -> Iterator:
+    """
+    在工作池中并行执行 func(item)，并严格按照 items 的顺序逐个产出结果。
+    - workers: 工作进程/线程数，默认使用全部 CPU 核心
+    - max_in_flight: 同时提交但尚未被消费的任务上限，默认 workers * 2。
+      结果只有在被消费后才会提交新任务，因此内存占用最多为 max_in_flight 个结果。
+    - executor_cls: 默认为 ProcessPoolExecutor（PyMuPDF 不支持多线程），
+      纯 Pillow 任务可以传入 ThreadPoolExecutor。
+    - admit: 可选，admit(item, block) 在提交任务前申请资源（见 ResourceScheduler.acquire），
+      返回带 release() 的凭据，在对应结果被消费后释放。还有未消费的结果时以 block=False 申请，
+      资源不足时先产出已完成的结果再重试，因此不会等待自己持有的资源。
+    - initializer: 可选，每个工作进程/线程启动时调用一次，用于启用只在工作进程中使用的缓存等。
+    func 必须是模块级函数，以便在进程间传递。
+    """
+    workers = workers or default_workers()
+    max_in_flight = max(max_in_flight or workers * 2, 1)
+
+    pool = executor_cls(max_workers=workers, initializer=initializer)
+    pending = deque()
+
+    def take():
+        future, ticket = pending.popleft()
+        try:
+            return future.result(), ticket
+        except BaseException:
+            _release(ticket)
+            raise
+
+    try:
+        for item in items:
+            ticket = None
+            if admit is not None:
+                ticket = admit(item, not pending)
+                while ticket is None:
+                    result, done = take()
+                    try:
+                        yield result
+                    finally:
+                        _release(done)
+                    ticket = admit(item, not pending)
+            if len(pending) >= max_in_flight:
+                result, done = take()
+                try:
+                    yield result
+                finally:
+                    _release(done)
+            pending.append((pool.submit(func, item), ticket))
+
+        while pending:
+            result, done = take()
+            try:
+                yield result
+            finally:
+                _release(done)
+    finally:
+        # 出错或调用方提前结束时取消尚未开始的任务
+        for future, _ in pending:
+            future.cancel()
+        pool.shutdown(wait=True, cancel_futures=True)
+        for _, ticket in pending:
+            _release(ticket)
+
+
+def admitted_map(func: Callable, items: Iterable, admit: Callable) -> Iterator:
+    """
+    ordered_map 的顺序版本：在当前线程中依次执行 func(item)，
+    每个任务执行前以 admit(item, True) 阻塞申请资源，凭据在结果被消费后释放。
+    """
+    for item in items:
+        ticket = admit(item, True)
+        try:
+            yield func(item)
+        finally:
+            _release(ticket)
+
+
+def _release(ticket):
+    if ticket is not None:
+        ticket.release()
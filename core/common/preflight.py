@@ -0,0 +1,67 @@
+import os
+import sys
+from typing import Optional
+
+# 主进程导入 Pillow、PyMuPDF、pandas 等依赖后的常驻内存（实测 50-80MB，留有余量）
+BASE_RSS_BYTES = 96 * 1024 * 1024
+# 每个工作进程的基础常驻内存
+WORKER_RSS_BYTES = 48 * 1024 * 1024
+# 估计的峰值内存超过可用内存的该比例时视为内存不足，留给系统和其他程序
+MEMORY_SAFETY_RATIO = 0.8
+
+
+def available_memory_bytes() -> Optional[int]:
+    """系统当前可用的物理内存（字节），无法获取时返回 None"""
+    try:
+        # MemAvailable 包含可回收的页缓存，比 MemFree 更接近实际可用的内存
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if sys.platform == 'win32':
+        import ctypes
+
+        class MemoryStatusEx(ctypes.Structure):
+            _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                        ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                        ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                        ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                        ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+
+        status = MemoryStatusEx()
+        status.dwLength = ctypes.sizeof(MemoryStatusEx)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullAvailPhys
+        return None
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def memory_budget(concurrent: int = 1) -> Optional[int]:
+    """
+    concurrent 个同时运行的任务各自可以使用的内存：可用内存的 MEMORY_SAFETY_RATIO 平均分配，
+    无法获取可用内存时返回 None。
+    """
+    available = available_memory_bytes()
+    if available is None:
+        return None
+    return int(available * MEMORY_SAFETY_RATIO) // max(concurrent, 1)
+
+
+def fits_in_memory(estimated_bytes: int, budget: Optional[int] = None) -> bool:
+    """估计的峰值内存是否在 budget 以内，budget 默认为 memory_budget()；无法获取可用内存时返回 True"""
+    if budget is None:
+        budget = memory_budget()
+    return budget is None or estimated_bytes <= budget
+
+
+def format_bytes(size: float) -> str:
+    """以 KB / MB / GB 显示字节数，用于预检提示"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
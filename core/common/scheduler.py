@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from core.common.pipeline import default_workers
+from core.common.preflight import memory_budget
+
+
+class Reservation:
+    """
+    ResourceScheduler 放行的一个工作单元：占用一个工作槽位和 nbytes 字节的内存预算。
+    处理结束后调用 release()（可重复调用），也可以作为上下文管理器使用。
+    """
+
+    def __init__(self, scheduler: 'ResourceScheduler', nbytes: int):
+        self.scheduler = scheduler
+        self.nbytes = nbytes
+        self.released = False
+
+    def release(self):
+        self.scheduler._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class ResourceScheduler:
+    """
+    进程级资源调度器：页面解码 / 渲染任务开始前按估计的内存占用申请放行，
+    同时运行的任务数不超过 slots，占用的内存之和不超过 memory_bytes，否则排队等待（背压）而不是继续分配。
+    - memory_bytes: 内存预算，None 表示不限制
+    - slots: 工作槽位数，包括已完成但结果尚未被消费的任务
+    等待的请求按先后顺序放行，大任务不会被不断到来的小任务饿死；
+    单个任务的估计超过整个预算时，在没有其他任务运行时单独放行。
+    所有转换任务（GUI 的后台线程和 CLI 的并发任务）默认共用 get_scheduler() 返回的同一个实例。
+    """
+
+    def __init__(self, memory_bytes: Optional[int] = None, slots: Optional[int] = None):
+        self.memory_bytes = memory_bytes
+        self.slots = max(slots or default_workers() * 2, 1)
+        self._condition = threading.Condition()
+        self._waiting = deque()
+        self._running = 0
+        self._reserved = 0
+        self._peak_reserved = 0
+        self._admitted = 0
+        self._blocked = 0
+        self._blocked_s = 0.0
+
+    def configure(self, memory_bytes: Optional[int] = None, slots: Optional[int] = None):
+        """调整预算，已放行的任务不受影响，等待中的请求按新的预算重新判断"""
+        with self._condition:
+            self.memory_bytes = memory_bytes
+            self.slots = max(slots or default_workers() * 2, 1)
+            self._condition.notify_all()
+
+    def acquire(self, nbytes: int, block: bool = True) -> Optional[Reservation]:
+        """
+        申请运行一个估计占用 nbytes 字节的任务，返回 Reservation。
+        block 为 False 时资源不足（或已有请求在排队）立即返回 None，调用方应先消费已有结果释放资源再重试；
+        已持有 Reservation 的调用方只能以 block=False 申请，否则可能等待自己持有的资源而死锁。
+        """
+        nbytes = max(int(nbytes), 0)
+        with self._condition:
+            if not self._waiting and self._fits(nbytes):
+                return self._admit(nbytes)
+            self._blocked += 1
+            if not block:
+                return None
+
+            ticket = object()
+            self._waiting.append(ticket)
+            started = time.monotonic()
+            try:
+                while self._waiting[0] is not ticket or not self._fits(nbytes):
+                    self._condition.wait()
+            finally:
+                self._waiting.remove(ticket)
+                self._blocked_s += time.monotonic() - started
+                # 队首变化后下一个请求可能已经可以放行
+                self._condition.notify_all()
+            return self._admit(nbytes)
+
+    def reserve(self, nbytes: int) -> Reservation:
+        """阻塞直到放行，用于 with 语句：with scheduler.reserve(n): ..."""
+        return self.acquire(nbytes)
+
+    def stats(self) -> dict:
+        """
+        计数器快照：
+        - queued: 正在排队等待放行的请求数
+        - running: 已放行尚未释放的任务数
+        - blocked: 累计未能立即放行的请求次数（阻塞等待或非阻塞申请被拒绝），blocked_s 为累计等待时间
+        - reserved_bytes / peak_reserved_bytes: 当前和历史最高的已放行内存估计
+        """
+        with self._condition:
+            return {
+                'queued': len(self._waiting),
+                'running': self._running,
+                'blocked': self._blocked,
+                'blocked_s': round(self._blocked_s, 3),
+                'admitted': self._admitted,
+                'reserved_bytes': self._reserved,
+                'peak_reserved_bytes': self._peak_reserved,
+                'memory_bytes': self.memory_bytes,
+                'slots': self.slots,
+            }
+
+    def _fits(self, nbytes: int) -> bool:
+        if self._running >= self.slots:
+            return False
+        if self.memory_bytes is None or self._reserved + nbytes <= self.memory_bytes:
+            return True
+        # 超出预算的任务只在其他任务都已释放时单独运行
+        return self._running == 0
+
+    def _admit(self, nbytes: int) -> Reservation:
+        self._running += 1
+        self._admitted += 1
+        self._reserved += nbytes
+        self._peak_reserved = max(self._peak_reserved, self._reserved)
+        return Reservation(self, nbytes)
+
+    def _release(self, reservation: Reservation):
+        with self._condition:
+            if reservation.released:
+                return
+            reservation.released = True
+            self._running -= 1
+            self._reserved -= reservation.nbytes
+            self._condition.notify_all()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> ResourceScheduler:
+    """进程内共享的调度器，首次使用时按 memory_budget() 和 CPU 核心数创建"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ResourceScheduler(memory_budget())
+        return _scheduler
+
+
+def configure_scheduler(memory_bytes: Optional[int] = None, slots: Optional[int] = None) -> ResourceScheduler:
+    """设置共享调度器的内存预算和槽位数，memory_bytes 为 None 时使用 memory_budget()"""
+    scheduler = get_scheduler()
+    scheduler.configure(memory_budget() if memory_bytes is None else memory_bytes, slots)
+    return scheduler
@@ -0,0 +1,162 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # Windows 下没有 resource 模块
+    resource = None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """当前进程的峰值常驻内存（字节），无法获取时返回 None"""
+    try:
+        # ru_maxrss 在 exec 后仍保留父进程的峰值，Linux 下优先使用只统计本进程的 VmHWM
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    scale = 1 if sys.platform == 'darwin' else 1024  # Linux 以 KB 为单位，macOS 以字节为单位
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class Span:
+    """一段计时：阶段名、开始时间（perf_counter 秒）、耗时、所在进程/线程和附加字段（如 page、bytes）"""
+
+    __slots__ = ('stage', 'start', 'duration', 'pid', 'tid', 'fields')
+
+    def __init__(self, stage: str, start: float, duration: float, pid: int, tid: int, fields: dict):
+        self.stage = stage
+        self.start = start
+        self.duration = duration
+        self.pid = pid
+        self.tid = tid
+        self.fields = fields
+
+    def to_tuple(self):
+        return self.stage, self.start, self.duration, self.pid, self.tid, self.fields
+
+
+class Telemetry:
+    """
+    转换流程的分阶段计时记录器，传给 merge_images_to_tif / generate_images 的 telemetry 参数。
+    - span(stage, **fields)：记录一个阶段的耗时，fields 中的 bytes 会在汇总中累加
+    - sample_memory()：记录当前进程的内存峰值
+    - summary()：按阶段汇总次数、总耗时、最大耗时和字节数
+    - write_chrome_trace(path)：导出 chrome://tracing / Perfetto 可打开的 JSON
+    工作进程中的计时通过 spans() / merge() 汇总到主进程（perf_counter 在同一台机器的进程间可比）。
+    需要实时处理时可继承并重写 on_span，例如写入日志或推送到监控系统。所有方法都是线程安全的。
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self._spans: List[Span] = []
+        self._memory_samples = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage: str, **fields):
+        start = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            # 调用方可以在 with 块内向 fields 补充字段（例如编码后的字节数）
+            self.record(stage, start, time.perf_counter() - start, **fields)
+
+    def record(self, stage: str, start: float, duration: float, pid: int = None, tid: int = None, **fields):
+        span = Span(stage, start, duration, pid or os.getpid(), tid or threading.get_ident(), fields)
+        with self._lock:
+            self._spans.append(span)
+        self.on_span(span)
+
+    def on_span(self, span: Span):
+        """每记录一个 span 时调用，默认不做任何事"""
+
+    def sample_memory(self, **fields):
+        rss = peak_rss_bytes()
+        if rss is not None:
+            with self._lock:
+                self._memory_samples.append((time.perf_counter(), os.getpid(), rss, fields))
+
+    def spans(self) -> list:
+        """可跨进程传递的 span 元组列表"""
+        with self._lock:
+            return [span.to_tuple() for span in self._spans]
+
+    def merge(self, spans: list, **extra):
+        """合并工作进程返回的 spans()，extra 为补充到每个 span 的字段（例如输出中的页码）"""
+        for stage, start, duration, pid, tid, fields in spans:
+            self.record(stage, start, duration, pid, tid, **dict(fields, **extra))
+
+    def summary(self) -> dict:
+        stages: Dict[str, dict] = {}
+        with self._lock:
+            spans = list(self._spans)
+            memory = list(self._memory_samples)
+        for span in spans:
+            stat = stages.setdefault(span.stage, {'count': 0, 'total_s': 0.0, 'max_s': 0.0, 'bytes': 0})
+            stat['count'] += 1
+            stat['total_s'] += span.duration
+            stat['max_s'] = max(stat['max_s'], span.duration)
+            stat['bytes'] += span.fields.get('bytes', 0)
+        for stat in stages.values():
+            stat['total_s'] = round(stat['total_s'], 6)
+            stat['max_s'] = round(stat['max_s'], 6)
+        peak = max((rss for _, _, rss, _ in memory), default=None)
+        return {'stages': stages, 'peak_rss_bytes': peak}
+
+    def chrome_trace(self) -> dict:
+        """Chrome Trace Event 格式：每个 span 为一个完整事件 (ph='X')，内存采样为计数器事件 (ph='C')"""
+        events = []
+        with self._lock:
+            spans = list(self._spans)
+            memory = list(self._memory_samples)
+        for span in spans:
+            events.append({
+                'name': span.stage, 'cat': 'pipeline', 'ph': 'X',
+                'ts': round((span.start - self.origin) * 1e6, 3), 'dur': round(span.duration * 1e6, 3),
+                'pid': span.pid, 'tid': span.tid,
+                'args': {key: value for key, value in span.fields.items() if _is_json_scalar(value)},
+            })
+        for timestamp, pid, rss, _ in memory:
+            events.append({'name': 'peak_rss', 'ph': 'C', 'ts': round((timestamp - self.origin) * 1e6, 3),
+                           'pid': pid, 'args': {'bytes': rss}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+
+
+class NullTelemetry(Telemetry):
+    """未提供 telemetry 时使用的空实现，不记录任何数据"""
+
+    enabled = False
+
+    @contextmanager
+    def span(self, stage: str, **fields):
+        yield fields
+
+    def record(self, stage, start, duration, pid=None, tid=None, **fields):
+        pass
+
+    def sample_memory(self, **fields):
+        pass
+
+
+NULL_TELEMETRY = NullTelemetry()
+
+
+def _is_json_scalar(value) -> bool:
+    return isinstance(value, (str, int, float, bool)) or value is None
@@ -0,0 +1,132 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from PIL import Image
+
+from core.common.disk_cache import DiskCache
+from core.config import (THUMBNAIL_CACHE_DIR, THUMBNAIL_CACHE_MAX_BYTES, THUMBNAIL_CACHE_MEMORY_BYTES,
+                         THUMBNAIL_CACHE_MEMORY_ITEMS)
+
+# 写入磁盘缓存时可直接保存为 PNG 的模式，其余模式统一转换为 RGB
+_PNG_MODES = {'1', 'L', 'LA', 'P', 'RGB', 'RGBA'}
+# 缩略图的渲染方式变化时递增，使旧条目失效（2：透明区域合成到白色背景上）
+_KEY_VERSION = 2
+
+
+def _image_bytes(img: Image.Image) -> int:
+    """图像像素数据占用的内存估计：宽 × 高 × 通道数"""
+    return img.width * img.height * len(img.getbands())
+
+
+class ThumbnailCache:
+    """
+    两级缩略图缓存：内存 LRU + 磁盘存储。
+    缓存键由文件绝对路径、修改时间、文件大小、渲染 DPI 和目标尺寸共同决定，
+    源文件被修改后旧条目自然失效。磁盘存储超过 max_bytes 时按最近访问时间淘汰；
+    内存 LRU 同时限制条目数 memory_items 和像素数据之和 memory_bytes，预览尺寸的大图不会占满内存。
+    所有方法都是线程安全的。
+    """
+
+    def __init__(self, cache_dir: str = THUMBNAIL_CACHE_DIR, max_bytes: int = THUMBNAIL_CACHE_MAX_BYTES,
+                 memory_items: int = THUMBNAIL_CACHE_MEMORY_ITEMS,
+                 memory_bytes: int = THUMBNAIL_CACHE_MEMORY_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.memory_bytes = memory_bytes
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        self._disk = DiskCache(cache_dir, max_bytes, suffix='.png')
+
+    @staticmethod
+    def make_key(path: str, box: Tuple[int, int], dpi: int = 200) -> str:
+        st = os.stat(path)
+        raw = f"{_KEY_VERSION}|{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}|{dpi}|{box[0]}x{box[1]}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, path: str, box: Tuple[int, int], dpi: int = 200) -> Image.Image:
+        """
+        返回不超过 box 尺寸的缩略图，PDF 取首页。
+        返回的是缓存图像的副本，调用者可以自由修改或关闭。
+        """
+        key = self.make_key(path, box, dpi)
+
+        img = self._get_memory(key)
+        if img is None:
+            img = self._get_disk(key)
+            if img is None:
+                img = self._render(path, box, dpi)
+                self._put_disk(key, img)
+            self._put_memory(key, img)
+        return img.copy()
+
+    def clear(self):
+        """清空内存和磁盘缓存"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+        self._disk.clear()
+
+    def _render(self, path: str, box: Tuple[int, int], dpi: int) -> Image.Image:
+        # 延迟导入，避免 core.common 在模块加载时依赖 PyMuPDF
+        from core.image_to_tif.image_to_tif import preview_image
+
+        # 只按目标尺寸所需的分辨率解码，见 Page.load_reduced
+        img = preview_image(path, dpi=dpi, box=box)
+        if img.mode not in _PNG_MODES:
+            img = img.convert('RGB')
+        return img
+
+    def _get_memory(self, key: str) -> Optional[Image.Image]:
+        with self._lock:
+            img = self._memory.get(key)
+            if img is not None:
+                self._memory.move_to_end(key)
+            return img
+
+    def _put_memory(self, key: str, img: Image.Image):
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_used -= _image_bytes(old)
+            self._memory[key] = img
+            self._memory_used += _image_bytes(img)
+            # 至少保留刚放入的一项
+            while len(self._memory) > 1 and (len(self._memory) > self.memory_items
+                                             or self._memory_used > self.memory_bytes):
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_used -= _image_bytes(evicted)
+
+    def _get_disk(self, key: str) -> Optional[Image.Image]:
+        data = self._disk.read(key)
+        if data is None:
+            return None
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                img.load()
+                return img.copy()
+        except (OSError, ValueError):
+            return None
+
+    def _put_disk(self, key: str, img: Image.Image):
+        buffer = io.BytesIO()
+        img.save(buffer, format='PNG')
+        self._disk.write(key, buffer.getvalue())
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_thumbnail_cache() -> ThumbnailCache:
+    """返回进程内共享的缩略图缓存实例"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ThumbnailCache()
+        return _default_cache
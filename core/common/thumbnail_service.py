@@ -0,0 +1,154 @@
+import heapq
+import itertools
+import os
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from core.common.thumbnail_cache import ThumbnailCache, get_thumbnail_cache
+
+# 优先级数值越小越先处理
+PRIORITY_SELECTED = 0
+PRIORITY_VISIBLE = 10
+PRIORITY_BACKGROUND = 20
+
+
+class ThumbnailRequest:
+    """一次缩略图请求，可通过 ThumbnailService.cancel 或 reprioritize 调整"""
+
+    def __init__(self, path: str, box: Tuple[int, int], dpi: int, priority: int):
+        self.path = path
+        self.box = box
+        self.dpi = dpi
+        self.priority = priority
+        self.callbacks: List[Callable] = []
+        self.cancelled = False
+        self.done = False
+
+    @property
+    def key(self):
+        return self.path, self.box, self.dpi
+
+
+class ThumbnailService:
+    """
+    后台异步生成缩略图：
+    - 在工作线程池中解码（Pillow 解码时会释放 GIL），结果通过回调逐个返回
+    - 按优先级调度，选中项和可见项优先处理
+    - 不再需要的请求可以随时取消，尚未开始的请求将被直接丢弃
+    回调签名为 callback(request, image, error)，在工作线程中调用，
+    GUI 需要自行切回主线程（例如通过 Qt 信号）。
+    """
+
+    def __init__(self, cache: Optional[ThumbnailCache] = None, workers: Optional[int] = None):
+        self.cache = cache or get_thumbnail_cache()
+        self._heap = []
+        self._pending = {}
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        # PyMuPDF 不支持多线程，PDF 渲染需要串行
+        self._pdf_lock = threading.Lock()
+
+        workers = workers or min(4, os.cpu_count() or 1)
+        self._threads = [threading.Thread(target=self._worker, daemon=True, name=f"thumbnail-{i}")
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def request(self, path: str, box: Tuple[int, int], callback: Callable,
+                priority: int = PRIORITY_BACKGROUND, dpi: int = 200) -> ThumbnailRequest:
+        """
+        提交一个缩略图请求。相同 (path, box, dpi) 的待处理请求会被合并，
+        优先级取两者中较高的一个。
+        """
+        with self._condition:
+            req = self._pending.get((path, box, dpi))
+            if req is None:
+                req = ThumbnailRequest(path, box, dpi, priority)
+                self._pending[req.key] = req
+                self._push(req)
+            elif priority < req.priority:
+                req.priority = priority
+                self._push(req)
+            req.callbacks.append(callback)
+            self._condition.notify()
+            return req
+
+    def reprioritize(self, req: ThumbnailRequest, priority: int):
+        """调整尚未开始的请求的优先级"""
+        with self._condition:
+            if req.done or req.cancelled or req.priority == priority:
+                return
+            req.priority = priority
+            self._push(req)
+            self._condition.notify()
+
+    def cancel(self, req: ThumbnailRequest):
+        """取消请求；已经开始处理的请求会完成，但不再调用回调"""
+        with self._condition:
+            req.cancelled = True
+            if self._pending.get(req.key) is req:
+                del self._pending[req.key]
+
+    def cancel_all(self):
+        with self._condition:
+            for req in self._pending.values():
+                req.cancelled = True
+            self._pending.clear()
+            self._heap.clear()
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+    def shutdown(self, wait: bool = False):
+        """停止工作线程，未处理的请求全部取消"""
+        self.cancel_all()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _push(self, req: ThumbnailRequest):
+        # 调整优先级时直接压入新条目，旧条目在弹出时按优先级不一致被跳过
+        heapq.heappush(self._heap, (req.priority, next(self._counter), req))
+
+    def _next_request(self) -> Optional[ThumbnailRequest]:
+        with self._condition:
+            while True:
+                while self._heap:
+                    priority, _, req = heapq.heappop(self._heap)
+                    if req.cancelled or req.done or priority != req.priority:
+                        continue
+                    # 出队后不再参与合并，之后相同的请求会重新排队（届时通常已命中缓存）
+                    del self._pending[req.key]
+                    return req
+                if self._closed:
+                    return None
+                self._condition.wait()
+
+    def _worker(self):
+        while True:
+            req = self._next_request()
+            if req is None:
+                return
+
+            image, error = None, None
+            try:
+                if os.path.splitext(req.path)[1].lower() == '.pdf':
+                    with self._pdf_lock:
+                        image = self.cache.get(req.path, req.box, req.dpi)
+                else:
+                    image = self.cache.get(req.path, req.box, req.dpi)
+            except Exception as e:
+                error = e
+
+            with self._condition:
+                req.done = True
+                if req.cancelled:
+                    continue
+                callbacks = list(req.callbacks)
+            for callback in callbacks:
+                callback(req, image, error)
@@ -1,2 +1,44 @@
+import os
+
 SUPPORTED_FORMATS = [".png", ".jpg", ".jpeg", ".gif", ".bmp"]
 THUMBNAIL_SIZE = (100, 100)
+
+# 保存 TIF 时可选的压缩方式：压缩名称 -> 界面说明（lzw 等别名的对应关系见 tif_writer.COMPRESSION_ALIASES）
+TIF_COMPRESSION_OPTIONS = {
+    "auto": "自动 (无损) - 黑白页 CCITT G4，其余 Deflate",
+    "raw": "Raw (无压缩) - 速度快，文件大",
+    "lzw": "LZW (无损) - 适用于线条图、文本",
+    "jpeg": "JPEG (有损) - 适用于照片，可调质量",
+    "deflate": "Deflate (无损) - 通用压缩，效果好",
+    "packbits": "PackBits (无损) - 适用于重复数据",
+    "tiff_adobe_deflate": "Adobe Deflate (无损) - 兼容性更好的Deflate",
+    "ccittfax4": "CCITT Fax4 (无损) - 适用于黑白图像"
+}
+# 保存 TIF 时可选的色彩模式策略（见 image_to_tif.color_mode）
+TIF_COLOR_MODE_OPTIONS = {
+    "rgb": "全部转为彩色 (RGB)",
+    "native": "保持原始模式 - 黑白、灰度扫描件不转为彩色",
+    "auto": "自动识别 - 实际为灰度或黑白的页面自动转换",
+    "gray": "全部转为灰度",
+    "bilevel": "全部转为黑白",
+}
+# 保存 TIF 时可选的瓦片尺寸：瓦片边长 -> 界面说明，None 表示按条带写入
+TIF_TILE_SIZE_OPTIONS = {
+    None: "不分块 - 兼容性最好",
+    256: "256 x 256 瓦片 - 适合超大幅面扫描件",
+    512: "512 x 512 瓦片",
+    1024: "1024 x 1024 瓦片",
+}
+# 预览区使用的缩略图尺寸，窗口缩放时仅缩放该图而不重新解码原图
+PREVIEW_SIZE = (1600, 1600)
+
+# 缩略图磁盘缓存
+THUMBNAIL_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "image-utils", "thumbnails")
+THUMBNAIL_CACHE_MAX_BYTES = 512 * 1024 * 1024
+THUMBNAIL_CACHE_MEMORY_ITEMS = 512
+# 内存中缓存的缩略图 / 预览图像素数据（宽 × 高 × 通道数）之和的上限
+THUMBNAIL_CACHE_MEMORY_BYTES = 128 * 1024 * 1024
+
+# 已编码 TIFF 页面缓存，增量重新生成多页 TIFF 时复用未变化的页面
+PAGE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "image-utils", "pages")
+PAGE_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
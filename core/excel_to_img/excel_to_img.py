@@ -1,14 +1,26 @@
+import functools
+import io
 import os
 import shutil
+from typing import Optional
+
+import numpy as np
 import pandas as pd
-from PIL import Image, ImageDraw, ImageFont
+
+from core.common.pipeline import admitted_map, ordered_map
+from core.common.scheduler import ResourceScheduler, get_scheduler
+from core.common.telemetry import NULL_TELEMETRY, Telemetry
+from core.excel_to_img.manifest import RenderManifest, manifest_source
+from core.excel_to_img.renderer import RowImageRenderer, format_lines
+from core.excel_to_img.share_files import ShareDistributor
+from core.excel_to_img.sheet_reader import SheetRowReader
+from core.excel_to_img.workbook_cache import get_workbook_info
 
 
 def get_excel_sheets(excel_path):
     """获取Excel文件的所有sheet名称"""
     try:
-        xl_file = pd.ExcelFile(excel_path)
-        return xl_file.sheet_names
+        return list(get_workbook_info(excel_path).sheet_names)
     except Exception as e:
         raise Exception(f"读取Excel文件失败: {str(e)}")
 
@@ -16,88 +28,31 @@ def get_excel_sheets(excel_path):
 def get_sheet_columns(excel_path, sheet_name):
     """获取指定sheet的所有列名"""
     try:
-        df = pd.read_excel(excel_path, sheet_name=sheet_name, nrows=0)
-        return df.columns.tolist()
+        return get_workbook_info(excel_path).columns(sheet_name)
     except Exception as e:
         raise Exception(f"读取sheet列名失败: {str(e)}")
 
 
-def create_image(data, output_path):
-    """将一行数据创建为图片"""
-    # --- Configuration ---
-    FONT_SIZE = 24
-    PADDING = 25
-    LINE_SPACING = 15
-    SEPARATOR_HEIGHT = 1
-    SEPARATOR_COLOR = (220, 220, 220)  # Light grey
-    FONT_COLOR = (0, 0, 0)  # Black
-    BACKGROUND_COLOR = (255, 255, 255)  # White
-    KEY_VALUE_SEPARATOR = " : "
-
+def get_sheet_row_count(excel_path, sheet_name):
+    """获取指定sheet的数据行数（不含表头），无法确定时返回 None"""
     try:
-        # Using STHeiti (Heiti SC) which is common on macOS and supports Chinese.
-        # For Windows, 'msyh.ttc' (Microsoft YaHei) is a good alternative.
-        # For Linux, a font like 'NotoSansCJK-Regular.otf' would be suitable.
-        font = ImageFont.truetype("STHeiti Medium.ttc", FONT_SIZE)
-    except IOError:
-        try:
-            # Windows fallback
-            font = ImageFont.truetype("msyh.ttc", FONT_SIZE)
-        except IOError:
-            # Fallback to default font if the specified font is not found.
-            font = ImageFont.load_default()
-
-    # --- Calculate image dimensions ---
-    max_text_width = 0
-    total_height = PADDING
-
-    lines = [f"{header}{KEY_VALUE_SEPARATOR}{value if value is not None and str(value).strip() != '' else ''}" 
-             for header, value in data.items()]
-
-    # Use a dummy image to calculate text sizes accurately
-    dummy_img = Image.new('RGB', (1, 1))
-    dummy_draw = ImageDraw.Draw(dummy_img)
-
-    for i, line in enumerate(lines):
-        bbox = dummy_draw.textbbox((0, 0), line, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-
-        if text_width > max_text_width:
-            max_text_width = text_width
-
-        total_height += text_height
-        if i < len(lines) - 1:
-            # Add space for the line and the separator
-            total_height += LINE_SPACING + SEPARATOR_HEIGHT
-
-    total_height += PADDING
-    image_width = max_text_width + (PADDING * 2)
-
-    # --- Create Image and Draw ---
-    img = Image.new('RGB', (int(image_width), int(total_height)), color=BACKGROUND_COLOR)
-    d = ImageDraw.Draw(img)
-
-    y_cursor = PADDING
-    for i, line in enumerate(lines):
-        # Draw text
-        d.text((PADDING, y_cursor), line, font=font, fill=FONT_COLOR)
-
-        # Calculate text height for this line to advance the cursor
-        bbox = d.textbbox((0, 0), line, font=font)
-        text_height = bbox[3] - bbox[1]
-
-        # Move cursor down past the text
-        y_cursor += text_height
-
-        # Draw separator line if it's not the last item
-        if i < len(lines) - 1:
-            y_cursor += (LINE_SPACING // 2)
-            d.line([(PADDING, y_cursor), (image_width - PADDING, y_cursor)], 
-                   fill=SEPARATOR_COLOR, width=SEPARATOR_HEIGHT)
-            y_cursor += (LINE_SPACING // 2) + SEPARATOR_HEIGHT
-
-    img.save(output_path)
+        return get_workbook_info(excel_path).row_count(sheet_name)
+    except Exception as e:
+        raise Exception(f"读取sheet行数失败: {str(e)}")
+
+
+_default_renderer = None
+
+
+def create_image(data, output_path, renderer: Optional[RowImageRenderer] = None):
+    """将一行数据创建为图片"""
+    global _default_renderer
+    if renderer is None:
+        # 复用同一个渲染器，避免每次调用都重新加载字体
+        if _default_renderer is None:
+            _default_renderer = RowImageRenderer()
+        renderer = _default_renderer
+    renderer.render_to_file(data, output_path)
 
 
 def copy_dir_files(source, target):
@@ -111,7 +66,231 @@ def copy_dir_files(source, target):
             shutil.copy(source_file, target_file)
 
 
-def generate_images(excel_path, sheet_name, output_dir, naming_field=None, is_grouped=False, share_dir=None):
+# 文件名中允许保留的字符：字母数字（含中文等 Unicode 字符）、空格、'-' 和 '_'
+_ILLEGAL_NAME_CHARS = r'[^\w \-]'
+
+
+def prepare_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """将所有单元格统一转换为字符串，空值、NaT、NaN 转换为空字符串"""
+    # 随后统一转为字符串，fillna 不需要对 object 列做类型下转（也避免 pandas 的 FutureWarning）
+    with pd.option_context('future.no_silent_downcasting', True):
+        df = df.fillna('')
+    return df.astype(str).replace(['NaT', 'nan', 'NaN'], '')
+
+
+def sanitize_names(values: pd.Series) -> pd.Series:
+    """按列过滤文件名中的非法字符（与逐字符 isalnum 判断等价）"""
+    return values.astype(str).str.replace(_ILLEGAL_NAME_CHARS, '', regex=True).str.strip()
+
+
+class NamePlanner:
+    """
+    非分组模式下为输出文件分配文件名，可逐块增量调用。
+    重名判断基于运行前目录中已有的文件和本次已分配的文件名，结果与逐个写入时检查磁盘一致。
+    reusable_names 中的文件（上一次增量生成的输出）不视为已占用，再次运行时沿用原文件名。
+    """
+
+    def __init__(self, output_dir, reusable_names=()):
+        self.output_dir = output_dir
+        self.taken = {os.path.normcase(name) for name in os.listdir(output_dir)} if os.path.isdir(output_dir) else set()
+        self.taken -= {os.path.normcase(name) for name in reusable_names}
+
+    def assign(self, name_val, row_number) -> str:
+        """name_val 为已过滤的命名字段值，为 None 表示未指定命名字段；返回图片完整路径"""
+        if name_val is not None:
+            image_name = f"{name_val or f'row_{row_number}'}.png"
+
+            # 处理重名：如果文件已存在，添加后缀
+            counter = 1
+            base_name = image_name
+            while os.path.normcase(image_name) in self.taken:
+                image_name = f"{os.path.splitext(base_name)[0]}_{counter}.png"
+                counter += 1
+        else:
+            # 兜底：使用行号
+            image_name = f"row_{row_number}.png"
+
+        self.taken.add(os.path.normcase(image_name))
+        return os.path.join(self.output_dir, image_name)
+
+
+def plan_groups(keys: pd.Series, output_dir):
+    """
+    分组模式：按分组值（与 groupby 默认一样排序）为每一行确定输出路径。
+    keys 为已经过 prepare_frame 处理的命名字段列。
+    返回 (image_paths, order, case_dirs)：
+    - image_paths: 与 keys 行顺序一致的输出路径
+    - order: 逐组处理时的行顺序（先按分组、再按原顺序）
+    - case_dirs: 需要创建的分组目录
+    """
+    grouped = keys.groupby(keys)
+    group_ids = grouped.ngroup().to_numpy()
+    group_row_numbers = (grouped.cumcount() + 1).to_numpy()
+
+    case_ids = []
+    case_dirs = []
+    for group_idx, name in enumerate(sanitize_names(grouped.size().index.to_series())):
+        case_ids.append(name or f"group_{group_idx}")
+        case_dirs.append(os.path.join(output_dir, case_ids[group_idx]))
+
+    # 文件名：分组值_索引.png
+    image_paths = [os.path.join(case_dirs[group_id], f"{case_ids[group_id]}_{row_number}.png")
+                   for group_id, row_number in zip(group_ids, group_row_numbers)]
+    order = np.argsort(group_ids, kind='stable')
+    return image_paths, order, case_dirs
+
+
+def plan_outputs(df, output_dir, naming_field=None, is_grouped=False, reusable_names=()):
+    """
+    在内存中为每一行确定输出文件路径（包括重名处理），不写任何文件。
+    df 需已经过 prepare_frame 处理。
+    返回 (tasks, case_dirs)：tasks 为按输出顺序排列的 (image_path, lines) 列表，
+    case_dirs 为分组模式下需要创建的分组目录。
+    同一路径出现多次时以最后一次为准，与顺序写入时后者覆盖前者的结果一致。
+    """
+    tasks = {}
+    case_dirs = []
+    lines = format_lines(df)
+
+    if is_grouped and naming_field and naming_field in df.columns:
+        # 分组模式：按 naming_field 分组，创建文件夹
+        image_paths, order, case_dirs = plan_groups(df[naming_field], output_dir)
+        for i in order:
+            tasks.pop(image_paths[i], None)
+            tasks[image_paths[i]] = lines[i]
+    else:
+        # 非分组模式：所有图片生成在 output_dir 下
+        planner = NamePlanner(output_dir, reusable_names)
+        if naming_field and naming_field in df.columns:
+            names = sanitize_names(df[naming_field]).tolist()
+        else:
+            names = [None] * len(df)
+        for i, name_val in enumerate(names):
+            image_path = planner.assign(name_val, i + 1)
+            tasks.pop(image_path, None)
+            tasks[image_path] = lines[i]
+
+    return list(tasks.items()), case_dirs
+
+
+def _timed_chunks(chunks, telemetry: Telemetry):
+    """逐块读取并记录每块的读取耗时"""
+    chunks = iter(chunks)
+    while True:
+        with telemetry.span('read') as span:
+            chunk = next(chunks, None)
+            span['rows'] = 0 if chunk is None else len(chunk)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def _iter_streaming_tasks(reader: SheetRowReader, output_dir, naming_field, is_grouped, chunk_rows,
+                          reusable_names=(), telemetry: Telemetry = NULL_TELEMETRY):
+    """
+    流式模式：边读取边产出 (image_path, lines)，内存只保留一块数据。
+    分组模式采用两遍读取：第一遍只读命名字段确定分组和文件名，第二遍读取完整行并直接渲染。
+    返回 (tasks 迭代器, case_dirs, total)
+    """
+    if is_grouped and naming_field and naming_field in reader.columns:
+        key_chunks = [prepare_frame(chunk)[naming_field]
+                      for chunk in _timed_chunks(reader.iter_chunks(chunk_rows, usecols=[naming_field]), telemetry)]
+        with telemetry.span('plan'):
+            keys = pd.concat(key_chunks, ignore_index=True) if key_chunks else pd.Series([], dtype=object)
+            image_paths, order, case_dirs = plan_groups(keys, output_dir)
+
+        # 同一路径出现多次时，只保留逐组处理顺序中的最后一行
+        winner = {}
+        for i in order:
+            winner[image_paths[i]] = i
+        keep = set(winner.values())
+
+        def tasks():
+            offset = 0
+            for chunk in _timed_chunks(reader.iter_chunks(chunk_rows), telemetry):
+                with telemetry.span('prepare', rows=len(chunk)):
+                    lines = format_lines(prepare_frame(chunk))
+                for i, row_lines in enumerate(lines, offset):
+                    if i in keep:
+                        yield image_paths[i], row_lines
+                offset += len(lines)
+
+        return tasks(), case_dirs, len(keep)
+
+    def tasks():
+        planner = NamePlanner(output_dir, reusable_names)
+        offset = 0
+        for chunk in _timed_chunks(reader.iter_chunks(chunk_rows), telemetry):
+            with telemetry.span('prepare', rows=len(chunk)):
+                chunk = prepare_frame(chunk)
+                lines = format_lines(chunk)
+                if naming_field and naming_field in chunk.columns:
+                    names = sanitize_names(chunk[naming_field]).tolist()
+                else:
+                    names = [None] * len(chunk)
+            for i, (name_val, row_lines) in enumerate(zip(names, lines), offset):
+                yield planner.assign(name_val, i + 1), row_lines
+            offset += len(chunk)
+
+    return tasks(), [], reader.estimated_rows
+
+
+# 工作进程内的渲染器，每个进程只加载一次字体
+_worker_renderer = None
+
+
+def _render_chunk(chunk, traced=False):
+    """
+    渲染一批 (image_path, lines) 并保存，可在工作进程中执行。
+    返回 ([(image_path, 文件大小)], 计时列表)，traced 为 False 时计时列表为空。
+    """
+    global _worker_renderer
+    if _worker_renderer is None:
+        _worker_renderer = RowImageRenderer()
+    telemetry = Telemetry() if traced else NULL_TELEMETRY
+    written = []
+    for image_path, lines in chunk:
+        fields = {'file': os.path.basename(image_path)}
+        with telemetry.span('render', **fields):
+            img = _worker_renderer.render_lines(lines)
+        # 先编码到内存再写入文件，与 img.save(image_path) 的结果一致
+        with telemetry.span('encode', **fields) as span:
+            buffer = io.BytesIO()
+            img.save(buffer, format='PNG')
+            data = buffer.getvalue()
+            span['bytes'] = len(data)
+        with telemetry.span('write', bytes=len(data), **fields):
+            with open(image_path, 'wb') as f:
+                f.write(data)
+        written.append((image_path, len(data)))
+    return written, telemetry.spans()
+
+
+def _chunk_bytes(chunk) -> int:
+    """
+    渲染一批时的内存估计：逐张渲染，同一时刻只有一张图片及其 PNG 编码结果（与 ExcelPreflight.peak_rss_bytes 一致），
+    按这批中最大的一张估计
+    """
+    width, height = max((RowImageRenderer.estimate_size(lines) for _, lines in chunk),
+                        key=lambda size: size[0] * size[1], default=(0, 0))
+    return 3 * width * height * 3
+
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def generate_images(excel_path, sheet_name, output_dir, naming_field=None, is_grouped=False, share_dir=None,
+                    workers=1, chunk_size=64, progress_callback=None, streaming=False, stream_chunk_rows=1000,
+                    incremental=False, share_strategy='auto', verify_share=True,
+                    telemetry: Optional[Telemetry] = None, scheduler: Optional[ResourceScheduler] = None):
     """
     生成图片的核心逻辑
     
@@ -122,63 +301,99 @@ def generate_images(excel_path, sheet_name, output_dir, naming_field=None, is_gr
         naming_field: 命名字段（必选，用于命名文件或分组文件夹）
         is_grouped: 是否分组（如果为True，则按naming_field分组，否则仅用其命名文件）
         share_dir: 共享文件目录（可选）
+        workers: 渲染进程数，默认 1 即在当前进程内顺序渲染；传入 None 使用全部 CPU 核心。
+            所有文件名在渲染前统一确定，并行与顺序运行生成的文件完全一致。
+        chunk_size: 并行模式下每个任务包含的行数
+        progress_callback: 可选的回调函数，接受当前进度 (0-100) 和消息
+        streaming: 为 True 时使用 openpyxl 只读模式逐块读取 .xlsx，边读边渲染，内存占用与行数无关。
+            列类型按块推断（见 SheetRowReader），分组模式需要读取两遍。
+        stream_chunk_rows: 流式模式下每次读取的行数
+        incremental: 为 True 时在输出目录中维护清单（见 RenderManifest），只渲染内容、渲染参数或文件名
+            发生变化的行，并删除已不存在的行对应的图片；中途失败后再次运行会跳过已完成的行。
+            清单按来源（工作簿、sheet、命名字段和是否分组）区分，只删除同一来源生成的旧图片。
+        share_strategy: 分组模式下共享文件的分发方式：'auto'（默认，依次尝试 reflink、硬链接、符号链接、复制）、
+            'reflink'、'hardlink'、'symlink' 或 'copy'，见 ShareDistributor
+        verify_share: 是否在每个分组分发完成后校验共享文件
+        telemetry: 可选的 Telemetry，记录 read / prepare / plan / share / render / encode / write 各阶段的
+            耗时、字节数和内存峰值（包括工作进程中的阶段），见 core.common.telemetry
+        scheduler: 每批渲染前按估计的图片尺寸申请放行的 ResourceScheduler，默认为进程内共享的 get_scheduler()，
+            与同时运行的其他转换任务共用内存预算和工作槽位，资源不足时暂停提交新的批次
     """
+    telemetry = telemetry or NULL_TELEMETRY
+    scheduler = scheduler or get_scheduler()
     # 创建输出目录
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
-    
-    # 读取Excel数据
-    df = pd.read_excel(excel_path, sheet_name=sheet_name)
-    df = df.fillna('')
-    df = df.astype(str).replace(['NaT', 'nan', 'NaN'], '')
-    
-    if is_grouped and naming_field and naming_field in df.columns:
-        # 分组模式：按 naming_field 分组，创建文件夹
-        grouped = df.groupby(naming_field)
-        
-        for group_idx, (group_value, group) in enumerate(grouped):
-            case_id = str(group_value)
-            # 过滤掉非法字符
-            case_id = "".join([c for c in case_id if c.isalnum() or c in (' ', '-', '_')]).strip()
-            if not case_id:
-                case_id = f"group_{group_idx}"
-
-            case_dir = os.path.join(output_dir, case_id)
-            
-            if not os.path.exists(case_dir):
-                os.makedirs(case_dir)
-            
-            # 复制共享文件
-            if share_dir and os.path.exists(share_dir):
-                copy_dir_files(share_dir, case_dir)
-            
-            # 为分组中的每一行生成图片
-            for group_row_index, (original_row_index, row) in enumerate(group.iterrows()):
-                # 文件名：分组值_索引.png
-                image_name = f"{case_id}_{group_row_index + 1}.png"
-                image_path = os.path.join(case_dir, image_name)
-                create_image(row, image_path)
+
+    manifest = None
+    if incremental:
+        manifest = RenderManifest(output_dir, manifest_source(excel_path, sheet_name, naming_field, is_grouped))
+    reusable_names = manifest.owned_names(output_dir) if manifest else ()
+
+    if streaming:
+        reader = SheetRowReader(excel_path, sheet_name)
+        tasks, case_dirs, total = _iter_streaming_tasks(reader, output_dir, naming_field, is_grouped,
+                                                        stream_chunk_rows, reusable_names, telemetry)
     else:
-        # 非分组模式：所有图片生成在 output_dir 下
-        for index, row in df.iterrows():
-            if naming_field and naming_field in row:
-                name_val = str(row[naming_field])
-                # 过滤非法字符
-                name_val = "".join([c for c in name_val if c.isalnum() or c in (' ', '-', '_')]).strip()
-                if not name_val:
-                     name_val = f"row_{index + 1}"
-                image_name = f"{name_val}.png"
-                
-                # 处理重名：如果文件已存在，添加后缀
-                counter = 1
-                base_name = image_name
-                while os.path.exists(os.path.join(output_dir, image_name)):
-                    image_name = f"{os.path.splitext(base_name)[0]}_{counter}.png"
-                    counter += 1
-            else:
-                # 兜底：使用行索引
-                image_name = f"row_{index + 1}.png"
-            
-            image_path = os.path.join(output_dir, image_name)
-            create_image(row, image_path)
+        # 读取Excel数据
+        with telemetry.span('read') as span:
+            df = get_workbook_info(excel_path).read_sheet(sheet_name)
+            span['rows'] = len(df)
+        with telemetry.span('prepare', rows=len(df)):
+            df = prepare_frame(df)
+        with telemetry.span('plan', rows=len(df)):
+            tasks, case_dirs = plan_outputs(df, output_dir, naming_field, is_grouped, reusable_names)
+        total = len(tasks)
+
+    for case_dir in case_dirs:
+        if not os.path.exists(case_dir):
+            os.makedirs(case_dir)
+
+    # 分发共享文件：共享目录只扫描一次，尽量以链接代替复制
+    if case_dirs and share_dir and os.path.exists(share_dir):
+        if progress_callback:
+            progress_callback(0, f"正在分发共享文件到 {len(case_dirs)} 个分组...")
+        with telemetry.span('share', groups=len(case_dirs)):
+            ShareDistributor(share_dir, share_strategy, verify_share).distribute_all(case_dirs)
+
+    if manifest:
+        tasks = manifest.filter_tasks(tasks)
+
+    # 文本行已在当前进程中按列格式化，工作进程只负责排版、绘制和 PNG 编码
+    chunks = _chunked(tasks, chunk_size)
+    render = functools.partial(_render_chunk, traced=telemetry.enabled)
+
+    def admit(chunk, block):
+        return scheduler.acquire(_chunk_bytes(chunk), block)
+
+    if workers == 1:
+        results = admitted_map(render, chunks, admit)
+    else:
+        results = ordered_map(render, chunks, workers=workers, admit=admit)
+
+    rendered = 0
+    try:
+        for written, spans in results:
+            telemetry.merge(spans)
+            telemetry.sample_memory(rows=rendered + len(written))
+            rendered += len(written)
+            if manifest:
+                for image_path, size in written:
+                    manifest.record(image_path, size)
+            if progress_callback:
+                # 跳过的行也计入进度；流式模式下的总行数是估计值
+                done = rendered + (manifest.skipped if manifest else 0)
+                progress = min(int(done / max(total, 1) * 100), 99)
+                progress_callback(progress, f"已生成 {done}/{max(total, done)} 张图片")
+        if manifest:
+            manifest.prune()
+    finally:
+        # 中途失败时也保存已完成的部分，下次运行从断点继续
+        if manifest:
+            manifest.save()
 
+    if progress_callback:
+        if manifest and manifest.skipped:
+            progress_callback(100, f"已生成 {rendered} 张图片，{manifest.skipped} 张未变化已跳过")
+        else:
+            progress_callback(100, f"已生成 {rendered} 张图片")
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import time
+from typing import Iterable, Iterator, List, Tuple
+
+from core.excel_to_img.renderer import FONT_CANDIDATES, RowImageRenderer, load_font
+
+# 清单文件保存在输出目录中，以 '.' 开头，避免与生成的图片混在一起
+MANIFEST_NAME = ".image-utils-manifest.json"
+# 版本 2 起每个条目记录生成它的来源，旧版本的清单不再使用（其中的图片保留在目录中，不会被删除）
+MANIFEST_VERSION = 2
+
+
+def render_settings(renderer_cls=RowImageRenderer) -> dict:
+    """影响输出图片内容的渲染参数，任何一项变化都会使已有图片失效"""
+    font_path = getattr(load_font(renderer_cls.FONT_SIZE), "path", None)
+    return {
+        # 默认字体从内存加载，没有文件路径
+        "font": font_path if isinstance(font_path, str) else None,
+        "font_candidates": list(FONT_CANDIDATES),
+        "font_size": renderer_cls.FONT_SIZE,
+        "padding": renderer_cls.PADDING,
+        "line_spacing": renderer_cls.LINE_SPACING,
+        "separator_height": renderer_cls.SEPARATOR_HEIGHT,
+        "separator_color": list(renderer_cls.SEPARATOR_COLOR),
+        "font_color": list(renderer_cls.FONT_COLOR),
+        "background_color": list(renderer_cls.BACKGROUND_COLOR),
+    }
+
+
+def manifest_source(excel_path: str, sheet_name: str, naming_field=None, is_grouped=False) -> str:
+    """清单条目的来源标识：工作簿路径、sheet、命名字段和是否分组，同一输出目录可以保存多个来源的图片"""
+    return json.dumps([os.path.normcase(os.path.abspath(excel_path)), sheet_name, naming_field, bool(is_grouped)],
+                      ensure_ascii=False)
+
+
+class RenderManifest:
+    """
+    记录输出目录中每个图片由哪个来源（见 manifest_source）的哪一行生成：
+    {相对路径: {"digest": 行内容与渲染参数的哈希, "size": 文件大小, "source": 来源}}
+    再次生成时，内容、参数和文件名都未变化且文件仍完整存在的行直接跳过；
+    同一来源在本次运行中不再出现的文件名（对应的行已删除或改名）在运行完成后删除，
+    其他来源（例如同一目录中另一个 sheet）生成的图片不受影响。
+    清单在生成过程中定期保存，中途失败或取消后再次运行会从断点继续。
+    """
+
+    def __init__(self, output_dir: str, source: str = '', settings: dict = None, save_interval: float = 5.0):
+        self.output_dir = output_dir
+        self.source = source
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.settings = settings if settings is not None else render_settings()
+        self._settings_digest = hashlib.sha1(
+            json.dumps(self.settings, sort_keys=True).encode("utf-8")).hexdigest()
+        self.save_interval = save_interval
+        self.entries = self._load()
+        self.skipped = 0
+        self._seen = set()
+        self._rendering = {}
+        self._last_save = time.monotonic()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+            return {}
+        entries = data.get("entries")
+        return entries if isinstance(entries, dict) else {}
+
+    def owned_names(self, directory: str) -> set:
+        """清单中由同一来源生成、位于 directory 下的文件名，供重名检查时视为空闲"""
+        names = set()
+        for rel_path, entry in self.entries.items():
+            if entry.get("source") != self.source:
+                continue
+            if os.path.dirname(self._abs(rel_path)) == os.path.normpath(directory):
+                names.add(os.path.basename(rel_path))
+        return names
+
+    def digest(self, lines: List[str]) -> str:
+        payload = json.dumps(lines, ensure_ascii=False)
+        return hashlib.sha1(f"{self._settings_digest}\n{payload}".encode("utf-8")).hexdigest()
+
+    def filter_tasks(self, tasks: Iterable[Tuple[str, list]]) -> Iterator[Tuple[str, list]]:
+        """只产出需要重新渲染的 (image_path, lines)，未变化的行计入 skipped"""
+        for image_path, lines in tasks:
+            rel_path = self._rel(image_path)
+            digest = self.digest(lines)
+            self._seen.add(rel_path)
+            entry = self.entries.get(rel_path)
+            if entry and entry.get("source") == self.source and entry.get("digest") == digest \
+                    and self._is_intact(image_path, entry):
+                self.skipped += 1
+                continue
+            # 渲染完成前先移除旧记录，中途中断时不会把未写完的文件当作有效输出
+            self.entries.pop(rel_path, None)
+            self._rendering[rel_path] = digest
+            yield image_path, lines
+
+    def record(self, image_path: str, size: int):
+        """记录一张已写入磁盘的图片，并按 save_interval 定期保存清单"""
+        rel_path = self._rel(image_path)
+        digest = self._rendering.pop(rel_path, None)
+        if digest is None:
+            return
+        self.entries[rel_path] = {"digest": digest, "size": size, "source": self.source}
+        if time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def prune(self) -> int:
+        """删除同一来源在本次运行中未生成的旧图片（对应的行已被删除或改名），返回删除的数量"""
+        removed = 0
+        stale = [p for p, entry in self.entries.items() if p not in self._seen and entry.get("source") == self.source]
+        for rel_path in stale:
+            del self.entries[rel_path]
+            image_path = self._abs(rel_path)
+            try:
+                os.remove(image_path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            # 分组目录中只剩共享文件时保留目录，完全为空时删除
+            directory = os.path.dirname(image_path)
+            if os.path.normpath(directory) != os.path.normpath(self.output_dir):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass
+        return removed
+
+    def save(self):
+        """先写临时文件再替换，保证清单文件始终完整"""
+        data = {"version": MANIFEST_VERSION, "settings": self.settings, "entries": self.entries}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._last_save = time.monotonic()
+
+    def _is_intact(self, image_path: str, entry: dict) -> bool:
+        try:
+            return os.path.getsize(image_path) == entry.get("size")
+        except OSError:
+            return False
+
+    def _rel(self, image_path: str) -> str:
+        return os.path.relpath(image_path, self.output_dir).replace(os.sep, "/")
+
+    def _abs(self, rel_path: str) -> str:
+        return os.path.normpath(os.path.join(self.output_dir, rel_path))
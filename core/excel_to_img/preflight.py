@@ -0,0 +1,105 @@
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from core.common.pipeline import default_workers
+from core.common.preflight import BASE_RSS_BYTES, WORKER_RSS_BYTES
+from core.excel_to_img.renderer import RowImageRenderer
+from core.excel_to_img.workbook_cache import get_workbook_info
+
+# 估计图片宽度时假定的单元格内容，实际宽度取决于最长的一行
+VALUE_SAMPLE = '示例内容示例内容 0000'
+# 非流式模式下每个单元格的内存占用（工作簿解析、DataFrame 和格式化后的文本行），按实测校准
+CELL_BYTES = 320
+# 流式模式下当前块中每个单元格的内存占用
+STREAM_CELL_BYTES = 1024
+# 流式模式下为每行保留的内存（已分配的文件名，分组模式下还有分组键和输出路径）
+STREAM_ROW_BYTES = 256
+# 渲染器文本尺寸缓存中每个条目的内存，条目数不超过 RowImageRenderer.METRICS_CACHE_SIZE
+METRICS_ENTRY_BYTES = 256
+# 文字图片 PNG 编码后的典型压缩比（输出 / 未压缩 RGB）
+PNG_COMPRESSION_RATIO = 0.05
+# 流式模式只支持 openpyxl 能以只读模式打开的格式（见 SheetRowReader）
+STREAMING_SUFFIXES = ('.xlsx', '.xlsm')
+
+
+@dataclass
+class ExcelPreflight:
+    """
+    preflight_excel 的结果：
+    - rows: sheet 记录的数据行数，文件未记录尺寸时为 None（估计按 0 行计算）
+    - columns: 表头列名
+    - image_size: 按 VALUE_SAMPLE 排版的单张图片尺寸估计，高度只随各行字形略有差异，宽度取决于内容
+    """
+    excel_path: str
+    sheet_name: str
+    rows: Optional[int]
+    columns: List[str] = field(default_factory=list)
+    image_size: Tuple[int, int] = (0, 0)
+
+    @property
+    def cells(self) -> int:
+        return (self.rows or 0) * len(self.columns)
+
+    @property
+    def image_bytes(self) -> int:
+        """单张图片的未压缩 RGB 数据量"""
+        return self.image_size[0] * self.image_size[1] * 3
+
+    @property
+    def pixels(self) -> int:
+        """所有图片的像素数：两种模式都为每一行生成一张图片（分组模式下写入该组的目录），按估计的图片尺寸计算"""
+        return (self.rows or 0) * self.image_size[0] * self.image_size[1]
+
+    @property
+    def supports_streaming(self) -> bool:
+        return os.path.splitext(self.excel_path)[1].lower() in STREAMING_SUFFIXES
+
+    def output_bytes(self) -> int:
+        """输出图片的总大小估计（不含共享文件），每一行一张图片"""
+        return (self.rows or 0) * int(self.image_bytes * PNG_COMPRESSION_RATIO)
+
+    def peak_rss_bytes(self, streaming=False, workers=1, stream_chunk_rows=1000) -> int:
+        """
+        按 generate_images 的同名参数估计峰值常驻内存：
+        - 非流式：整张 sheet 及全部文本行驻留内存
+        - 流式：只保留一块数据，以及每行已分配的文件名
+        - 每个渲染进程同时持有一张图片及其 PNG 编码结果，以及逐渐填满的文本尺寸缓存
+        """
+        if streaming:
+            data = min(stream_chunk_rows, self.rows or 0) * len(self.columns) * STREAM_CELL_BYTES
+            data += (self.rows or 0) * STREAM_ROW_BYTES
+        else:
+            data = self.cells * CELL_BYTES
+        render = 3 * self.image_bytes + min(self.cells, RowImageRenderer.METRICS_CACHE_SIZE) * METRICS_ENTRY_BYTES
+        workers = workers or default_workers()
+        if workers == 1:
+            return BASE_RSS_BYTES + data + render
+        return BASE_RSS_BYTES + data + workers * (WORKER_RSS_BYTES + render)
+
+    def summary(self, **kwargs) -> dict:
+        """可序列化为 JSON 的汇总，kwargs 为 peak_rss_bytes 的 workers 等参数，两种读取方式分别估计"""
+        kwargs.pop('streaming', None)
+        return {
+            'rows': self.rows,
+            'columns': len(self.columns),
+            'image_size': list(self.image_size),
+            'pixels': self.pixels,
+            'output_bytes': self.output_bytes(),
+            'peak_rss_bytes': self.peak_rss_bytes(False, **kwargs),
+            'streaming_peak_rss_bytes': self.peak_rss_bytes(True, **kwargs) if self.supports_streaming else None,
+        }
+
+
+def preflight_excel(excel_path: str, sheet_name: str, renderer: Optional[RowImageRenderer] = None) -> ExcelPreflight:
+    """
+    预检 generate_images 的输入：只读取表头和 sheet 记录的行数（与 get_sheet_columns 共用已解析的工作簿），
+    不读取数据行，返回可按运行参数估计峰值内存和输出大小的 ExcelPreflight。
+    """
+    info = get_workbook_info(excel_path)
+    if sheet_name not in info.sheet_names:
+        raise ValueError(f"工作簿中没有名为 {sheet_name} 的 sheet")
+    columns = [str(column) for column in info.columns(sheet_name)]
+    renderer = renderer or RowImageRenderer()
+    _, image_size = renderer.layout(renderer.format_lines({column: VALUE_SAMPLE for column in columns}))
+    return ExcelPreflight(excel_path, sheet_name, info.row_count(sheet_name), columns, image_size)
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Using STHeiti (Heiti SC) which is common on macOS and supports Chinese.
+# For Windows, 'msyh.ttc' (Microsoft YaHei) is a good alternative.
+# For Linux, a font like 'NotoSansCJK-Regular.otf' would be suitable.
+FONT_CANDIDATES = ("STHeiti Medium.ttc", "msyh.ttc")
+
+
+@lru_cache(maxsize=None)
+def load_font(size: int):
+    """按候选顺序加载 TrueType 字体，都找不到时使用默认字体。结果在进程内缓存。"""
+    for name in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(name, size)
+        except IOError:
+            continue
+    # Fallback to default font if the specified font is not found.
+    return ImageFont.load_default()
+
+
+class RowImageRenderer:
+    """
+    将一行数据渲染为 "字段 : 值" 逐行排列的图片。
+    字体只在创建时加载一次，每行文本的尺寸在 LRU 中缓存，
+    布局只计算一次并在绘制时直接复用。
+    """
+
+    FONT_SIZE = 24
+    PADDING = 25
+    LINE_SPACING = 15
+    SEPARATOR_HEIGHT = 1
+    SEPARATOR_COLOR = (220, 220, 220)  # Light grey
+    FONT_COLOR = (0, 0, 0)  # Black
+    BACKGROUND_COLOR = (255, 255, 255)  # White
+    KEY_VALUE_SEPARATOR = " : "
+    METRICS_CACHE_SIZE = 65536
+
+    def __init__(self, metrics_cache_size: int = METRICS_CACHE_SIZE):
+        self.font = load_font(self.FONT_SIZE)
+        self.metrics_cache_size = metrics_cache_size
+        self._metrics = OrderedDict()
+        # 仅用于测量文本的画布，textbbox 与在真实画布上测量的结果一致
+        self._measure_draw = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+
+    def format_lines(self, data) -> List[str]:
+        """将 {字段: 值} 格式化为待绘制的文本行，空值显示为空，规则与批量生成使用的 format_lines 相同"""
+        import pandas as pd
+
+        # data 可以是 dict 或 pd.Series，统一按 items() 遍历
+        items = list(data.items())
+        row = pd.DataFrame([['' if value is None else str(value) for _, value in items]],
+                           columns=[header for header, _ in items], dtype=object)
+        return format_lines(row, self.KEY_VALUE_SEPARATOR)[0]
+
+    def measure(self, line: str) -> Tuple[int, int]:
+        """返回文本行的 (宽, 高)，结果缓存在 LRU 中"""
+        size = self._metrics.get(line)
+        if size is not None:
+            self._metrics.move_to_end(line)
+            return size
+
+        bbox = self._measure_draw.textbbox((0, 0), line, font=self.font)
+        size = (bbox[2] - bbox[0], bbox[3] - bbox[1])
+        self._metrics[line] = size
+        if len(self._metrics) > self.metrics_cache_size:
+            self._metrics.popitem(last=False)
+        return size
+
+    def layout(self, lines: List[str]) -> Tuple[List[int], Tuple[int, int]]:
+        """测量每行文本，返回 (各行高度, 画布尺寸)，不绘制任何内容"""
+        heights = []
+        max_text_width = 0
+        for line in lines:
+            text_width, text_height = self.measure(line)
+            if text_width > max_text_width:
+                max_text_width = text_width
+            heights.append(text_height)
+
+        # Add space for the line and the separator between every two lines
+        separators = max(len(lines) - 1, 0)
+        total_height = self.PADDING * 2 + sum(heights) + separators * (self.LINE_SPACING + self.SEPARATOR_HEIGHT)
+        image_width = max_text_width + (self.PADDING * 2)
+        return heights, (int(image_width), int(total_height))
+
+    @classmethod
+    def estimate_size(cls, lines: List[str]) -> Tuple[int, int]:
+        """不测量文本的画布尺寸估计：每个字符按全角（一个字号宽）、每行按一个字号高计算，用于渲染前申请内存"""
+        separators = max(len(lines) - 1, 0)
+        width = max((len(line) for line in lines), default=0) * cls.FONT_SIZE + cls.PADDING * 2
+        height = cls.PADDING * 2 + len(lines) * cls.FONT_SIZE + separators * (cls.LINE_SPACING + cls.SEPARATOR_HEIGHT)
+        return width, height
+
+    def render_lines(self, lines: Iterable[str]) -> Image.Image:
+        """一次布局：先测量每行得到画布尺寸，再按测量结果逐行绘制"""
+        lines = list(lines)
+        heights, (image_width, total_height) = self.layout(lines)
+
+        img = Image.new('RGB', (image_width, total_height), color=self.BACKGROUND_COLOR)
+        d = ImageDraw.Draw(img)
+
+        y_cursor = self.PADDING
+        for i, (line, text_height) in enumerate(zip(lines, heights)):
+            d.text((self.PADDING, y_cursor), line, font=self.font, fill=self.FONT_COLOR)
+
+            # Move cursor down past the text
+            y_cursor += text_height
+
+            # Draw separator line if it's not the last item
+            if i < len(lines) - 1:
+                y_cursor += (self.LINE_SPACING // 2)
+                d.line([(self.PADDING, y_cursor), (image_width - self.PADDING, y_cursor)],
+                       fill=self.SEPARATOR_COLOR, width=self.SEPARATOR_HEIGHT)
+                y_cursor += (self.LINE_SPACING // 2) + self.SEPARATOR_HEIGHT
+
+        return img
+
+    def render(self, data) -> Image.Image:
+        return self.render_lines(self.format_lines(data))
+
+    def render_to_file(self, data, output_path: str):
+        self.render(data).save(output_path)
+
+
+def format_lines(df, separator: str = RowImageRenderer.KEY_VALUE_SEPARATOR) -> list:
+    """
+    按列生成每行待绘制的 "字段 : 值" 文本，返回与 df 行顺序一致的文本行列表。
+    df 的单元格需均为字符串（见 excel_to_img.prepare_frame）。
+    """
+    import pandas as pd
+
+    if df.empty:
+        return [[] for _ in range(len(df))]
+    columns = []
+    for header in df.columns:
+        col = df[header]
+        # 仅含空白的单元格显示为空
+        blank = col.str.strip() == ''
+        if blank.any():
+            col = col.mask(blank, '')
+        columns.append(f"{header}{separator}" + col)
+    return pd.concat(columns, axis=1).to_numpy().tolist()
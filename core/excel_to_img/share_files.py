@@ -0,0 +1,170 @@
+import errno
+import os
+import shutil
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+
+# 分发方式：auto 按 reflink → hardlink → symlink → copy 的顺序选择第一个可用的方式
+SHARE_STRATEGIES = ('auto', 'reflink', 'hardlink', 'symlink', 'copy')
+_AUTO_ORDER = ('reflink', 'hardlink', 'symlink', 'copy')
+
+# Linux 下 ioctl(FICLONE)，在 Btrfs、XFS 等文件系统上共享数据块
+_FICLONE = 0x40049409
+
+# 表示文件系统或平台不支持某种分发方式的错误码（跨设备、不支持的操作、无权限、链接数达到上限）
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EPERM, errno.EMLINK}
+# 不支持 FICLONE 的文件系统还可能返回 EINVAL / ENOTTY
+_REFLINK_UNSUPPORTED_ERRNOS = {errno.EINVAL, errno.ENOTTY}
+# Windows 下没有创建符号链接的权限（ERROR_PRIVILEGE_NOT_HELD）
+_ERROR_PRIVILEGE_NOT_HELD = 1314
+
+
+def _reflink(source, target):
+    """写时复制克隆：不复制数据，修改任一文件都不会影响另一个"""
+    if sys.platform.startswith('linux'):
+        import fcntl
+        try:
+            with open(source, 'rb') as src, open(target, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        except OSError:
+            if os.path.exists(target):
+                os.remove(target)
+            raise
+    elif sys.platform == 'darwin':
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.clonefile(os.fsencode(source), os.fsencode(target), 0) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), target)
+    else:
+        raise OSError(errno.EOPNOTSUPP, "当前平台不支持 reflink", target)
+    shutil.copystat(source, target)
+
+
+def _hardlink(source, target):
+    os.link(source, target)
+
+
+def _symlink(source, target):
+    os.symlink(os.path.abspath(source), target)
+
+
+def _copy(source, target):
+    # copy2 保留修改时间，再次运行时可据此跳过未变化的文件
+    shutil.copy2(source, target)
+
+
+_METHODS = {
+    'reflink': _reflink,
+    'hardlink': _hardlink,
+    'symlink': _symlink,
+    'copy': _copy,
+}
+
+
+def _unsupported(method: str, error: OSError) -> bool:
+    """error 是否说明当前文件系统或平台不支持 method，而不是与单个文件有关的错误"""
+    if error.errno in _UNSUPPORTED_ERRNOS or getattr(error, 'winerror', None) == _ERROR_PRIVILEGE_NOT_HELD:
+        return True
+    return method == 'reflink' and error.errno in _REFLINK_UNSUPPORTED_ERRNOS
+
+
+def _is_current(source, target) -> bool:
+    """目标已是源文件的链接，或大小和修改时间都一致的副本"""
+    try:
+        if os.path.samefile(source, target):
+            return True
+        src_stat, dst_stat = os.stat(source), os.stat(target)
+    except OSError:
+        return False
+    return src_stat.st_size == dst_stat.st_size and src_stat.st_mtime_ns == dst_stat.st_mtime_ns
+
+
+class ShareDistributor:
+    """
+    将共享目录中的文件分发到每个分组目录。
+    与逐组 shutil.copy 相比，优先使用 reflink、硬链接或符号链接，只写入元数据，不重复写入文件内容：
+    - reflink：写时复制，各分组的文件互不影响（需要 Btrfs、XFS、APFS 等文件系统支持）
+    - hardlink：所有分组共享同一份数据，修改任一分组中的文件会影响全部分组
+    - symlink：指向共享目录中的源文件，共享目录移动或删除后链接失效
+    - copy：完整复制，多个分组在线程池中并行复制
+    strategy='auto' 时依次尝试上述方式：某种方式因跨设备、文件系统不支持等原因不可用时本次运行不再尝试；
+    其他错误（例如磁盘已满、文件被占用）只对当前文件改用下一种方式，最后的 copy 也失败时抛出异常。
+    目标文件已是最新时跳过；verify=True 时每个分组分发完成后检查所有文件都已就位且大小一致。
+    """
+
+    def __init__(self, share_dir: str, strategy: str = 'auto', verify: bool = True, workers: Optional[int] = None):
+        if strategy not in SHARE_STRATEGIES:
+            raise ValueError(f"不支持的共享文件分发方式: {strategy}")
+        self.share_dir = share_dir
+        self.strategy = strategy
+        self.verify = verify
+        self.workers = workers or min(8, (os.cpu_count() or 1) * 2)
+        # 共享目录只列出一次，而不是每个分组都重新扫描
+        self.files: List[str] = sorted(
+            name for name in os.listdir(share_dir) if os.path.isfile(os.path.join(share_dir, name)))
+        self._methods = list(_AUTO_ORDER) if strategy == 'auto' else [strategy]
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def distribute(self, case_dir: str):
+        """将所有共享文件放入一个分组目录"""
+        for name in self.files:
+            source = os.path.join(self.share_dir, name)
+            target = os.path.join(case_dir, name)
+            if _is_current(source, target):
+                self._count('skipped')
+                continue
+            self._place(source, target)
+        if self.verify:
+            self._verify(case_dir)
+
+    def distribute_all(self, case_dirs: Iterable[str]) -> Counter:
+        """并行分发到多个分组目录，返回各分发方式处理的文件数"""
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # 消费结果以便抛出工作线程中的异常
+            list(executor.map(self.distribute, case_dirs))
+        return self.stats
+
+    def _place(self, source, target):
+        # 先写临时文件再替换，已存在的旧文件在替换前保持可用
+        tmp_target = f"{target}.{threading.get_ident()}.share-tmp"
+        with self._lock:
+            methods = list(self._methods)
+        for method in methods:
+            try:
+                _METHODS[method](source, tmp_target)
+                os.replace(tmp_target, target)
+            except OSError as e:
+                if os.path.lexists(tmp_target):
+                    os.remove(tmp_target)
+                if self.strategy != 'auto' or method == methods[-1]:
+                    raise Exception(f"分发共享文件失败 ({method}): {source} -> {target}: {e}")
+                if _unsupported(method, e):
+                    # 当前方式不可用，本次运行改用下一种方式
+                    with self._lock:
+                        if method in self._methods:
+                            self._methods.remove(method)
+                # 其他错误只对这个文件改用下一种方式
+                continue
+            self._count(method)
+            return
+        raise Exception(f"无法分发共享文件: {source}")
+
+    def _verify(self, case_dir):
+        for name in self.files:
+            source = os.path.join(self.share_dir, name)
+            target = os.path.join(case_dir, name)
+            try:
+                ok = os.path.getsize(source) == os.path.getsize(target)
+            except OSError:
+                ok = False
+            if not ok:
+                raise Exception(f"共享文件校验失败: {target}")
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
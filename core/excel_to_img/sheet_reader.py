@@ -0,0 +1,89 @@
+from typing import Iterator, List, Optional
+
+import pandas as pd
+from openpyxl import load_workbook
+
+
+def _mangle_columns(header: List) -> List[str]:
+    """与 pandas.read_excel 一致：空表头记为 'Unnamed: i'，重复列名追加 '.1'、'.2' 等后缀"""
+    columns = []
+    seen = {}
+    for i, name in enumerate(header):
+        name = f"Unnamed: {i}" if name is None else name
+        if name in seen:
+            seen[name] += 1
+            new_name = f"{name}.{seen[name]}"
+            while new_name in seen:
+                seen[name] += 1
+                new_name = f"{name}.{seen[name]}"
+            seen[new_name] = 0
+            name = new_name
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+
+class SheetRowReader:
+    """
+    使用 openpyxl 只读模式逐行读取 sheet，内存占用与 sheet 大小无关。
+    仅支持 .xlsx / .xlsm。
+    每次调用 iter_rows / iter_chunks 都会重新打开工作簿，因此可以对同一 sheet 多次遍历。
+    列类型只在每一块数据内推断，而 pd.read_excel 按整列推断，因此当同一列在不同块中
+    类型不同时（例如只有部分块含空值的整数列、只有部分块带时分秒的日期列），
+    转换为字符串后的格式可能与非流式模式不同。
+    """
+
+    def __init__(self, excel_path: str, sheet_name: str):
+        self.excel_path = excel_path
+        self.sheet_name = sheet_name
+        self.columns = []
+        self.estimated_rows = 0
+
+        wb = load_workbook(excel_path, read_only=True, data_only=True)
+        try:
+            ws = wb[sheet_name]
+            header = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ())
+            header = list(header)
+            # 去掉表头末尾的空单元格
+            while header and header[-1] is None:
+                header.pop()
+            self.columns = _mangle_columns(header)
+            self.estimated_rows = max((ws.max_row or 1) - 1, 0)
+        finally:
+            wb.close()
+
+    def iter_rows(self, usecols: Optional[List[str]] = None) -> Iterator[tuple]:
+        """逐行产出原始单元格值，跳过全空行；usecols 指定时只返回这些列"""
+        width = len(self.columns)
+        indexes = [self.columns.index(c) for c in usecols] if usecols is not None else None
+
+        wb = load_workbook(self.excel_path, read_only=True, data_only=True)
+        try:
+            ws = wb[self.sheet_name]
+            for row in ws.iter_rows(min_row=2, values_only=True):
+                if all(value is None for value in row):
+                    continue
+                row = row[:width] + (None,) * (width - len(row))
+                if indexes is not None:
+                    row = tuple(row[i] for i in indexes)
+                yield row
+        finally:
+            wb.close()
+
+    def iter_chunks(self, chunk_rows: int = 1000, usecols: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """按 chunk_rows 行一块产出 DataFrame，列类型在块内推断，空单元格为缺失值"""
+        columns = usecols if usecols is not None else self.columns
+        buffer = []
+        for row in self.iter_rows(usecols):
+            buffer.append(row)
+            if len(buffer) >= chunk_rows:
+                yield self._make_frame(buffer, columns)
+                buffer = []
+        if buffer:
+            yield self._make_frame(buffer, columns)
+
+    @staticmethod
+    def _make_frame(rows, columns) -> pd.DataFrame:
+        # 与 read_excel 一样按列推断类型，使数字、日期转换为字符串后的格式与非流式模式一致
+        return pd.DataFrame(rows, columns=columns, dtype=object).infer_objects()
@@ -0,0 +1,100 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import pandas as pd
+
+# 缓存元数据的工作簿数量，超出后丢弃最久未使用的
+MAX_CACHED_WORKBOOKS = 32
+
+
+class WorkbookInfo:
+    """
+    已解析一次的工作簿元数据：sheet 名称、各 sheet 的表头和行数在打开时用同一个 pd.ExcelFile 一次读出，
+    随后立即关闭该句柄——缓存中不保留打开的文件，Windows 下不会因此锁定 .xlsx 导致用户无法保存或替换。
+    """
+
+    def __init__(self, excel_path: str):
+        self.excel_path = excel_path
+        with pd.ExcelFile(excel_path) as excel_file:
+            self.sheet_names: List[str] = list(excel_file.sheet_names)
+            # pandas 读取 sheet 时会清除只读 sheet 的尺寸信息，因此先记录所有 sheet 的行数再读取表头
+            self._row_counts = {name: self._read_row_count(excel_file, name) for name in self.sheet_names}
+            self._columns = {name: self._read_columns(excel_file, name) for name in self.sheet_names}
+
+    def columns(self, sheet_name) -> list:
+        """表头列名，与 pd.read_excel 得到的列名一致"""
+        if sheet_name not in self._columns:
+            raise ValueError(f"工作簿中没有名为 {sheet_name} 的 sheet")
+        columns = self._columns[sheet_name]
+        if isinstance(columns, Exception):
+            raise columns
+        return list(columns)
+
+    def row_count(self, sheet_name) -> Optional[int]:
+        """
+        数据行数（不含表头），取自 sheet 记录的尺寸信息，不遍历数据；
+        末尾的空行也会被计入，文件未记录尺寸时返回 None。
+        """
+        return self._row_counts.get(sheet_name)
+
+    @staticmethod
+    def _read_columns(excel_file: pd.ExcelFile, sheet_name):
+        try:
+            return pd.read_excel(excel_file, sheet_name=sheet_name, nrows=0).columns.tolist()
+        except Exception as e:
+            # 只在用到这个 sheet 时报错，不影响读取其他 sheet
+            return e
+
+    @staticmethod
+    def _read_row_count(excel_file: pd.ExcelFile, sheet_name) -> Optional[int]:
+        book = excel_file.book
+        try:
+            if hasattr(book, 'sheet_by_name'):
+                # xlrd (.xls)
+                max_row = book.sheet_by_name(sheet_name).nrows
+            else:
+                max_row = book[sheet_name].max_row
+        except (AttributeError, KeyError, TypeError):
+            # 其他引擎（如 odf）不提供尺寸信息
+            return None
+        return None if max_row is None else max(max_row - 1, 0)
+
+    def read_sheet(self, sheet_name) -> pd.DataFrame:
+        """读取整张 sheet，每次单独打开文件并在读取后关闭"""
+        return pd.read_excel(self.excel_path, sheet_name=sheet_name)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_workbook_info(excel_path: str) -> WorkbookInfo:
+    """
+    返回工作簿信息，按 (路径, 修改时间, 文件大小) 缓存：
+    文件未变化时 get_excel_sheets、get_sheet_columns、get_sheet_row_count 和预检共用同一次解析。
+    """
+    path = os.path.abspath(excel_path)
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+
+    with _cache_lock:
+        entry = _cache.get(path)
+        if entry is not None and entry[0] == stamp:
+            _cache.move_to_end(path)
+            return entry[1]
+
+    info = WorkbookInfo(path)
+
+    with _cache_lock:
+        _cache.pop(path, None)
+        _cache[path] = (stamp, info)
+        while len(_cache) > MAX_CACHED_WORKBOOKS:
+            _cache.popitem(last=False)
+    return info
+
+
+def clear_workbook_cache():
+    with _cache_lock:
+        _cache.clear()
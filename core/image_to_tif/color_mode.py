@@ -0,0 +1,129 @@
+from PIL import Image
+
+# 合并为 TIFF 时的色彩模式策略：
+# - rgb：所有页面转换为 RGB（默认，与之前的行为一致）
+# - native：保留来源图像的模式（1 位黑白、8 位灰度保持不变），其余模式转换为 RGB；PDF 按 RGB 渲染
+# - auto：按 native 解码后用 NumPy 统计像素，实际为灰度或黑白的页面分别转换为 L / 1
+# - gray / bilevel：强制转换为 8 位灰度 / 1 位黑白
+COLOR_MODES = ('rgb', 'native', 'auto', 'gray', 'bilevel')
+
+# 通道最大差值不超过该值的像素视为灰色（容忍扫描仪的轻微偏色）
+GRAY_CHROMA_TOLERANCE = 16
+# 彩色像素占比不超过该值的页面视为灰度
+GRAY_MAX_COLOR_RATIO = 0.001
+# 亮度介于两者之间的像素视为中间调
+BILEVEL_DARK = 64
+BILEVEL_LIGHT = 192
+# 中间调像素占比不超过该值的灰度页面视为黑白，文字边缘的抗锯齿像素通常在此范围内
+BILEVEL_MAX_MIDTONE_RATIO = 0.05
+# 统计时最多采样的像素数，大幅面页面按最近邻缩小后再统计
+DETECT_MAX_PIXELS = 4_000_000
+
+# native 模式下直接保留的模式，其余按映射转换
+_NATIVE_MODES = {'1': '1', 'L': 'L', 'LA': 'L', 'RGB': 'RGB'}
+
+
+def _check(color_mode: str):
+    if color_mode not in COLOR_MODES:
+        raise ValueError(f"不支持的色彩模式: {color_mode}，可选 {', '.join(COLOR_MODES)}")
+
+
+def native_mode(mode: str) -> str:
+    """来源图像模式对应的输出模式：1 / L 保持不变，带透明通道的灰度去掉透明通道，其余转换为 RGB"""
+    return _NATIVE_MODES.get(mode, 'RGB')
+
+
+def decode_mode(source_mode: str, color_mode: str) -> str:
+    """解码普通图像时直接转换到的模式，避免灰度和黑白扫描件先膨胀为 RGB"""
+    _check(color_mode)
+    if color_mode == 'rgb':
+        return 'RGB'
+    if color_mode == 'gray':
+        return 'L'
+    if color_mode == 'bilevel':
+        return '1' if source_mode == '1' else 'L'
+    return native_mode(source_mode)
+
+
+def render_colorspace(color_mode: str) -> str:
+    """渲染 PDF 页面使用的色彩空间（PDF_COLORSPACES 的键）"""
+    _check(color_mode)
+    return 'gray' if color_mode in ('gray', 'bilevel') else 'rgb'
+
+
+def detect_color_mode(img: Image.Image) -> str:
+    """
+    统计像素判断页面实际需要的模式：'1'（只有黑白两色及少量抗锯齿边缘）、'L'（没有明显的彩色像素）或 'RGB'。
+    """
+    import numpy as np
+
+    if img.mode == '1':
+        return '1'
+    if img.mode not in ('L', 'RGB'):
+        img = img.convert('RGB')
+    pixels = img.width * img.height
+    if pixels > DETECT_MAX_PIXELS:
+        scale = (DETECT_MAX_PIXELS / pixels) ** 0.5
+        img = img.resize((max(int(img.width * scale), 1), max(int(img.height * scale), 1)),
+                         Image.Resampling.NEAREST)
+
+    if img.mode == 'RGB':
+        # 按通道分别取逐元素最大 / 最小值，比在交错数组上沿通道轴归约快一个数量级
+        r, g, b = (np.asarray(band) for band in img.split())
+        chroma = np.maximum(np.maximum(r, g), b) - np.minimum(np.minimum(r, g), b)
+        if np.count_nonzero(chroma > GRAY_CHROMA_TOLERANCE) > GRAY_MAX_COLOR_RATIO * chroma.size:
+            return 'RGB'
+        gray = np.asarray(img.convert('L'))
+    else:
+        gray = np.asarray(img)
+
+    midtones = np.count_nonzero((gray > BILEVEL_DARK) & (gray < BILEVEL_LIGHT))
+    return '1' if midtones <= BILEVEL_MAX_MIDTONE_RATIO * gray.size else 'L'
+
+
+def flatten_alpha(img: Image.Image) -> Image.Image:
+    """
+    带透明通道（或调色板 / tRNS 透明色）的图像合成到白色背景上，返回去掉透明通道的 RGB / L 图像，
+    透明区域显示为白色而不是被丢弃透明通道后露出的底色（通常为黑色）；不带透明信息的图像原样返回。
+    """
+    if img.mode not in ('RGBA', 'LA', 'PA') and 'transparency' not in img.info:
+        return img
+    base = 'LA' if img.mode == 'LA' else 'RGBA'
+    with img.convert(base) as layered:
+        background = Image.new(base[:-1], layered.size, 'white')
+        with layered.convert(base[:-1]) as color, layered.getchannel('A') as alpha:
+            background.paste(color, mask=alpha)
+    return background
+
+
+def to_mode(img: Image.Image, mode: str) -> Image.Image:
+    """转换为 mode，转为 1 位黑白时按 128 阈值二值化而不是抖动"""
+    if img.mode == mode:
+        return img
+    if mode == '1':
+        if img.mode != 'L':
+            img = img.convert('L')
+        return img.convert('1', dither=Image.Dither.NONE)
+    return img.convert(mode)
+
+
+def target_mode(img: Image.Image, color_mode: str) -> str:
+    """按 color_mode 策略，img 最终应保存为的模式"""
+    _check(color_mode)
+    if color_mode == 'auto':
+        return detect_color_mode(img)
+    if color_mode == 'bilevel':
+        return '1'
+    if color_mode == 'gray':
+        return 'L'
+    if color_mode == 'rgb':
+        return 'RGB'
+    return native_mode(img.mode)
+
+
+def apply_color_mode(img: Image.Image, color_mode: str) -> Image.Image:
+    """按 color_mode 策略转换图像；发生转换时关闭原图像，返回新图像"""
+    converted = to_mode(img, target_mode(img, color_mode))
+    if converted is not img:
+        img.close()
+    return converted
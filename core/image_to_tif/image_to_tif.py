@@ -1,37 +1,67 @@
-import io
+import functools
+import math
 import os
-from typing import Optional, List
+import threading
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Iterator, Optional, List, Tuple
 
-import fitz  # PyMuPDF
 from PIL import Image
 
+from core.common.pipeline import admitted_map, ordered_map
+from core.common.preflight import BASE_RSS_BYTES
+from core.common.scheduler import ResourceScheduler, get_scheduler
+from core.common.telemetry import NULL_TELEMETRY, Telemetry
+from core.image_to_tif.color_mode import (apply_color_mode, decode_mode, detect_color_mode, flatten_alpha,
+                                          render_colorspace)
+from core.image_to_tif.jpeg_passthrough import (PASSTHROUGH_COLOR_MODES, jpeg_tiff_page, passthrough_enabled,
+                                                passthrough_mode)
+from core.image_to_tif.page_cache import EncodedPageCache
+from core.image_to_tif.tif_writer import (CLASSIC_TIFF_LIMIT, BlockTiffWriter, ClassicTiffLimitError, TiffPageWriter,
+                                          build_save_kwargs, check_classic_size, encode_page)
+
 SUPPORTED_IMAGE_SUFFIX = {'.png', '.jpg', '.jpeg', '.tif', '.tiff', '.pdf'}
 
 
-def preview_image(image_path) -> Image.Image:
+def preview_image(image_path, dpi: int = 200, box: Optional[Tuple[int, int]] = None) -> Image.Image:
     """
     根据文件路径加载预览图像：
     - 支持常规图片格式
-    - 对于 PDF，仅返回首页的 RGB 图像，确保依赖 Poppler
+    - 对于 PDF，仅渲染并返回首页的 RGB 图像，不会触及其余页面
+    - 传入 box 时以降低的分辨率解码（见 Page.load_reduced），返回不超过 box 的 RGB 图像
     返回一个 PIL.Image 实例，调用者负责在使用后关闭它。
     """
     ext = os.path.splitext(image_path)[1].lower()
-    if ext == '.pdf':
+    if ext == '.pdf' or box is not None:
+        pages = iter_pages([image_path], dpi=dpi)
         try:
-            # 使用 pdf2image 将 PDF 首页转换为图像
-            img = pdf_to_image(image_path, [0])[0]
-            return img
+            page = next(pages)
+            return page.load() if box is None else page.load_reduced(box)
         except Exception as e:
-            raise IOError(f"PDF 预览失败: {e}")
+            raise IOError(f"{'PDF ' if ext == '.pdf' else ''}预览失败: {e}")
+        finally:
+            pages.close()
     else:
         # 常规图像直接打开
         return Image.open(image_path)
 
 
-def pdf_to_image(pdf_path: str, pages: Optional[List[int]] = None, dpi: int = 200) -> List[Image.Image]:
+# 渲染色彩空间：名称 -> (PyMuPDF 色彩空间属性名, PIL 模式)
+# PyMuPDF 加载较慢，只在第一次处理 PDF 时才导入，因此这里只记录属性名
+PDF_COLORSPACES = {
+    'rgb': ('csRGB', 'RGB'),
+    'gray': ('csGRAY', 'L'),
+}
+
+
+def pdf_to_image(pdf_path: str, pages: Optional[List[int]] = None, dpi: int = 200,
+                 colorspace: str = 'rgb') -> List[Image.Image]:
     """
     使用 PyMuPDF 将 PDF 转为图片，不依赖 Poppler。
+    colorspace: 渲染的目标色彩空间，'rgb'（默认）或 'gray'，直接得到 RGB/L 模式且不含 alpha 通道。
     """
+    import fitz  # PyMuPDF
+
     doc = fitz.open(pdf_path)
     total_pages = len(doc)
 
@@ -42,15 +72,260 @@ def pdf_to_image(pdf_path: str, pages: Optional[List[int]] = None, dpi: int = 20
     images = []
     for i in pages:
         if 0 <= i < total_pages:
-            page = doc[i]
-            pix = page.get_pixmap(dpi=dpi)
-            img_data = pix.tobytes("png")
-            image = Image.open(io.BytesIO(img_data))
-            images.append(image)
+            images.append(_render_pdf_page(doc[i], dpi, colorspace))
     doc.close()
     return images
 
 
+def _render_pdf_page(pdf_page, dpi: int, colorspace: str = 'rgb', telemetry: Telemetry = NULL_TELEMETRY,
+                     **fields) -> Image.Image:
+    """
+    将已打开文档中的单个页面渲染为图像。
+    直接用 pixmap 的采样缓冲区构造 PIL 图像，省去 PNG 编码再解码的往返。
+    fields 为记录到 telemetry 中的附加字段。
+    """
+    if colorspace not in PDF_COLORSPACES:
+        raise ValueError(f"不支持的色彩空间: {colorspace}")
+    import fitz  # PyMuPDF
+
+    cs_name, mode = PDF_COLORSPACES[colorspace]
+    with telemetry.span('rasterize', **fields):
+        pix = pdf_page.get_pixmap(dpi=dpi, colorspace=getattr(fitz, cs_name), alpha=False)
+    with telemetry.span('convert', **fields):
+        # samples 是采样数据的一份 bytes 拷贝，frombuffer 直接引用它而不再复制
+        return Image.frombuffer(mode, (pix.width, pix.height), pix.samples, "raw", mode, pix.stride, 1)
+
+
+class _PdfBandSource:
+    """
+    按水平带渲染的 PDF 页面，提供 BlockTiffWriter 需要的 size / mode / crop 接口。
+    crop 请求的行范围不在当前带内时只渲染该范围，同一行瓦片共用一次渲染，
+    任意时刻只驻留一条带的像素，而不是整页。
+    mode 为 'RGB'、'L' 或 '1'，'1' 时按灰度渲染后逐带二值化。
+    """
+
+    def __init__(self, pdf_page, dpi: int, mode: str, size: Tuple[int, int],
+                 telemetry: Telemetry = NULL_TELEMETRY, **fields):
+        self.pdf_page = pdf_page
+        self.zoom = dpi / 72
+        self.mode = mode
+        self.cs_name, self._render_mode = PDF_COLORSPACES['rgb' if mode == 'RGB' else 'gray']
+        self.size = size
+        self.telemetry = telemetry
+        self.fields = fields
+        self._band = None
+        self._band_rows = (0, 0)
+        self._display_list = None
+
+    def crop(self, box) -> Image.Image:
+        left, top, right, bottom = box
+        band_top, band_bottom = self._band_rows
+        if self._band is None or top < band_top or min(bottom, self.size[1]) > band_bottom:
+            self._render_band(top, min(bottom, self.size[1]))
+        return self._band.crop((left, top - self._band_rows[0], right, bottom - self._band_rows[0]))
+
+    def _render_band(self, top: int, bottom: int):
+        import fitz  # PyMuPDF
+
+        self.close()
+        # 与整页渲染使用相同的变换矩阵，只裁剪到 [top, bottom) 行；
+        # 裁剪会让个别抗锯齿边缘像素与整页渲染相差几个色阶，肉眼不可见
+        origin = self.pdf_page.rect
+        clip = fitz.Rect(origin.x0, origin.y0 + top / self.zoom,
+                         origin.x0 + self.size[0] / self.zoom, origin.y0 + bottom / self.zoom)
+        with self.telemetry.span('rasterize', rows=bottom - top, **self.fields):
+            if self._display_list is None:
+                # 页面内容只解析一次，之后每条带直接从显示列表光栅化
+                self._display_list = self.pdf_page.get_displaylist()
+            pix = self._display_list.get_pixmap(matrix=fitz.Matrix(self.zoom, self.zoom), clip=clip,
+                                                colorspace=getattr(fitz, self.cs_name), alpha=False)
+        with self.telemetry.span('convert', **self.fields):
+            band = Image.frombuffer(self._render_mode, (pix.width, pix.height), pix.samples, "raw",
+                                    self._render_mode, pix.stride, 1)
+            self._band = apply_color_mode(band, 'bilevel') if self.mode == '1' else band
+        self._band_rows = (top, top + pix.height)
+
+    def close(self):
+        if self._band is not None:
+            self._band.close()
+            self._band = None
+
+
+def _decode_image(img: Image.Image, mode: str, telemetry: Telemetry = NULL_TELEMETRY, **fields) -> Image.Image:
+    """解码已打开的图像并转换为 mode，解码和转换分别计时"""
+    with telemetry.span('decode', **fields):
+        img.load()
+    with telemetry.span('convert', **fields):
+        return img.convert(mode)
+
+
+def _apply_color_mode(img: Image.Image, color_mode: Optional[str], telemetry: Telemetry = NULL_TELEMETRY,
+                      **fields) -> Image.Image:
+    """按色彩模式策略转换已加载的页面，color_mode 为 None 时原样返回"""
+    if color_mode is None:
+        return img
+    with telemetry.span('convert', color_mode=color_mode, **fields) as span:
+        img = apply_color_mode(img, color_mode)
+        span['mode'] = img.mode
+    return img
+
+
+@dataclass
+class Page:
+    """
+    iter_pages 产出的单个页面。元数据无需解码即可获得，像素数据在调用 load() 时才生成。
+    - path: 来源文件路径
+    - page_index: 页面在来源文件中的序号，普通图像为 0
+    - size: 加载后的像素尺寸 (width, height)
+    - dpi / colorspace: 渲染参数
+    """
+    path: str
+    page_index: int
+    size: Tuple[int, int]
+    dpi: int = 200
+    colorspace: str = 'rgb'
+    # 已打开的 fitz.Page 或仅读取了文件头的 PIL 图像
+    _source: object = field(default=None, repr=False)
+
+    @property
+    def is_pdf(self) -> bool:
+        return os.path.splitext(self.path)[1].lower() == '.pdf'
+
+    @property
+    def mode(self) -> str:
+        return PDF_COLORSPACES[self.colorspace][1]
+
+    @property
+    def source_format(self) -> str:
+        """来源格式：PDF 页面为 'PDF'，普通图像为 Pillow 从文件头识别的格式，如 'JPEG'、'PNG'"""
+        return 'PDF' if self.is_pdf else self._source.format
+
+    @property
+    def source_mode(self) -> str:
+        """解码或渲染直接得到的模式，只读取文件头"""
+        return self.mode if self.is_pdf else self._source.mode
+
+    def load(self, telemetry: Telemetry = NULL_TELEMETRY, color_mode: Optional[str] = None,
+             **fields) -> Image.Image:
+        """
+        解码/渲染该页面，返回的图像由调用者负责关闭。
+        必须在迭代器前进到下一页之前调用，之后所属的文件句柄已被关闭。
+        color_mode 为 core.image_to_tif.color_mode 中的色彩模式策略，默认 None 转换为 self.mode；
+        普通图像直接解码为策略需要的模式，灰度和黑白扫描件不会先膨胀为 RGB。
+        """
+        if self.is_pdf:
+            img = _render_pdf_page(self._source, self.dpi, self.colorspace, telemetry, **fields)
+        else:
+            self._source.seek(0)
+            mode = self.mode if color_mode is None else decode_mode(self._source.mode, color_mode)
+            img = _decode_image(self._source, mode, telemetry, **fields)
+        return _apply_color_mode(img, color_mode, telemetry, **fields)
+
+    def load_bands(self, telemetry: Telemetry = NULL_TELEMETRY, color_mode: Optional[str] = None, **fields):
+        """
+        供 BlockTiffWriter 分块写入的页面：PDF 返回按带渲染的 _PdfBandSource，整页像素不会同时驻留内存；
+        其他格式的解码器只能整页解码，与 load() 相同。返回的对象由调用者负责关闭。
+        color_mode 为 'auto' 时 PDF 页面根据低分辨率渲染的统计结果决定模式。
+        """
+        if not self.is_pdf:
+            return self.load(telemetry, color_mode, **fields)
+        if color_mode == 'auto':
+            with telemetry.span('convert', color_mode=color_mode, **fields) as span:
+                with self.load_reduced((2048, 2048)) as preview:
+                    mode = span['mode'] = detect_color_mode(preview)
+        else:
+            mode = {'gray': 'L', 'bilevel': '1'}.get(color_mode, self.mode)
+        return _PdfBandSource(self._source, self.dpi, mode, self.size, telemetry, **fields)
+
+    def load_reduced(self, box: Tuple[int, int]) -> Image.Image:
+        """
+        以尽可能低的分辨率解码，返回不超过 box 尺寸的图像，用于预览和缩略图：
+        - PDF：根据 box 计算渲染 DPI（不超过 self.dpi）
+        - JPEG：通过 Image.draft 让解码器直接按 1/2、1/4、1/8 缩放 DCT
+        - 多分辨率 TIFF：选用能覆盖 box 的最小降采样页
+        其余格式退化为完整解码后缩放。
+        """
+        scale = min(box[0] / self.size[0], box[1] / self.size[1], 1)
+        if self.is_pdf:
+            # 向上取整，保证渲染结果不小于 box，再由 thumbnail 缩小
+            dpi = max(math.ceil(self.dpi * scale), 1)
+            img = _render_pdf_page(self._source, dpi, self.colorspace)
+        else:
+            src = self._source
+            frame = _nearest_reduced_frame(src, box)
+            src.seek(frame)
+            try:
+                # draft 必须在 load 之前调用，仅 JPEG 会生效，其余格式返回 None
+                src.draft(self.mode, (int(src.size[0] * scale), int(src.size[1] * scale)))
+                # 预览和缩略图中透明区域合成到白色背景上；合并 TIFF 的 load() 保持原有的转换方式，输出不变
+                img = flatten_alpha(src).convert(self.mode)
+            finally:
+                src.seek(0)
+        img.thumbnail(box)
+        return img
+
+
+def _nearest_reduced_frame(img: Image.Image, box: Tuple[int, int]) -> int:
+    """
+    多分辨率（金字塔）TIFF 会把降采样图像作为 NewSubfileType 标记为 1 的后续页保存，
+    返回尺寸仍能覆盖 box 的最小一页的序号，没有合适的页时返回 0。
+    """
+    if img.format != 'TIFF' or getattr(img, 'n_frames', 1) <= 1:
+        return 0
+
+    full_width, full_height = img.size
+    # 缩略图的最终宽度，候选页至少要有这么宽才不会损失清晰度
+    target_width = full_width * min(box[0] / full_width, box[1] / full_height, 1)
+    best, best_area = 0, full_width * full_height
+    try:
+        for frame in range(1, img.n_frames):
+            img.seek(frame)
+            if not img.tag_v2.get(254, 0) & 1:
+                continue
+            width, height = img.size
+            # 只接受与原图宽高比一致的降采样页
+            if abs(width / height - full_width / full_height) > 0.02:
+                continue
+            if width >= target_width and width * height < best_area:
+                best, best_area = frame, width * height
+    finally:
+        img.seek(0)
+    return best
+
+
+def iter_pages(paths: List[str], dpi: int = 200, colorspace: str = 'rgb',
+               telemetry: Telemetry = NULL_TELEMETRY) -> Iterator[Page]:
+    """
+    按 paths 顺序惰性产出页面，PDF 会被拆分为单独的页面。
+    每个 PDF 只打开一次，页面在 Page.load() 时按需渲染，任意时刻最多只有一页驻留内存。
+    colorspace: 'rgb' 或 'gray'，PDF 直接按该色彩空间渲染，普通图像转换为对应模式。
+    """
+    if colorspace not in PDF_COLORSPACES:
+        raise ValueError(f"不支持的色彩空间: {colorspace}")
+    zoom = dpi / 72
+
+    for path in paths:
+        ext = os.path.splitext(path)[1].lower()
+        if ext == '.pdf':
+            import fitz  # PyMuPDF
+
+            with telemetry.span('open', file=os.path.basename(path)):
+                doc = fitz.open(path)
+            try:
+                for page_index, pdf_page in enumerate(doc):
+                    # 与 get_pixmap(dpi=...) 的取整方式一致，无需渲染即可得到像素尺寸
+                    rect = (pdf_page.rect * fitz.Matrix(zoom, zoom)).irect
+                    yield Page(path, page_index, (rect.width, rect.height), dpi, colorspace, pdf_page)
+            finally:
+                doc.close()
+        else:
+            # Image.open 只读取文件头，convert 时才解码像素
+            with telemetry.span('open', file=os.path.basename(path)):
+                img = Image.open(path)
+            with img:
+                yield Page(path, 0, img.size, dpi, colorspace, img)
+
+
 def load_images(directory: str):
     """
     扫描目录，返回可处理的图像和 PDF 文件路径列表。
@@ -65,56 +340,427 @@ def load_images(directory: str):
     return image_paths
 
 
-def merge_images_to_tif(image_paths: list[str], output_path: str, compression='raw', dpi=200, jpeg_quality=None, progress_callback=None):
+def _jpeg_passthrough(path: str, dpi, color_mode, telemetry: Telemetry = NULL_TELEMETRY,
+                      **fields) -> Optional[bytes]:
+    """
+    读取 JPEG 文件并把码流原样包装为单页 TIFF（见 jpeg_tiff_page），可直接交给 TiffPageWriter.write_encoded。
+    码流无法嵌入或模式不符合 color_mode 时返回 None，调用方按常规流程解码后重新编码。
+    """
+    with telemetry.span('passthrough', **fields) as span:
+        with open(path, 'rb') as f:
+            data = f.read()
+        mode = passthrough_mode(data)
+        required = PASSTHROUGH_COLOR_MODES[color_mode]
+        page = None
+        if mode is not None and required in (None, mode):
+            page = jpeg_tiff_page(data, dpi)
+        span['bytes'] = len(page) if page else 0
+    return page
+
+
+def _page_working_bytes(page: Page, compression, color_mode, jpeg_passthrough=False, tile_size=None,
+                        banded=False) -> int:
+    """按文件头估计处理该页的内存（见 PagePreflight.working_bytes），banded 为 True 时按 BlockTiffWriter 分块写入估计"""
+    # preflight 依赖本模块，在此延迟导入
+    from core.image_to_tif.preflight import page_preflight
+
+    estimate = page_preflight(page, color_mode)
+    if banded:
+        return estimate.working_bytes(compression, band_rows=estimate.block_rows(tile_size))
+    return estimate.working_bytes(compression, jpeg_passthrough and estimate.passes_through(compression, color_mode))
+
+
+def _iter_merge_images(image_paths: list[str], dpi=200, progress_callback=None,
+                       telemetry: Telemetry = NULL_TELEMETRY, progress_scale=100, color_mode='rgb',
+                       jpeg_passthrough=False, compression='raw', scheduler: Optional[ResourceScheduler] = None):
+    """
+    按 image_paths 顺序逐页产出待合并的图像，PDF 会被拆分为单独的页面图像。
+    progress_scale: 逐页处理对应的进度范围上限，之后的保存步骤使用剩余的进度。
+    jpeg_passthrough 为 True 时可以原样嵌入的 JPEG 页面产出已编码的单页 TIFF 字节串而不是图像。
+    提供 scheduler 时每页解码前按估计的内存申请放行，直到调用方处理完该页、请求下一页时才释放。
+    """
+    total_images = len(image_paths)
+    i = -1
+
+    pages = iter_pages(image_paths, dpi=dpi, colorspace=render_colorspace(color_mode), telemetry=telemetry)
+    for page_number, page in enumerate(pages):
+        # 每个来源文件的第一页标志着开始处理一个新文件
+        if page.page_index == 0:
+            i += 1
+            if progress_callback:
+                progress = int((i / total_images) * progress_scale)
+                progress_callback(progress, f"正在处理图片: {os.path.basename(page.path)}")
+        admitted = nullcontext() if scheduler is None else \
+            scheduler.reserve(_page_working_bytes(page, compression, color_mode, jpeg_passthrough))
+        with admitted:
+            data = None
+            if jpeg_passthrough and page.source_format == 'JPEG':
+                data = _jpeg_passthrough(page.path, page.dpi, color_mode, telemetry, page=page_number)
+            yield page.load(telemetry, color_mode, page=page_number) if data is None else data
+
+
+# 工作进程内缓存最近打开的 PDF，避免同一文件的每一页都重新解析。
+# 只有经 _init_page_worker 初始化的工作进程（线程）才有 pdf 属性，调用方进程中不缓存
+_worker_state = threading.local()
+
+
+def _init_page_worker():
+    """ordered_map 工作池的 initializer：在工作进程中启用 PDF 句柄缓存"""
+    _worker_state.pdf = None
+
+
+@contextmanager
+def _open_job_pdf(path: str, telemetry: Telemetry = NULL_TELEMETRY, pdfs: Optional[dict] = None):
+    """
+    打开 _encode_page_job 需要的 PDF：
+    - 调用方进程中（workers == 1 或缓存条目失效时）由 _merge_encoded 传入本次合并独有的 {路径: 文档}，
+      同一文件的各页复用同一个句柄，切换到其他文件时关闭之前的文档，合并结束后由调用方全部关闭；
+      多个线程同时合并不会互相关闭文档，合并结束后也不会留下打开的源文件（Windows 下会锁定文件）
+    - 工作进程中复用缓存的句柄，进程退出时随之关闭
+    - 其他情况每次单独打开并在使用后关闭
+    """
+    import fitz  # PyMuPDF
+
+    if pdfs is not None:
+        if path not in pdfs:
+            # 页面按文件顺序处理，只保留当前文件，打开的句柄数不随 PDF 数量增长
+            _close_pdfs(pdfs)
+            with telemetry.span('open', file=os.path.basename(path)):
+                pdfs[path] = fitz.open(path)
+        yield pdfs[path]
+        return
+
+    if not hasattr(_worker_state, 'pdf'):
+        with telemetry.span('open', file=os.path.basename(path)):
+            doc = fitz.open(path)
+        try:
+            yield doc
+        finally:
+            doc.close()
+        return
+
+    if _worker_state.pdf is None or _worker_state.pdf[0] != path:
+        if _worker_state.pdf is not None:
+            _worker_state.pdf[1].close()
+        with telemetry.span('open', file=os.path.basename(path)):
+            _worker_state.pdf = (path, fitz.open(path))
+    yield _worker_state.pdf[1]
+
+
+def _close_pdfs(pdfs: dict):
+    for doc in pdfs.values():
+        doc.close()
+    pdfs.clear()
+
+
+def _encode_page_job(job, pdfs: Optional[dict] = None):
+    """
+    工作进程入口（workers == 1 时也在调用方进程中执行）：解码/渲染单个页面并编码为单页 TIFF。
+    pdfs 为调用方进程中本次合并复用的 PDF 句柄（见 _open_job_pdf），工作进程中为 None。
+    options 为 {'compression', 'jpeg_quality', 'color_mode', 'jpeg_passthrough'}，压缩方式按页面最终的模式选择，
+    jpeg_passthrough 为 True 时可以原样嵌入的 JPEG 来源不经解码直接包装。
+    返回 (编码后的字节串, 计时列表)，traced 为 False 时计时列表为空。
+    """
+    path, page_index, dpi, options, traced = job
+    color_mode = options['color_mode']
+    telemetry = Telemetry() if traced else NULL_TELEMETRY
+    fields = {'file': os.path.basename(path), 'page_index': page_index}
+    if os.path.splitext(path)[1].lower() == '.pdf':
+        with _open_job_pdf(path, telemetry, pdfs) as doc:
+            img = _render_pdf_page(doc[page_index], dpi, render_colorspace(color_mode), telemetry, **fields)
+    else:
+        with telemetry.span('open', **fields):
+            src = Image.open(path)
+        with src:
+            if options['jpeg_passthrough'] and src.format == 'JPEG':
+                data = _jpeg_passthrough(path, dpi, color_mode, telemetry, **fields)
+                if data is not None:
+                    return data, telemetry.spans()
+            img = _decode_image(src, decode_mode(src.mode, color_mode), telemetry, **fields)
+    img = _apply_color_mode(img, color_mode, telemetry, **fields)
+    try:
+        with telemetry.span('encode', **fields) as span:
+            save_kwargs = build_save_kwargs(options['compression'], dpi, options['jpeg_quality'], img.mode)
+            data = encode_page(img, save_kwargs)
+            span['bytes'] = len(data)
+    finally:
+        img.close()
+    return data, telemetry.spans()
+
+
+@contextmanager
+def _closing_pdfs(pdfs: dict):
+    try:
+        yield pdfs
+    finally:
+        _close_pdfs(pdfs)
+
+
+def _merge_encoded(image_paths: list[str], output_path: str, compression, dpi, jpeg_quality,
+                   progress_callback, workers, max_in_flight, page_cache: Optional[EncodedPageCache] = None,
+                   telemetry: Telemetry = NULL_TELEMETRY, color_mode='rgb', jpeg_passthrough=False,
+                   scheduler: Optional[ResourceScheduler] = None, bigtiff=False):
+    """
+    预编码流水线：每页先编码为独立的单页 TIFF，再由当前进程作为唯一的写入方按原顺序追加。
+    workers 不为 1 时在工作进程中解码、转换和编码，各阶段计时随结果一起返回；
+    提供 page_cache 时命中缓存的页面直接复制已编码的数据，只有新增或修改过的页面需要重新编码。
+    未命中的页面提交前按文件头估计的内存向 scheduler 申请放行，写入后释放。
+    """
+    options = {'compression': compression, 'jpeg_quality': jpeg_quality, 'color_mode': color_mode,
+               'jpeg_passthrough': jpeg_passthrough}
+    # 只读取元数据展开页面任务和每页的内存估计，不渲染任何页面
+    estimates = {}
+    jobs = []
+    with telemetry.span('scan'):
+        for page in iter_pages(image_paths, dpi=dpi, colorspace=render_colorspace(color_mode)):
+            jobs.append((page.path, page.page_index, dpi, options, telemetry.enabled))
+            if scheduler is not None:
+                estimates[page.path, page.page_index] = _page_working_bytes(page, compression, color_mode,
+                                                                            jpeg_passthrough)
+    if not jobs:
+        raise ValueError('没有找到任何可合并的图像或 PDF 页面')
+
+    if page_cache is not None:
+        # 每页的压缩方式取决于解码后的模式，缓存键使用压缩策略而不是最终的保存参数
+        settings = dict(build_save_kwargs(compression, dpi, jpeg_quality), color_mode=color_mode,
+                        jpeg_passthrough=jpeg_passthrough)
+        keys = [page_cache.make_key(path, page_index, settings) for path, page_index, _, _, _ in jobs]
+        hits = [page_cache.contains(key) for key in keys]
+    else:
+        keys = [None] * len(jobs)
+        hits = [False] * len(jobs)
+    misses = [job for job, hit in zip(jobs, hits) if not hit]
+
+    def admit(job, block):
+        return scheduler.acquire(estimates[job[0], job[1]], block)
+
+    total_pages = len(jobs)
+    # 在当前进程中编码的页面（workers == 1 或缓存条目失效时）复用的 PDF 句柄，结束时全部关闭
+    pdfs = {}
+    encode_here = functools.partial(_encode_page_job, pdfs=pdfs)
+    with _page_writer(output_path, compression, dpi, jpeg_quality, bigtiff) as writer, _closing_pdfs(pdfs):
+        if workers == 1:
+            results = map(encode_here, misses) if scheduler is None else admitted_map(encode_here, misses, admit)
+        else:
+            results = ordered_map(_encode_page_job, misses, workers=workers, max_in_flight=max_in_flight,
+                                  admit=None if scheduler is None else admit, initializer=_init_page_worker)
+        for i, (job, key, hit) in enumerate(zip(jobs, keys, hits)):
+            if progress_callback:
+                progress = int((i / total_pages) * 100)
+                progress_callback(progress, f"正在写入第 {i + 1}/{total_pages} 页: {os.path.basename(job[0])}")
+            data = None
+            if hit:
+                with telemetry.span('cache_read', page=i) as span:
+                    data = page_cache.get(key)
+                    span['bytes'] = len(data) if data else 0
+            if data is None:
+                # 未命中，或条目在检查之后被淘汰、已损坏（此时在当前进程中重新编码）
+                data, spans = encode_here(job) if hit else next(results)
+                telemetry.merge(spans, page=i)
+                if page_cache is not None:
+                    page_cache.put(key, data)
+            with telemetry.span('write', page=i, bytes=len(data)):
+                writer.write_encoded(data)
+            telemetry.sample_memory(page=i)
+
+
+def needs_bigtiff(image_paths: list[str], dpi=200, compression='raw', color_mode='rgb', jpeg_passthrough=True) -> bool:
+    """
+    只读取文件头估计输出大小（见 TifPreflight.bigtiff_estimate_bytes：按典型压缩比，原样写入的 JPEG 按源文件大小），
+    接近经典 TIFF 的 4GB 限制时返回 True
+    """
+    from core.image_to_tif.preflight import preflight_tif
+
+    report = preflight_tif(image_paths, dpi, color_mode)
+    return report.bigtiff_estimate_bytes(compression, jpeg_passthrough) > CLASSIC_TIFF_LIMIT
+
+
+def _page_writer(output_path: str, compression, dpi, jpeg_quality, bigtiff=False):
+    """
+    逐页写入的输出：经典 TIFF 使用 TiffPageWriter，BigTIFF 使用条带布局的 BlockTiffWriter，
+    两者都提供 write / write_encoded / save_kwargs / page_count
+    """
+    if bigtiff:
+        return BlockTiffWriter(output_path, compression=compression, dpi=dpi, jpeg_quality=jpeg_quality,
+                               tile_size=None, bigtiff=True)
+    return TiffPageWriter(output_path, compression=compression, dpi=dpi, jpeg_quality=jpeg_quality)
+
+
+def _all_pages_bytes(image_paths: list[str], dpi, compression, color_mode, jpeg_passthrough) -> int:
+    """streaming=False 时全部页面同时驻留内存，按文件头估计所需的内存（不含进程的基础内存）"""
+    from core.image_to_tif.preflight import preflight_tif
+
+    report = preflight_tif(image_paths, dpi, color_mode)
+    return report.peak_rss_bytes(compression, streaming=False, jpeg_passthrough=jpeg_passthrough) - BASE_RSS_BYTES
+
+
+def _merge_blocks(image_paths: list[str], output_path: str, compression, dpi, jpeg_quality, progress_callback,
+                  tile_size, bigtiff, telemetry: Telemetry = NULL_TELEMETRY, color_mode='rgb',
+                  scheduler: Optional[ResourceScheduler] = None):
+    """
+    用 BlockTiffWriter 逐页分块写入，PDF 页面按带渲染，整页像素不必同时驻留内存；
+    提供 scheduler 时每页按分块写入的内存估计申请放行
+    """
+    total_images = len(image_paths)
+    i = -1
+    with BlockTiffWriter(output_path, compression=compression, dpi=dpi, jpeg_quality=jpeg_quality,
+                         tile_size=tile_size, bigtiff=bigtiff) as writer:
+        pages = iter_pages(image_paths, dpi=dpi, colorspace=render_colorspace(color_mode), telemetry=telemetry)
+        for page_number, page in enumerate(pages):
+            if page.page_index == 0:
+                i += 1
+                if progress_callback:
+                    progress = int((i / total_images) * 100)
+                    progress_callback(progress, f"正在处理图片: {os.path.basename(page.path)}")
+            admitted = nullcontext() if scheduler is None else \
+                scheduler.reserve(_page_working_bytes(page, compression, color_mode, tile_size=tile_size, banded=True))
+            with admitted:
+                source = page.load_bands(telemetry, color_mode, page=page_number)
+                try:
+                    writer.write(source, telemetry, page=page_number)
+                finally:
+                    source.close()
+            telemetry.sample_memory(page=page_number)
+    if writer.page_count == 0:
+        raise ValueError('没有找到任何可合并的图像或 PDF 页面')
+
+
+def merge_images_to_tif(image_paths: list[str], output_path: str, compression='raw', dpi=200, jpeg_quality=None,
+                        progress_callback=None, streaming=True, workers=1, max_in_flight=None, page_cache=None,
+                        telemetry: Optional[Telemetry] = None, tile_size: Optional[int] = None, bigtiff='auto',
+                        color_mode='rgb', jpeg_passthrough=True, scheduler: Optional[ResourceScheduler] = None):
     """
     将按照传入的 image_paths 顺序，将图像和 PDF 页面合并为一个多页 TIFF 文件。
     PDF 文件会被拆分为单独的页面图像。
-    compression 可选：'raw'（无压缩）, 'lzw', 'jpeg', 'deflate', 'packbits', 'zlib' 等
+    compression 可选：'raw'（无压缩）, 'tiff_lzw', 'jpeg', 'tiff_adobe_deflate', 'packbits', 'group4' 等 Pillow
+        压缩名称，'lzw' / 'deflate' / 'ccittfax4' 等别名见 COMPRESSION_ALIASES；
+        'auto' 时黑白页使用 CCITT G4，其余页使用 Deflate。每页的压缩方式按该页的模式调整（见 page_compression），
+        例如 CCITT 遇到非黑白页时改用 LZW。
     dpi: 输出TIFF文件的分辨率，默认200
     jpeg_quality: JPEG压缩质量，1-100，仅在compression='jpeg'时有效
     progress_callback: 可选的回调函数，用于报告进度。接受两个参数：当前进度 (0-100) 和消息。
+    streaming: 为 True（默认）时每产出一页即写入 TIFF 并立即释放，峰值内存约为单页大小；
+        为 False 时先解码全部页面再一次性保存。两种方式输出的文件逐字节一致。
+    workers: 并行工作进程数，默认 1 即在当前进程内顺序处理；传入 None 使用全部 CPU 核心。
+        大于 1 时总是流式写入，输出与顺序处理一致。
+    max_in_flight: 并行模式下已提交但尚未写入的页面上限，用于限制内存，默认 workers * 2。
+    page_cache: 可选的 EncodedPageCache。提供时每页编码结果都会写入缓存，再次保存时
+        未修改的页面（仅调整顺序、追加新文件等情况）直接复用已编码的数据，输出与不使用缓存时一致。
+    telemetry: 可选的 Telemetry，记录每页 open / decode / rasterize / convert / encode / write 各阶段的
+        耗时、字节数和内存峰值（包括工作进程中的阶段），见 core.common.telemetry。
+    tile_size: 指定时按 tile_size x tile_size 的瓦片写入（16 的倍数，常用 256 / 512），
+        查看器可以只解码显示的区域；默认 None 按条带写入。
+    bigtiff: 'auto'（默认）时先读取文件头按典型压缩比估计输出大小（原样写入的 JPEG 按源文件大小），
+        接近 4GB 时使用 BigTIFF；估计偏低、经典 TIFF 写满 4GB 时删除该文件并改用 BigTIFF 重新生成。
+        True / False 强制使用或不使用，False 时超过 4GB 抛出 ClassicTiffLimitError。
+        BigTIFF 同样支持流式、并行、页面缓存和 JPEG 原样写入，只是由 BlockTiffWriter 按条带写出。
+    指定 tile_size 时由 BlockTiffWriter 在当前进程中逐块编码写入，PDF 页面按带渲染，
+    此时 streaming、workers、max_in_flight 和 page_cache 不生效。
+    color_mode: 色彩模式策略，'rgb'（默认，全部转换为 RGB）、'native'（保留 1 位 / 8 位灰度等原始模式）、
+        'auto'（按像素统计把实际为灰度或黑白的页面转换为 L / 1）、'gray' 或 'bilevel'（强制），
+        见 core.image_to_tif.color_mode。
+    jpeg_passthrough: 为 True（默认）且页面按 JPEG 压缩时，基线 JPEG 来源的码流原样写入 TIFF（见
+        core.image_to_tif.jpeg_passthrough），不解码也不重新压缩，画质无损且此时 jpeg_quality 对这些页面不生效；
+        渐进式、CMYK 等无法嵌入的 JPEG，以及 color_mode 为 'auto' / 'bilevel' 或需要转换模式的页面照常解码重新编码。
+        瓦片写入（tile_size）时不生效。
+    scheduler: 页面解码 / 渲染前按文件头和 PDF 页面尺寸估计的内存申请放行的 ResourceScheduler，
+        默认为进程内共享的 get_scheduler()，同时运行的多个保存任务共用内存预算和工作槽位，资源不足时排队等待。
+        streaming=False 时全部页面同时驻留内存，开始前一次申请所有页面的总估计。
     """
-    images = []
-    total_images = len(image_paths)
+    telemetry = telemetry or NULL_TELEMETRY
+    scheduler = scheduler or get_scheduler()
+    jpeg_passthrough = jpeg_passthrough and passthrough_enabled(compression, color_mode)
+    if bigtiff == 'auto':
+        with telemetry.span('scan'):
+            estimated = needs_bigtiff(image_paths, dpi, compression, color_mode, jpeg_passthrough)
+        merge = functools.partial(merge_images_to_tif, image_paths, output_path, compression, dpi, jpeg_quality,
+                                  progress_callback, streaming, workers, max_in_flight, page_cache, telemetry,
+                                  tile_size, color_mode=color_mode, jpeg_passthrough=jpeg_passthrough,
+                                  scheduler=scheduler)
+        try:
+            return merge(bigtiff=estimated)
+        except ClassicTiffLimitError:
+            if estimated:
+                raise
+        # 实际输出比估计的大，写了一半的经典 TIFF 已被删除；启用页面缓存时已编码的页面不必重新编码
+        if progress_callback:
+            progress_callback(0, "输出超过 4GB，改用 BigTIFF 重新生成...")
+        return merge(bigtiff=True)
 
-    for i, path in enumerate(image_paths):
+    if tile_size:
+        _merge_blocks(image_paths, output_path, compression, dpi, jpeg_quality, progress_callback,
+                      tile_size, bigtiff, telemetry, color_mode, scheduler)
         if progress_callback:
-            progress = int((i / total_images) * 100)
-            progress_callback(progress, f"正在处理图片: {os.path.basename(path)}")
+            progress_callback(100, "TIF文件保存完成！")
+        return
 
-        ext = os.path.splitext(path)[1].lower()
-        if ext == '.pdf':
-            # 打开 PDF 并逐页转换
-            pdf_images = pdf_to_image(path, dpi=dpi)
-            images.extend(pdf_images)
-        else:
-            img = Image.open(path).convert('RGB')
-            images.append(img)
+    if streaming and (workers != 1 or page_cache is not None):
+        _merge_encoded(image_paths, output_path, compression, dpi, jpeg_quality,
+                       progress_callback, workers, max_in_flight, page_cache, telemetry, color_mode,
+                       jpeg_passthrough, scheduler, bigtiff)
+        if progress_callback:
+            progress_callback(100, "TIF文件保存完成！")
+        return
 
-    if not images:
-        raise ValueError('没有找到任何可合并的图像或 PDF 页面')
+    if streaming:
+        pages = _iter_merge_images(image_paths, dpi=dpi, progress_callback=progress_callback, telemetry=telemetry,
+                                   color_mode=color_mode, jpeg_passthrough=jpeg_passthrough,
+                                   compression=compression, scheduler=scheduler)
+        with _page_writer(output_path, compression, dpi, jpeg_quality, bigtiff) as writer:
+            for img in pages:
+                page_number = writer.page_count
+                if isinstance(img, bytes):
+                    # 原样嵌入的 JPEG 页面已经是单页 TIFF
+                    data = img
+                else:
+                    try:
+                        # 先编码再写入，与 writer.write(img) 的结果一致，但两个阶段可以分别计时
+                        with telemetry.span('encode', page=page_number) as span:
+                            data = encode_page(img, writer.save_kwargs(img.mode))
+                            span['bytes'] = len(data)
+                    finally:
+                        img.close()
+                with telemetry.span('write', page=page_number, bytes=len(data)):
+                    writer.write_encoded(data)
+                telemetry.sample_memory(page=page_number)
+        if writer.page_count == 0:
+            raise ValueError('没有找到任何可合并的图像或 PDF 页面')
+    else:
+        # 全部页面同时驻留内存，按所有页面的总估计一次申请放行
+        with scheduler.reserve(_all_pages_bytes(image_paths, dpi, compression, color_mode, jpeg_passthrough)):
+            # 逐页解码占 0-90%，最后一次性保存占剩余部分
+            pages = _iter_merge_images(image_paths, dpi=dpi, progress_callback=progress_callback, telemetry=telemetry,
+                                       progress_scale=90, color_mode=color_mode, jpeg_passthrough=jpeg_passthrough)
+            images = list(pages)
 
-    if progress_callback:
-        progress_callback(90, "正在保存TIF文件...") # 保存前给一个较高的进度
+            if not images:
+                raise ValueError('没有找到任何可合并的图像或 PDF 页面')
 
-    try:
-        # 准备保存参数
-        save_kwargs = {
-            'format': 'TIFF',
-            'save_all': True,
-            'append_images': images[1:],
-            'compression': compression,
-            'dpi': (dpi, dpi)
-        }
-        
-        # 如果是JPEG压缩且提供了质量参数，则添加quality参数
-        if compression == 'jpeg' and jpeg_quality is not None:
-            save_kwargs['quality'] = jpeg_quality
-
-        images[0].save(output_path, **save_kwargs)
-    finally:
-        for img in images:
-            img.close()
+            if progress_callback:
+                progress_callback(90, "正在保存TIF文件...") # 保存前给一个较高的进度
+
+            try:
+                # 原样嵌入的 JPEG 页面没有保存参数，视为与其他页面不同
+                page_kwargs = [build_save_kwargs(compression, dpi, jpeg_quality, img.mode)
+                               if isinstance(img, Image.Image) else None for img in images]
+                with telemetry.span('save_all', pages=len(images)):
+                    if not bigtiff and page_kwargs[0] is not None \
+                            and all(kwargs == page_kwargs[0] for kwargs in page_kwargs):
+                        images[0].save(output_path, save_all=True, append_images=images[1:], **page_kwargs[0])
+                        check_classic_size(output_path)
+                    else:
+                        # save_all 只能写出经典 TIFF，且所有页面共用一组参数；BigTIFF 或各页压缩方式不同时逐页写入
+                        with _page_writer(output_path, compression, dpi, jpeg_quality, bigtiff) as writer:
+                            for img in images:
+                                if isinstance(img, bytes):
+                                    writer.write_encoded(img)
+                                else:
+                                    writer.write(img)
+                telemetry.sample_memory()
+            finally:
+                for img in images:
+                    if isinstance(img, Image.Image):
+                        img.close()
 
     if progress_callback:
         progress_callback(100, "TIF文件保存完成！")
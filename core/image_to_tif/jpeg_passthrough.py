@@ -0,0 +1,146 @@
+import struct
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from core.image_to_tif.tif_writer import pack_ifd, pack_values, page_compression
+
+# 可以直接写入 TIFF 的帧类型：SOF0 基线、SOF1 扩展顺序（均为 Huffman 编码）
+_SEQUENTIAL_SOF = (0xC0, 0xC1)
+# 其余 SOF 标记：渐进式、无损、算术编码等，TIFF 的 JPEG 压缩不支持
+_OTHER_SOF = {0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# 没有长度字段的标记：TEM、RST0-7
+_STANDALONE = {0x01} | set(range(0xD0, 0xD8))
+
+_SHORT, _LONG, _RATIONAL = 3, 4, 5
+# TIFF 的 Compression = 7 即新式 JPEG (TIFF Technical Note 2)
+COMPRESSION_JPEG = 7
+PHOTOMETRIC_MINISBLACK, PHOTOMETRIC_RGB, PHOTOMETRIC_YCBCR = 1, 2, 6
+
+# 允许原样嵌入 JPEG 码流的色彩模式策略及其要求的页面模式，None 表示 L / RGB 均可；
+# auto / bilevel 需要统计或转换像素，总是解码
+PASSTHROUGH_COLOR_MODES = {'rgb': 'RGB', 'native': None, 'gray': 'L'}
+
+
+@dataclass
+class JpegInfo:
+    """JPEG 文件头信息，sampling 为各分量的 (水平, 垂直) 采样因子"""
+    width: int
+    height: int
+    precision: int
+    components: int
+    sampling: Tuple[Tuple[int, int], ...]
+    sequential: bool
+    # Adobe APP14 标记中的颜色变换：0 表示未变换（RGB / CMYK），None 表示没有该标记
+    adobe_transform: Optional[int] = None
+
+    @property
+    def mode(self) -> str:
+        """Pillow 读取嵌入后的 TIFF 页面得到的模式"""
+        return 'L' if self.components == 1 else 'RGB'
+
+
+def read_jpeg_info(data: bytes) -> Optional[JpegInfo]:
+    """只解析标记段直到扫描开始 (SOS)，不解码像素；不是有效的 JPEG 时返回 None"""
+    if data[:2] != b'\xff\xd8':
+        return None
+    pos = 2
+    frame = None
+    adobe_transform = None
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # 标记前允许有填充字节
+            pos += 1
+            continue
+        if marker in _STANDALONE:
+            pos += 2
+            continue
+        (length,) = struct.unpack_from('>H', data, pos + 2)
+        segment = data[pos + 4:pos + 2 + length]
+        if marker in _SEQUENTIAL_SOF or marker in _OTHER_SOF:
+            precision, height, width, components = struct.unpack_from('>BHHB', segment)
+            sampling = tuple((segment[7 + i * 3] >> 4, segment[7 + i * 3] & 0x0F) for i in range(components))
+            frame = (width, height, precision, components, sampling, marker in _SEQUENTIAL_SOF)
+        elif marker == 0xEE and segment[:5] == b'Adobe' and len(segment) >= 12:
+            adobe_transform = segment[11]
+        elif marker == 0xDA:
+            break
+        pos += 2 + length
+    if frame is None:
+        return None
+    return JpegInfo(*frame, adobe_transform=adobe_transform)
+
+
+def _photometric(info: JpegInfo) -> Optional[int]:
+    """info 能否按原样写入新式 JPEG TIFF，可以时返回对应的 Photometric，否则返回 None"""
+    if not info.sequential or info.precision != 8 or info.height == 0:
+        return None
+    if info.components == 1:
+        return PHOTOMETRIC_MINISBLACK
+    if info.components != 3:
+        # CMYK / YCCK 等需要解码后转换
+        return None
+    luma, *chroma = info.sampling
+    if any(sampling != (1, 1) for sampling in chroma):
+        return None
+    if info.adobe_transform == 0:
+        # 未做颜色变换的 RGB JPEG，各分量必须等比例采样
+        return PHOTOMETRIC_RGB if luma == (1, 1) else None
+    # TIFF 只允许 1 / 2 / 4 倍的色度子采样，且垂直方向不大于水平方向
+    if luma[0] not in (1, 2, 4) or luma[1] not in (1, 2, 4) or luma[1] > luma[0]:
+        return None
+    return PHOTOMETRIC_YCBCR
+
+
+def passthrough_enabled(compression: str, color_mode: str) -> bool:
+    """在该压缩方式和色彩模式策略下，JPEG 来源是否可能不经解码直接写入"""
+    return page_compression(compression) == 'jpeg' and color_mode in PASSTHROUGH_COLOR_MODES
+
+
+def passthrough_mode(data: bytes) -> Optional[str]:
+    """可以直接嵌入 TIFF 时返回 Pillow 读取后的模式（'L' / 'RGB'），否则返回 None"""
+    info = read_jpeg_info(data)
+    if info is None or _photometric(info) is None:
+        return None
+    return info.mode
+
+
+def jpeg_tiff_page(data: bytes, dpi=200) -> Optional[bytes]:
+    """
+    将完整的 JPEG 码流原样作为唯一的条带，生成 Compression = 7 的单页 TIFF，
+    与 encode_page 的输出一样可以由 TiffPageWriter.write_encoded 追加。
+    码流无法用新式 JPEG-in-TIFF 表示（渐进式、12 位、CMYK、不支持的子采样等）时返回 None，调用方应解码后重新编码。
+    旧式 JPEG (Compression = 6) 已被 TIFF Technical Note 2 废弃，各阅读器的支持不一致，因此不使用。
+    """
+    info = read_jpeg_info(data)
+    photometric = None if info is None else _photometric(info)
+    if photometric is None:
+        return None
+
+    # 文件头之后紧跟 JPEG 码流，再之后是 IFD
+    strip_offset = 8
+    ifd_offset = strip_offset + len(data) + (len(data) & 1)
+    values = {
+        256: (_LONG, [info.width]),
+        257: (_LONG, [info.height]),
+        258: (_SHORT, [8] * info.components),
+        259: (_SHORT, [COMPRESSION_JPEG]),
+        262: (_SHORT, [photometric]),
+        273: (_LONG, [strip_offset]),
+        277: (_SHORT, [info.components]),
+        278: (_LONG, [info.height]),
+        279: (_LONG, [len(data)]),
+        284: (_SHORT, [1]),
+        296: (_SHORT, [2]),
+    }
+    if photometric == PHOTOMETRIC_YCBCR:
+        values[530] = (_SHORT, list(info.sampling[0]))
+    entries = pack_values(values)
+    resolution = struct.pack('<LL', int(dpi), 1)
+    entries[282] = entries[283] = (_RATIONAL, 1, resolution)
+
+    ifd, _ = pack_ifd(entries, ifd_offset)
+    header = b'II*\x00' + struct.pack('<L', ifd_offset)
+    return header + data + b'\x00' * (len(data) & 1) + ifd
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+
+from core.common.disk_cache import DiskCache
+from core.config import PAGE_CACHE_DIR, PAGE_CACHE_MAX_BYTES
+
+# 单页 TIFF 文件头（小端 / 大端），读取缓存时用于排除损坏的条目
+_TIFF_HEADERS = (b'II*\x00', b'MM\x00*')
+
+
+class EncodedPageCache:
+    """
+    已编码单页 TIFF 的磁盘缓存（encode_page 的输出）。
+    缓存键由来源文件绝对路径、修改时间、文件大小、页码和保存参数（压缩方式、DPI、JPEG 质量）共同决定，
+    来源文件被修改或保存参数变化后旧条目自然失效。
+    重新生成多页 TIFF 时，未变化的页面直接由 TiffPageWriter.write_encoded 追加，无需解码和重新压缩。
+    """
+
+    def __init__(self, cache_dir: str = PAGE_CACHE_DIR, max_bytes: int = PAGE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._disk = DiskCache(cache_dir, max_bytes, suffix='.tif')
+
+    @staticmethod
+    def make_key(path: str, page_index: int, save_kwargs: dict) -> str:
+        st = os.stat(path)
+        options = json.dumps(save_kwargs, sort_keys=True)
+        raw = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}|{page_index}|{options}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def contains(self, key: str) -> bool:
+        return os.path.exists(self._disk.entry_path(key))
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self._disk.read(key)
+        if data is None or not data.startswith(_TIFF_HEADERS):
+            return None
+        return data
+
+    def put(self, key: str, data: bytes):
+        self._disk.write(key, data)
+
+    def clear(self):
+        self._disk.clear()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_page_cache() -> EncodedPageCache:
+    """返回进程内共享的页面缓存实例"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EncodedPageCache()
+        return _default_cache
@@ -0,0 +1,215 @@
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from core.common.pipeline import default_workers
+from core.common.preflight import BASE_RSS_BYTES, WORKER_RSS_BYTES
+from core.image_to_tif.color_mode import native_mode, render_colorspace
+from core.image_to_tif.image_to_tif import iter_pages
+from core.image_to_tif.jpeg_passthrough import PASSTHROUGH_COLOR_MODES
+from core.image_to_tif.tif_writer import (CLASSIC_TIFF_LIMIT, PAGE_OVERHEAD, STRIP_SIZE, page_compression,
+                                          projected_tiff_size, row_bytes)
+
+# 文档扫描件在各压缩方式下的典型压缩比（输出 / 未压缩），仅用于粗略估计输出大小；
+# 噪点多的照片压缩效果更差，上限见 projected_tiff_size
+TYPICAL_COMPRESSION_RATIO = {
+    'raw': 1.0,
+    'packbits': 0.7,
+    'tiff_lzw': 0.3,
+    'tiff_deflate': 0.25,
+    'tiff_adobe_deflate': 0.25,
+    'jpeg': 0.1,
+    'group3': 0.1,
+    'group4': 0.05,
+}
+# bigtiff='auto' 时在典型输出大小估计上留的余量；估计仍然偏低、经典 TIFF 写满 4GB 时
+# merge_images_to_tif 会改用 BigTIFF 重新生成
+BIGTIFF_MARGIN = 1.5
+
+
+@dataclass
+class PagePreflight:
+    """
+    只读取文件头得到的单页信息：
+    - format: 'PDF' 或 Pillow 识别的图像格式
+    - source_mode: 解码 / 渲染直接得到的模式
+    - mode: 按色彩模式策略保存的模式，'auto' 需要统计像素才能确定，按 native 的结果估计（上限）
+    - file_bytes: 普通图像的文件大小，JPEG 原样写入时即为该页的数据量；PDF 页面为 None
+    """
+    path: str
+    page_index: int
+    size: Tuple[int, int]
+    format: str
+    source_mode: str
+    mode: str
+    file_bytes: Optional[int] = None
+
+    @property
+    def pixels(self) -> int:
+        return self.size[0] * self.size[1]
+
+    @property
+    def decoded_bytes(self) -> int:
+        return row_bytes(self.size[0], self.source_mode) * self.size[1]
+
+    @property
+    def raw_bytes(self) -> int:
+        """保存模式下的未压缩数据量"""
+        return row_bytes(self.size[0], self.mode) * self.size[1]
+
+    def passes_through(self, compression: str, color_mode: str) -> bool:
+        """该页能否按 jpeg_passthrough 原样写入；只根据文件头判断，渐进式 JPEG 等仍会被视为可以"""
+        required = PASSTHROUGH_COLOR_MODES.get(color_mode, '')
+        return (self.format == 'JPEG' and page_compression(compression, self.mode) == 'jpeg'
+                and self.source_mode in ('L', 'RGB') and required in (None, self.source_mode))
+
+    def output_bytes(self, compression: str, passthrough=False) -> int:
+        """该页在输出中占用的字节数估计，passthrough 为 passes_through 的结果"""
+        if passthrough:
+            return self.file_bytes + PAGE_OVERHEAD
+        ratio = TYPICAL_COMPRESSION_RATIO.get(page_compression(compression, self.mode), 1)
+        return int(self.raw_bytes * ratio) + PAGE_OVERHEAD
+
+    def working_bytes(self, compression: str, passthrough=False, band_rows: Optional[int] = None) -> int:
+        """
+        处理该页时的内存占用估计（按实测校准）：解码结果及其转换副本、保存模式的图像和编码缓冲区。
+        原样写入的 JPEG 只读取文件；band_rows 不为 None 时按分块写入估计，PDF 页面只渲染一条带。
+        """
+        if passthrough:
+            return 2 * self.file_bytes
+        if band_rows is not None and self.format == 'PDF':
+            band_bytes = row_bytes(self.size[0], self.source_mode) * min(band_rows, self.size[1])
+            return 4 * band_bytes
+        return int(2 * self.decoded_bytes + 1.5 * self.raw_bytes + 2 * self.output_bytes(compression))
+
+    def block_rows(self, tile_size: Optional[int] = None) -> int:
+        """BlockTiffWriter 每次写入的行数：瓦片边长，或按条带写入时每个条带的行数"""
+        return tile_size or max(8, STRIP_SIZE // row_bytes(self.size[0], self.mode) // 8 * 8)
+
+
+@dataclass
+class TifPreflight:
+    """preflight_tif 的结果，按保存参数估计峰值内存和输出大小"""
+    pages: List[PagePreflight] = field(default_factory=list)
+    dpi: int = 200
+    color_mode: str = 'rgb'
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    @property
+    def pixels(self) -> int:
+        return sum(page.pixels for page in self.pages)
+
+    @property
+    def raw_bytes(self) -> int:
+        return sum(page.raw_bytes for page in self.pages)
+
+    @property
+    def largest_page(self) -> Optional[PagePreflight]:
+        return max(self.pages, key=lambda page: page.pixels, default=None)
+
+    def _passthrough(self, page: PagePreflight, compression, jpeg_passthrough) -> bool:
+        return jpeg_passthrough and page.passes_through(compression, self.color_mode)
+
+    def output_bytes(self, compression='raw', jpeg_passthrough=True) -> int:
+        """典型情况下的输出大小，见 TYPICAL_COMPRESSION_RATIO"""
+        return sum(page.output_bytes(compression, self._passthrough(page, compression, jpeg_passthrough))
+                   for page in self.pages)
+
+    def max_output_bytes(self, compression='raw') -> int:
+        """最坏情况下（按未压缩数据量和压缩方式的最大膨胀比例）的输出大小上限"""
+        return projected_tiff_size(((page.size, page.mode) for page in self.pages), compression)
+
+    def bigtiff_estimate_bytes(self, compression='raw', jpeg_passthrough=True) -> int:
+        """bigtiff='auto' 判断时使用的输出大小：典型估计（JPEG 原样写入的页面按源文件大小）乘以 BIGTIFF_MARGIN"""
+        return int(self.output_bytes(compression, jpeg_passthrough) * BIGTIFF_MARGIN)
+
+    def needs_bigtiff(self, compression='raw', jpeg_passthrough=True) -> bool:
+        return self.bigtiff_estimate_bytes(compression, jpeg_passthrough) > CLASSIC_TIFF_LIMIT
+
+    def peak_rss_bytes(self, compression='raw', streaming=True, workers=1, max_in_flight=None,
+                       tile_size: Optional[int] = None, jpeg_passthrough=True) -> int:
+        """
+        按 merge_images_to_tif 的同名参数估计峰值常驻内存：
+        - 逐页写入：基础内存加上最大一页的处理内存
+        - workers 不为 1：每个工作进程同时处理一页，主进程最多持有 max_in_flight 页已编码的数据
+        - streaming=False：全部页面解码后驻留内存直到保存结束
+        - 瓦片写入（tile_size）：在当前进程中逐页处理，PDF 页面只计算一条带，不会原样写入 JPEG
+        是否使用 BigTIFF 不影响内存估计。
+        """
+        if not self.pages:
+            return BASE_RSS_BYTES
+        if tile_size:
+            return BASE_RSS_BYTES + max(page.working_bytes(compression, band_rows=page.block_rows(tile_size))
+                                        for page in self.pages)
+
+        passthrough = [self._passthrough(page, compression, jpeg_passthrough) for page in self.pages]
+        largest = max(page.working_bytes(compression, through) for page, through in zip(self.pages, passthrough))
+        workers = workers or default_workers()
+        if streaming and workers != 1:
+            in_flight = max(max_in_flight or workers * 2, 1)
+            largest_encoded = max(page.output_bytes(compression, through)
+                                  for page, through in zip(self.pages, passthrough))
+            return BASE_RSS_BYTES + workers * (WORKER_RSS_BYTES + largest) + in_flight * largest_encoded
+        if streaming:
+            return BASE_RSS_BYTES + largest
+        decoded = sum(page.output_bytes(compression, True) if through else page.raw_bytes
+                      for page, through in zip(self.pages, passthrough))
+        return BASE_RSS_BYTES + decoded + largest
+
+    def summary(self, compressions=None, **kwargs) -> dict:
+        """
+        可序列化为 JSON 的汇总：页数、像素数、未压缩数据量，以及各压缩方式的输出大小和峰值内存估计。
+        compressions 默认为保存对话框中的全部压缩方式，kwargs 为 peak_rss_bytes 的其余参数。
+        """
+        if compressions is None:
+            from core.config import TIF_COMPRESSION_OPTIONS
+            compressions = list(TIF_COMPRESSION_OPTIONS)
+        largest = self.largest_page
+        jpeg_passthrough = kwargs.get('jpeg_passthrough', True)
+        return {
+            'pages': self.page_count,
+            'pixels': self.pixels,
+            'raw_bytes': self.raw_bytes,
+            'largest_page': None if largest is None else {
+                'path': largest.path, 'page_index': largest.page_index, 'size': list(largest.size)},
+            'compressions': {
+                compression: {
+                    'output_bytes': self.output_bytes(compression, jpeg_passthrough),
+                    'max_output_bytes': self.max_output_bytes(compression),
+                    'needs_bigtiff': self.needs_bigtiff(compression, jpeg_passthrough),
+                    'peak_rss_bytes': self.peak_rss_bytes(compression, **kwargs),
+                } for compression in compressions
+            },
+        }
+
+
+def preflight_tif(image_paths: List[str], dpi=200, color_mode='rgb') -> TifPreflight:
+    """
+    预检 merge_images_to_tif 的输入：只读取图像文件头（Image.open，不调用 load）以及 PDF 的页数和页面尺寸，
+    不解码或渲染任何像素，返回可按保存参数估计峰值内存和输出大小的 TifPreflight。
+    """
+    report = TifPreflight(dpi=dpi, color_mode=color_mode)
+    for page in iter_pages(image_paths, dpi=dpi, colorspace=render_colorspace(color_mode)):
+        report.pages.append(page_preflight(page, color_mode))
+    return report
+
+
+def page_preflight(page, color_mode='rgb') -> PagePreflight:
+    """由 iter_pages 产出的页面（只读取了文件头）得到 PagePreflight，供预检和资源调度按页估计内存"""
+    file_bytes = None if page.is_pdf else os.path.getsize(page.path)
+    return PagePreflight(page.path, page.page_index, page.size, page.source_format,
+                         page.source_mode, _saved_mode(page.source_mode, color_mode), file_bytes)
+
+
+def _saved_mode(source_mode: str, color_mode: str) -> str:
+    """按色彩模式策略保存的模式，'auto' 按 native 估计"""
+    if color_mode == 'rgb':
+        return 'RGB'
+    if color_mode == 'gray':
+        return 'L'
+    if color_mode == 'bilevel':
+        return '1'
+    return native_mode(source_mode)
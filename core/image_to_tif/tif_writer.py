@@ -0,0 +1,419 @@
+import io
+import os
+import struct
+from typing import Iterable, Optional, Tuple
+
+from PIL import Image, TiffImagePlugin
+
+from core.common.telemetry import NULL_TELEMETRY, Telemetry
+
+# 界面和旧版本使用的压缩名称 -> Pillow 的压缩名称。Pillow 不认识的名称会静默地写出无压缩文件
+COMPRESSION_ALIASES = {
+    'none': 'raw',
+    'lzw': 'tiff_lzw',
+    'deflate': 'tiff_adobe_deflate',
+    'zip': 'tiff_adobe_deflate',
+    'ccittfax3': 'group3',
+    'ccittfax4': 'group4',
+}
+# 只能用于 1 位黑白图像的压缩方式
+BILEVEL_COMPRESSIONS = ('group3', 'group4')
+# compression='auto' 时黑白页与其余页使用的压缩方式
+AUTO_BILEVEL_COMPRESSION = 'group4'
+AUTO_COMPRESSION = 'tiff_adobe_deflate'
+
+# 经典 TIFF 使用 32 位偏移量，文件中任何位置都不能超过 4GB
+CLASSIC_TIFF_LIMIT = 2 ** 32 - 1
+# 分块写入时条带的目标大小，与 Pillow 的默认值一致
+STRIP_SIZE = 65536
+# 各压缩方式在最坏情况下相对未压缩数据的膨胀比例，用于预估输出大小，未列出的按 1 计算
+COMPRESSION_EXPANSION = {
+    'tiff_lzw': 1.5,
+    'packbits': 1.01,
+    'tiff_deflate': 1.01,
+    'tiff_adobe_deflate': 1.01,
+}
+# 每页的 IFD、标签和对齐等额外开销的上限估计
+PAGE_OVERHEAD = 64 * 1024
+
+# TIFF 字段类型 -> 单个值的字节数
+_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 16: 8}
+_SHORT, _LONG, _LONG8 = 3, 4, 16
+# 由 BlockTiffWriter 重新生成、不从单块编码结果中复制的标签
+_LAYOUT_TAGS = {256, 257, 273, 278, 279, 322, 323, 324, 325}
+# 指向子 IFD 的标签（SubIFDs、Exif、GPS），复制到另一个文件后偏移量失效，不予复制
+_POINTER_TAGS = {330, 34665, 34853}
+
+
+class ClassicTiffLimitError(Exception):
+    """输出超过经典 TIFF 的 4GB 寻址上限，需要改用 BigTIFF"""
+
+
+def normalize_compression(compression: str) -> str:
+    return COMPRESSION_ALIASES.get(compression, compression)
+
+
+def page_compression(compression: str, mode: Optional[str] = None) -> str:
+    """
+    为模式为 mode 的页面选择压缩方式：
+    - 'auto'：黑白页使用 CCITT G4，其余使用 Deflate
+    - CCITT 只支持黑白页，其余页面改用 LZW；JPEG 不支持黑白页，改用 CCITT G4
+    mode 为 None 时只做名称转换。
+    """
+    compression = normalize_compression(compression)
+    if compression == 'auto':
+        return AUTO_BILEVEL_COMPRESSION if mode == '1' else AUTO_COMPRESSION
+    if mode is None:
+        return compression
+    if compression in BILEVEL_COMPRESSIONS and mode != '1':
+        return 'tiff_lzw'
+    if compression == 'jpeg' and mode == '1':
+        return AUTO_BILEVEL_COMPRESSION
+    return compression
+
+
+def build_save_kwargs(compression='raw', dpi=200, jpeg_quality=None, mode: Optional[str] = None) -> dict:
+    """生成单页 TIFF 的 Pillow 保存参数，传入页面的 mode 时按 page_compression 选择适用的压缩方式"""
+    compression = page_compression(compression, mode)
+    save_kwargs = {
+        'format': 'TIFF',
+        'compression': compression,
+        'dpi': (dpi, dpi)
+    }
+    # 如果是JPEG压缩且提供了质量参数，则添加quality参数
+    if compression == 'jpeg' and jpeg_quality is not None:
+        save_kwargs['quality'] = jpeg_quality
+    return save_kwargs
+
+
+def encode_page(image: Image.Image, save_kwargs: dict) -> bytes:
+    """
+    将单页图像编码为独立的单页 TIFF 字节串，可在工作进程中执行，
+    之后由 TiffPageWriter.write_encoded 按顺序拼接进多页文件。
+    """
+    buffer = io.BytesIO()
+    image.save(buffer, **save_kwargs)
+    return buffer.getvalue()
+
+
+def check_classic_size(output_path: str):
+    """Image.save(save_all=True) 写出的经典 TIFF 超过 4GB 时其中的偏移量已经无效，删除该文件并抛出 ClassicTiffLimitError"""
+    if os.path.getsize(output_path) > CLASSIC_TIFF_LIMIT:
+        os.remove(output_path)
+        raise ClassicTiffLimitError("输出文件超过 4GB，经典 TIFF 无法寻址，请改用 BigTIFF")
+
+
+class TiffPageWriter:
+    """
+    逐页写入多页 TIFF 文件：每写入一页即编码落盘，调用方可以立即释放该页图像，
+    峰值内存约为单页大小，与总页数无关。
+    输出与 Image.save(save_all=True, append_images=...) 生成的文件逐字节一致。
+
+    用法：
+        with TiffPageWriter(output_path, compression='lzw', dpi=200) as writer:
+            for img in pages:
+                writer.write(img)
+                img.close()
+    """
+
+    def __init__(self, output_path: str, compression='raw', dpi=200, jpeg_quality=None):
+        self.output_path = output_path
+        self.compression = compression
+        self.dpi = dpi
+        self.jpeg_quality = jpeg_quality
+
+        self.page_count = 0
+        self._tf = None
+
+    def save_kwargs(self, mode: str) -> dict:
+        """模式为 mode 的页面的保存参数，见 page_compression"""
+        return build_save_kwargs(self.compression, self.dpi, self.jpeg_quality, mode)
+
+    def write(self, image: Image.Image):
+        """编码并追加一页，写入完成后该页数据不再被本对象引用"""
+        try:
+            image.save(self._open(), **self.save_kwargs(image.mode))
+            self._finish_page()
+        except struct.error:
+            # 偏移量超出 32 位时 Pillow 回填 IFD 失败
+            raise ClassicTiffLimitError("输出文件超过 4GB，经典 TIFF 无法寻址，请改用 BigTIFF")
+
+    def write_encoded(self, data: bytes):
+        """追加一页由 encode_page 预先编码好的单页 TIFF，超过经典 TIFF 的 4GB 上限时抛出 ClassicTiffLimitError"""
+        tf = self._open()
+        if tf.f.tell() + len(data) > CLASSIC_TIFF_LIMIT:
+            raise ClassicTiffLimitError("输出文件超过 4GB，经典 TIFF 无法寻址，请改用 BigTIFF")
+        tf.write(data)
+        self._finish_page()
+
+    def _open(self):
+        if self._tf is None:
+            # 首页到达时才创建文件，避免没有任何页面时留下空文件
+            self._tf = TiffImagePlugin.AppendingTiffWriter(self.output_path, True)
+        return self._tf
+
+    def _finish_page(self):
+        self._tf.newFrame()
+        self.page_count += 1
+
+    def close(self):
+        if self._tf is not None:
+            self._tf.close()
+            self._tf = None
+
+    def abort(self):
+        """关闭并删除写了一半的输出文件"""
+        created = self._tf is not None
+        self.close()
+        if created and os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def row_bytes(width: int, mode: str) -> int:
+    bits = 1 if mode == '1' else 8 * Image.getmodebands(mode)
+    return max((width * bits + 7) // 8, 1)
+
+
+def projected_tiff_size(pages: Iterable[Tuple[Tuple[int, int], str]], compression='raw') -> int:
+    """
+    根据 [(size, mode)] 估计多页 TIFF 输出大小的上限：未压缩数据量乘以压缩方式的最坏膨胀比例，
+    再加上每页的固定开销。JPEG 等有损压缩按未压缩大小计算。
+    """
+    expansion = COMPRESSION_EXPANSION.get(page_compression(compression), 1)
+    total = 0
+    for (width, height), mode in pages:
+        total += int(row_bytes(width, mode) * height * expansion) + PAGE_OVERHEAD
+    return total
+
+
+def _parse_ifd(data: bytes) -> dict:
+    """
+    解析 Pillow 生成的单页小端经典 TIFF 的第一个 IFD，返回 {tag: (type, count, 原始数据)}。
+    原始数据按文件中的字节序原样保留，可直接写入另一个小端 TIFF。
+    """
+    if data[:4] != b'II*\x00':
+        raise ValueError('只支持小端字节序的经典 TIFF')
+    (offset,) = struct.unpack_from('<L', data, 4)
+    (count,) = struct.unpack_from('<H', data, offset)
+    tags = {}
+    for i in range(count):
+        tag, typ, n = struct.unpack_from('<HHL', data, offset + 2 + i * 12)
+        size = _TYPE_SIZES.get(typ, 1) * n
+        value_at = offset + 2 + i * 12 + 8
+        if size > 4:
+            (value_at,) = struct.unpack_from('<L', data, value_at)
+        tags[tag] = (typ, n, data[value_at:value_at + size])
+    return tags
+
+
+def _unpack_values(entry) -> list:
+    typ, count, raw = entry
+    return list(struct.unpack(f"<{count}{'H' if typ == _SHORT else 'L'}", raw))
+
+
+def pack_values(values: dict) -> dict:
+    """{tag: (type, [整数值])} 转换为 pack_ifd 使用的 {tag: (type, count, 原始数据)}，只支持 SHORT / LONG / LONG8"""
+    entries = {}
+    for tag, (typ, items) in values.items():
+        fmt = {_SHORT: 'H', _LONG: 'L', _LONG8: 'Q'}[typ]
+        entries[tag] = (typ, len(items), struct.pack(f"<{len(items)}{fmt}", *items))
+    return entries
+
+
+def pack_ifd(entries: dict, ifd_offset: int, bigtiff=False) -> Tuple[bytes, int]:
+    """
+    将 {tag: (type, count, 原始数据)} 序列化为位于 ifd_offset 的小端 IFD，放不进条目的数据紧跟在 IFD 之后。
+    下一个 IFD 的偏移量写为 0，返回 (IFD 字节串, 该偏移量字段在文件中的位置)。
+    """
+    inline = 8 if bigtiff else 4
+    entry_size = 20 if bigtiff else 12
+    head_size = (8 if bigtiff else 2) + len(entries) * entry_size + inline
+    aux_offset = ifd_offset + head_size
+
+    head = struct.pack('<Q' if bigtiff else '<H', len(entries))
+    aux = b''
+    for tag in sorted(entries):
+        typ, count, raw = entries[tag]
+        if len(raw) <= inline:
+            value = raw.ljust(inline, b'\x00')
+        else:
+            value = struct.pack('<Q' if bigtiff else '<L', aux_offset + len(aux))
+            aux += raw + b'\x00' * (len(raw) & 1)
+        head += struct.pack('<HHQ' if bigtiff else '<HHL', tag, typ, count) + value
+    # 下一个 IFD 的偏移量，写入下一页时回填
+    head += b'\x00' * inline
+    return head + aux, ifd_offset + head_size - inline
+
+
+def encode_block(image: Image.Image, save_kwargs: dict) -> Tuple[bytes, dict]:
+    """
+    用 Pillow 将一个分块（瓦片或条带）编码为单条带的 TIFF，
+    返回 (压缩后的数据, 该页的其余标签)。这样分块写入支持 Pillow 支持的所有压缩方式。
+    """
+    width, height = image.size
+    # strip_size 足够大时 libtiff 把整个分块写为一个条带
+    encoded = encode_page(image, dict(save_kwargs, strip_size=row_bytes(width, image.mode) * height + 1))
+    tags = _parse_ifd(encoded)
+    offsets, counts = _unpack_values(tags[273]), _unpack_values(tags[279])
+    if len(offsets) != 1:
+        raise ValueError(f"分块编码产生了 {len(offsets)} 个条带")
+    data = encoded[offsets[0]:offsets[0] + counts[0]]
+    return data, {tag: entry for tag, entry in tags.items() if tag not in _LAYOUT_TAGS}
+
+
+class BlockTiffWriter:
+    """
+    自行组织文件结构的多页 TIFF 写入器，支持瓦片 (tiled) 布局和 BigTIFF：
+    - tile_size 为整数时按 tile_size x tile_size 的瓦片写入，查看器可以只解码需要显示的区域；
+      为 None 时按约 64KB 的条带写入，与 Pillow 默认的布局相同
+    - bigtiff 为 True 时使用 64 位偏移量，文件大小不受 4GB 限制；
+      为 False 时写出经典 TIFF，超过 4GB 会抛出异常而不是生成损坏的文件
+    每个分块单独编码后立即写入文件，write() 的参数只需提供 size、mode 和 crop(box)，
+    因此可以传入按需渲染的页面（见 image_to_tif 中的 PDF 分带渲染），整页像素不必同时驻留内存。
+    压缩由 Pillow 完成（见 encode_block），支持的压缩方式与 TiffPageWriter 相同。
+    write_encoded() 与 TiffPageWriter 的同名方法一样接受预先编码的单页 TIFF，按原布局复制到输出中，
+    因此并行编码、页面缓存和 JPEG 原样写入的结果同样可以写入 BigTIFF。
+    """
+
+    def __init__(self, output_path: str, compression='raw', dpi=200, jpeg_quality=None,
+                 tile_size: Optional[int] = 256, bigtiff=False):
+        if tile_size is not None and (tile_size <= 0 or tile_size % 16):
+            raise ValueError(f"瓦片尺寸必须是 16 的正整数倍: {tile_size}")
+        self.output_path = output_path
+        self.compression = compression
+        self.dpi = dpi
+        self.jpeg_quality = jpeg_quality
+        self.tile_size = tile_size
+        self.bigtiff = bigtiff
+
+        self.page_count = 0
+        self._fp = None
+        # 需要回填下一个 IFD 偏移量的位置
+        self._next_ifd_at = None
+
+    def save_kwargs(self, mode: str) -> dict:
+        """模式为 mode 的页面的保存参数，与 TiffPageWriter.save_kwargs 相同"""
+        return build_save_kwargs(self.compression, self.dpi, self.jpeg_quality, mode)
+
+    def write_encoded(self, data: bytes):
+        """
+        追加一页由 encode_page / jpeg_tiff_page 预先编码好的小端经典单页 TIFF：
+        条带（或瓦片）数据原样复制，只重写偏移量，不重新编码，也不受 tile_size 影响。
+        """
+        self._open()
+        tags = _parse_ifd(data)
+        offset_tag, count_tag = (324, 325) if 324 in tags else (273, 279)
+        offsets, counts = _unpack_values(tags[offset_tag]), _unpack_values(tags[count_tag])
+        moved = [self._append(data[offset:offset + count]) for offset, count in zip(offsets, counts)]
+        tags = {tag: entry for tag, entry in tags.items()
+                if tag not in (offset_tag, count_tag) and tag not in _POINTER_TAGS}
+        self._write_ifd(tags, {offset_tag: (self._offset_type, moved), count_tag: (self._offset_type, counts)})
+        self.page_count += 1
+
+    def write(self, image, telemetry: Telemetry = NULL_TELEMETRY, **fields):
+        """逐个分块编码并追加一页；fields 为记录到 telemetry 中的附加字段"""
+        self._open()
+        width, height = image.size
+        save_kwargs = self.save_kwargs(image.mode)
+        if self.tile_size:
+            block_width = block_height = self.tile_size
+        else:
+            # JPEG 要求条带行数为 8 的倍数
+            block_width, block_height = width, max(8, STRIP_SIZE // row_bytes(width, image.mode) // 8 * 8)
+
+        offsets, counts, tags = [], [], None
+        for row, top in enumerate(range(0, height, block_height)):
+            bottom = top + block_height if self.tile_size else min(top + block_height, height)
+            # 右侧和底部的瓦片超出图像的部分由 crop 填充，条带布局的最后一个条带直接缩短
+            blocks = [image.crop((left, top, left + block_width, bottom)) for left in range(0, width, block_width)]
+            with telemetry.span('encode', row=row, **fields) as span:
+                encoded = []
+                for block in blocks:
+                    data, block_tags = encode_block(block, save_kwargs)
+                    encoded.append(data)
+                    tags = tags or block_tags
+                    block.close()
+                span['bytes'] = sum(len(data) for data in encoded)
+            with telemetry.span('write', row=row, bytes=span['bytes'], **fields):
+                for data in encoded:
+                    offsets.append(self._append(data))
+                    counts.append(len(data))
+
+        if self.tile_size:
+            layout = {322: (_LONG, [block_width]), 323: (_LONG, [block_height]),
+                      324: (self._offset_type, offsets), 325: (self._offset_type, counts)}
+        else:
+            layout = {278: (_LONG, [block_height]), 273: (self._offset_type, offsets),
+                      279: (self._offset_type, counts)}
+        layout.update({256: (_LONG, [width]), 257: (_LONG, [height])})
+        self._write_ifd(tags, layout)
+        self.page_count += 1
+
+    @property
+    def _offset_type(self):
+        return _LONG8 if self.bigtiff else _LONG
+
+    def _open(self):
+        if self._fp is None:
+            # 首页到达时才创建文件，避免没有任何页面时留下空文件
+            self._fp = open(self.output_path, 'w+b')
+            if self.bigtiff:
+                self._fp.write(b'II+\x00' + struct.pack('<HHQ', 8, 0, 0))
+                self._next_ifd_at = 8
+            else:
+                self._fp.write(b'II*\x00' + struct.pack('<L', 0))
+                self._next_ifd_at = 4
+        return self._fp
+
+    def _append(self, data: bytes) -> int:
+        """在文件末尾按字对齐写入 data，返回其偏移量"""
+        fp = self._fp
+        offset = fp.seek(0, os.SEEK_END)
+        if offset & 1:
+            fp.write(b'\x00')
+            offset += 1
+        if not self.bigtiff and offset + len(data) > CLASSIC_TIFF_LIMIT:
+            raise ClassicTiffLimitError("输出文件超过 4GB，经典 TIFF 无法寻址，请改用 BigTIFF")
+        fp.write(data)
+        return offset
+
+    def _write_ifd(self, tags: dict, layout: dict):
+        ifd_offset = self._fp.seek(0, os.SEEK_END)
+        ifd_offset += ifd_offset & 1
+        ifd, next_ifd_at = pack_ifd({**tags, **pack_values(layout)}, ifd_offset, self.bigtiff)
+        self._append(ifd)
+        self._fp.seek(self._next_ifd_at)
+        self._fp.write(struct.pack('<Q' if self.bigtiff else '<L', ifd_offset))
+        self._next_ifd_at = next_ifd_at
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def abort(self):
+        """关闭并删除写了一半的输出文件"""
+        created = self._fp is not None
+        self.close()
+        if created and os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
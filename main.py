@@ -1,4 +1,8 @@
+import multiprocessing
+
 from app.main_window import run_app
 
 if __name__ == "__main__":
+    # PyInstaller 打包后使用多进程需要此调用
+    multiprocessing.freeze_support()
     run_app()
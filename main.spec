@@ -31,7 +31,7 @@ exe = EXE(
     name='ImageUtils',  # 生成的可执行文件名称
     debug=False,
     strip=False,
-    upx=True,
+    upx=False,  # UPX 压缩的 Qt 等动态库每次启动都要先解压，关闭以缩短冷启动时间
     console=False,  # 是否在命令行窗口中运行
     icon='icon.ico'
 )
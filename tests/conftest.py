@@ -0,0 +1,27 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import fitz
+import pytest
+from PIL import Image
+
+
+@pytest.fixture
+def sample_paths(tmp_path):
+    """合并测试共用的输入：PNG（400x300 RGB）、3 页 PDF（200x300pt）和灰度 JPEG（300x500），按此顺序"""
+    png_path = str(tmp_path / "a.png")
+    Image.new('RGB', (400, 300), (200, 10, 10)).save(png_path)
+    jpg_path = str(tmp_path / "b.jpg")
+    Image.new('L', (300, 500), 120).save(jpg_path)
+
+    pdf_path = str(tmp_path / "c.pdf")
+    doc = fitz.open()
+    for i in range(3):
+        page = doc.new_page(width=200, height=300)
+        page.insert_text((20, 50), f"page {i}")
+    doc.save(pdf_path)
+    doc.close()
+    return [png_path, pdf_path, jpg_path]
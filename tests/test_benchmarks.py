@@ -0,0 +1,35 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks import startup
+
+
+def test_parse_importtime():
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |     _io\n"
+        "import time:       300 |        420 |   io\n"
+        "import time:      1000 |       1420 | app.main_window\n"
+    )
+    modules = startup.parse_importtime(stderr)
+    assert [(m['module'], m['depth']) for m in modules] == [('_io', 2), ('io', 1), ('app.main_window', 0)]
+    assert modules[-1]['cumulative_us'] == 1420
+
+
+def test_startup_probe_reports_first_window():
+    run = startup.run_startup()
+    assert 0 < run['first_window_s'] < run['exit_s'] + 1
+    assert run['modules'] > 0
+
+
+def test_find_regressions():
+    from benchmarks import throughput
+
+    baseline = {'cases': {'tif/raw': {'throughput': 100.0}, 'excel/flat': {'throughput': 50.0},
+                          'tif/jpeg': {'error': 'failed'}}}
+    current = {'cases': {'tif/raw': {'throughput': 90.0}, 'excel/flat': {'throughput': 40.0},
+                         'tif/jpeg': {'throughput': 10.0}}}
+    assert throughput.find_regressions(current, baseline, 0.15) == [('excel/flat', 50.0, 40.0)]
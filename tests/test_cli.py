@@ -0,0 +1,203 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import io
+import json
+import subprocess
+import threading
+import time
+
+import pandas as pd
+import pytest
+from PIL import Image
+
+from core import cli
+
+
+def _run(argv):
+    stream = io.StringIO()
+    code = cli.main(argv, stream)
+    return code, [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_tif_job_reports_json_progress(tmp_path):
+    scans = tmp_path / "scans"
+    scans.mkdir()
+    for i in range(3):
+        Image.new('RGB', (50, 40), (i, 0, 0)).save(scans / f"{i}.png")
+    output = str(tmp_path / "out.tif")
+
+    code, events = _run(['--progress', 'json', 'tif', str(scans), '-o', output, '--compression', 'tiff_lzw'])
+    assert code == cli.EXIT_OK
+    assert [e['event'] for e in events][:2] == ['start', 'begin']
+    assert events[-1] == {'event': 'summary', 'ok': 1, 'failed': 0}
+    with Image.open(output) as img:
+        assert img.n_frames == 3
+
+
+def test_batch_runs_jobs_and_reports_failures(tmp_path):
+    Image.new('RGB', (50, 40)).save(tmp_path / "a.png")
+    excel_path = str(tmp_path / "data.xlsx")
+    pd.DataFrame({'编号': ['A', 'B'], '值': [1, 2]}).to_excel(excel_path, index=False)
+
+    job_file = tmp_path / "jobs.json"
+    job_file.write_text(json.dumps({"workers": 4, "jobs": [
+        {"type": "tif", "inputs": str(tmp_path / "a.png"), "output": str(tmp_path / "a.tif")},
+        {"id": "rows", "type": "excel", "excel": excel_path, "sheet": "Sheet1",
+         "output": str(tmp_path / "rows"), "naming_field": "编号"},
+        {"id": "missing", "type": "tif", "inputs": [str(tmp_path / "nope.png")], "output": str(tmp_path / "b.tif")},
+    ]}), encoding='utf-8')
+
+    code, events = _run(['--progress', 'json', 'batch', str(job_file)])
+    assert code == cli.EXIT_FAILED
+    assert events[0] == {'event': 'start', 'jobs': 3, 'concurrent': 2, 'workers_per_job': 2}
+    assert {e['job'] for e in events if e['event'] == 'done'} == {'1', 'rows'}
+    assert [e['job'] for e in events if e['event'] == 'error'] == ['missing']
+    assert sorted(os.listdir(tmp_path / "rows")) == ['A.png', 'B.png']
+
+
+def test_invalid_job_file_is_usage_error(tmp_path):
+    job_file = tmp_path / "jobs.json"
+    job_file.write_text('[{"type": "pdf"}]')
+    code, events = _run(['--progress', 'json', 'batch', str(job_file)])
+    assert code == cli.EXIT_USAGE
+    assert events[0]['event'] == 'error'
+
+
+def test_invalid_share_strategy_is_usage_error(tmp_path, capsys):
+    excel_path = str(tmp_path / "data.xlsx")
+    with pytest.raises(SystemExit) as exc:
+        cli.main(['excel', excel_path, '--sheet', 'Sheet1', '-o', str(tmp_path), '--share-strategy', 'move'])
+    assert exc.value.code == cli.EXIT_USAGE
+
+    job_file = tmp_path / "jobs.json"
+    job_file.write_text(json.dumps([{"type": "excel", "excel": excel_path, "sheet": "Sheet1",
+                                     "output": "out", "share_strategy": "move"}]), encoding='utf-8')
+    code, events = _run(['--progress', 'json', 'batch', str(job_file)])
+    assert code == cli.EXIT_USAGE and events[0]['event'] == 'error'
+
+
+def test_plan_workers():
+    assert cli.plan_workers(10, 8) == (4, 2)
+    assert cli.plan_workers(2, 8) == (2, 4)
+    assert cli.plan_workers(3, 3) == (1, 3)
+    assert cli.plan_workers(3, 0) == (1, 1)
+
+
+def test_in_process_jobs_run_one_at_a_time(tmp_path, monkeypatch):
+    Image.new('RGB', (50, 40)).save(tmp_path / "a.png")
+    active, peak = [], []
+    lock = threading.Lock()
+
+    def runner(job, workers, progress_callback=None, telemetry=None):
+        with lock:
+            active.append(job['output'])
+            peak.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.remove(job['output'])
+
+    monkeypatch.setitem(cli._RUNNERS, 'tif', runner)
+    # tile_size 的任务不使用工作进程，即使分到多个 workers 也不能并发
+    jobs = [{'type': 'tif', 'inputs': [str(tmp_path / "a.png")], 'output': str(tmp_path / f"{i}.tif"), 'tile_size': 64}
+            for i in range(3)]
+    reporter = cli.ProgressReporter('none')
+    assert cli.run_jobs(jobs, 8, reporter) == cli.EXIT_OK
+    assert len(peak) == 3 and max(peak) == 1
+
+
+def test_job_file_paths_are_relative_to_file(tmp_path, monkeypatch):
+    job_dir = tmp_path / "jobs"
+    (job_dir / "scans").mkdir(parents=True)
+    Image.new('RGB', (50, 40)).save(job_dir / "scans" / "a.png")
+    job_file = job_dir / "jobs.json"
+    job_file.write_text(json.dumps([{"type": "tif", "inputs": ["scans"], "output": "out.tif",
+                                     "trace": "trace.json"}]), encoding='utf-8')
+
+    monkeypatch.chdir(tmp_path)
+    code, events = _run(['--progress', 'json', 'batch', str(job_file)])
+    assert code == cli.EXIT_OK
+    assert os.path.exists(job_dir / "out.tif") and os.path.exists(job_dir / "trace.json")
+    assert not os.path.exists(tmp_path / "out.tif")
+
+
+def test_cli_does_not_import_qt():
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    result = subprocess.run(
+        [sys.executable, '-c', "import sys; from core import cli; cli.build_parser(); "
+                               "print(any(name.startswith('PyQt6') for name in sys.modules))"],
+        cwd=root, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == 'False'
+
+
+def test_trace_writes_chrome_trace(tmp_path):
+    Image.new('RGB', (50, 40)).save(tmp_path / "a.png")
+    trace = str(tmp_path / "trace.json")
+
+    code, events = _run(['--progress', 'json', 'tif', str(tmp_path / "a.png"), '-o', str(tmp_path / "a.tif"),
+                         '--trace', trace])
+    assert code == cli.EXIT_OK
+    telemetry = next(e for e in events if e['event'] == 'telemetry')
+    assert telemetry['trace'] == trace
+    assert telemetry['stages']['encode']['count'] == 1
+    with open(trace, encoding='utf-8') as f:
+        assert any(e['name'] == 'write' for e in json.load(f)['traceEvents'])
+
+
+def test_dry_run_only_preflights(tmp_path):
+    Image.new('RGB', (50, 40)).save(tmp_path / "a.png")
+    output = tmp_path / "a.tif"
+
+    code, events = _run(['--progress', 'json', '--dry-run', 'tif', str(tmp_path / "a.png"), '-o', str(output)])
+    assert code == cli.EXIT_OK
+    preflight = next(e for e in events if e['event'] == 'preflight')
+    assert (preflight['pages'], preflight['pixels']) == (1, 50 * 40)
+    assert preflight['peak_rss_bytes'] > 0 and preflight['output_bytes'] > 0
+    assert not output.exists()
+
+
+def test_preflight_enforces_memory_budget(tmp_path, monkeypatch):
+    Image.new('RGB', (50, 40)).save(tmp_path / "a.png")
+    output = tmp_path / "a.tif"
+    argv = ['--progress', 'json', 'tif', str(tmp_path / "a.png"), '-o', str(output)]
+
+    monkeypatch.setattr(cli, 'memory_budget', lambda concurrent=1: 1024)
+    code, events = _run(argv)
+    assert code == cli.EXIT_FAILED
+    assert '预计峰值内存' in next(e for e in events if e['event'] == 'error')['error']
+    assert not output.exists()
+
+    code, events = _run(['--force'] + argv)
+    assert code == cli.EXIT_OK
+    assert output.exists()
+
+
+def test_preflight_switches_excel_to_streaming(tmp_path, monkeypatch):
+    from core.excel_to_img import preflight
+
+    excel_path = str(tmp_path / "data.xlsx")
+    pd.DataFrame({'编号': ['A', 'B'], '值': [1, 2]}).to_excel(excel_path, index=False)
+    # 让一次读取整张 sheet 的估计超出预算，而流式读取不会
+    monkeypatch.setattr(preflight, 'CELL_BYTES', 2 ** 40)
+    monkeypatch.setattr(cli, 'memory_budget', lambda concurrent=1: 2 ** 32)
+
+    code, events = _run(['--progress', 'json', 'excel', excel_path, '--sheet', 'Sheet1', '-o', str(tmp_path / "rows"),
+                         '--naming-field', '编号'])
+    assert code == cli.EXIT_OK
+    assert next(e for e in events if e['event'] == 'preflight')['streaming'] is True
+    assert sorted(os.listdir(tmp_path / "rows")) == ['A.png', 'B.png']
+
+
+def test_memory_limit_configures_shared_scheduler(tmp_path):
+    Image.new('RGB', (50, 40)).save(tmp_path / "a.png")
+
+    code, events = _run(['--progress', 'json', '--memory-limit', '256', 'tif', str(tmp_path / "a.png"),
+                         '-o', str(tmp_path / "a.tif")])
+    assert code == cli.EXIT_OK
+    scheduler = events[-2]
+    assert scheduler['event'] == 'scheduler'
+    assert scheduler['memory_bytes'] == 256 * 1024 * 1024
+    assert scheduler['admitted'] >= 1 and scheduler['running'] == 0 and scheduler['queued'] == 0
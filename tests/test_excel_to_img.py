@@ -0,0 +1,236 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pandas as pd
+import pytest
+from PIL import Image
+
+from core.excel_to_img import excel_to_img
+from core.excel_to_img.renderer import RowImageRenderer
+
+
+@pytest.fixture
+def excel_path(tmp_path):
+    path = str(tmp_path / "data.xlsx")
+    df = pd.DataFrame({
+        '编号': ['A1', 'A1', 'B/2', None],
+        '姓名': ['张三', '李四', '王五', '赵六'],
+        '金额': [1.5, None, 3, 4],
+    })
+    df.to_excel(path, sheet_name='Sheet1', index=False)
+    return path
+
+
+def test_renderer_layout():
+    renderer = RowImageRenderer()
+    img = renderer.render({'a': 'x', 'b': ''})
+    height_a = renderer.measure('a : x')[1]
+    height_b = renderer.measure('b : ')[1]
+    expected_height = renderer.PADDING * 2 + height_a + height_b + renderer.LINE_SPACING + renderer.SEPARATOR_HEIGHT
+    assert img.size[1] == expected_height
+
+
+def test_generate_images_naming(excel_path, tmp_path):
+    output_dir = str(tmp_path / "out")
+    excel_to_img.generate_images(excel_path, 'Sheet1', output_dir, naming_field='编号')
+    assert sorted(os.listdir(output_dir)) == ['A1.png', 'A1_1.png', 'B2.png', 'row_4.png']
+
+
+def test_generate_images_grouped(excel_path, tmp_path):
+    output_dir = str(tmp_path / "out")
+    share_dir = tmp_path / "share"
+    share_dir.mkdir()
+    (share_dir / "readme.txt").write_text("shared")
+
+    excel_to_img.generate_images(excel_path, 'Sheet1', output_dir, naming_field='编号', is_grouped=True,
+                                 share_dir=str(share_dir))
+    assert sorted(os.listdir(os.path.join(output_dir, 'A1'))) == ['A1_1.png', 'A1_2.png', 'readme.txt']
+    with Image.open(os.path.join(output_dir, 'B2', 'B2_1.png')) as img:
+        assert img.mode == 'RGB'
+
+
+def test_parallel_matches_sequential(excel_path, tmp_path):
+    sequential = tmp_path / "sequential"
+    parallel = tmp_path / "parallel"
+    excel_to_img.generate_images(excel_path, 'Sheet1', str(sequential), naming_field='编号')
+    excel_to_img.generate_images(excel_path, 'Sheet1', str(parallel), naming_field='编号', workers=2, chunk_size=1)
+
+    assert sorted(os.listdir(sequential)) == sorted(os.listdir(parallel))
+    for name in os.listdir(sequential):
+        assert (sequential / name).read_bytes() == (parallel / name).read_bytes()
+
+
+@pytest.mark.parametrize("is_grouped", [False, True])
+def test_streaming_matches_dataframe(excel_path, tmp_path, is_grouped):
+    expected = tmp_path / "expected"
+    streamed = tmp_path / "streamed"
+    chunked = tmp_path / "chunked"
+    excel_to_img.generate_images(excel_path, 'Sheet1', str(expected), naming_field='编号', is_grouped=is_grouped)
+    excel_to_img.generate_images(excel_path, 'Sheet1', str(streamed), naming_field='编号', is_grouped=is_grouped,
+                                 streaming=True)
+    # 分块不影响文件命名
+    excel_to_img.generate_images(excel_path, 'Sheet1', str(chunked), naming_field='编号', is_grouped=is_grouped,
+                                 streaming=True, stream_chunk_rows=1)
+
+    expected_files = sorted(p.relative_to(expected) for p in expected.rglob('*.png'))
+    assert expected_files == sorted(p.relative_to(streamed) for p in streamed.rglob('*.png'))
+    assert expected_files == sorted(p.relative_to(chunked) for p in chunked.rglob('*.png'))
+    for rel in expected_files:
+        assert (expected / rel).read_bytes() == (streamed / rel).read_bytes()
+
+
+def test_renderer_lines_match_batch_lines():
+    df = pd.DataFrame({'编号': ['A1', 'B2'], '备注': ['  ', None], '金额': [1.5, 2]})
+    batch = excel_to_img.format_lines(excel_to_img.prepare_frame(df))
+    renderer = RowImageRenderer()
+    # create_image 逐行渲染与批量生成共用同一个 format_lines
+    assert [renderer.format_lines(row) for row in excel_to_img.prepare_frame(df).to_dict('records')] == batch
+    assert renderer.format_lines({'备注': None}) == batch[1][1:2]
+
+
+def test_create_image_accepts_series_row(tmp_path):
+    row = pd.Series({'a': '1', 'b': 'x'})
+    output = str(tmp_path / "row.png")
+    excel_to_img.create_image(row, output)
+    with Image.open(output) as img, RowImageRenderer().render({'a': '1', 'b': 'x'}) as expected:
+        assert img.size == expected.size
+
+
+def test_workbook_metadata_is_cached(excel_path):
+    from core.excel_to_img.workbook_cache import get_workbook_info
+
+    assert excel_to_img.get_excel_sheets(excel_path) == ['Sheet1']
+    assert excel_to_img.get_sheet_columns(excel_path, 'Sheet1') == ['编号', '姓名', '金额']
+    assert excel_to_img.get_sheet_row_count(excel_path, 'Sheet1') == 4
+    assert get_workbook_info(excel_path) is get_workbook_info(excel_path)
+    assert len(get_workbook_info(excel_path).read_sheet('Sheet1')) == 4
+    if os.path.isdir('/proc/self/fd'):
+        # 缓存只保留元数据，不持有打开的文件（Windows 下会锁定工作簿）
+        fds = [os.path.join('/proc/self/fd', fd) for fd in os.listdir('/proc/self/fd')]
+        assert os.path.realpath(excel_path) not in {os.path.realpath(fd) for fd in fds}
+
+    pd.DataFrame({'x': [1]}).to_excel(excel_path, sheet_name='Other', index=False)
+    os.utime(excel_path, ns=(0, 10 ** 18))
+    assert excel_to_img.get_excel_sheets(excel_path) == ['Other']
+
+
+@pytest.mark.parametrize("is_grouped", [False, True])
+def test_incremental_skips_unchanged_rows(excel_path, tmp_path, is_grouped):
+    output_dir = str(tmp_path / "out")
+    messages = []
+    kwargs = dict(naming_field='编号', is_grouped=is_grouped, incremental=True,
+                  progress_callback=lambda value, msg: messages.append(msg))
+    excel_to_img.generate_images(excel_path, 'Sheet1', output_dir, **kwargs)
+    first = {os.path.join(root, name): os.path.getmtime(os.path.join(root, name))
+             for root, _, names in os.walk(output_dir) for name in names if name.endswith('.png')}
+
+    # 再次运行：文件名不变，全部跳过
+    excel_to_img.generate_images(excel_path, 'Sheet1', output_dir, **kwargs)
+    assert messages[-1] == f"已生成 0 张图片，{len(first)} 张未变化已跳过"
+    second = {path for root, _, names in os.walk(output_dir)
+              for path in (os.path.join(root, name) for name in names) if path.endswith('.png')}
+    assert second == set(first)
+
+    # 修改一行、删除一行后只重新渲染修改的行，删除行对应的图片被移除
+    df = pd.DataFrame({
+        '编号': ['A1', 'A1', 'B/2'],
+        '姓名': ['张三', '李四改', '王五'],
+        '金额': [1.5, None, 3],
+    })
+    df.to_excel(excel_path, sheet_name='Sheet1', index=False)
+    excel_to_img.generate_images(excel_path, 'Sheet1', output_dir, **kwargs)
+    assert messages[-1] == "已生成 1 张图片，2 张未变化已跳过"
+    third = {path for root, _, names in os.walk(output_dir)
+             for path in (os.path.join(root, name) for name in names) if path.endswith('.png')}
+    assert len(third) == 3 and third < set(first)
+
+    reference = str(tmp_path / "reference")
+    excel_to_img.generate_images(excel_path, 'Sheet1', reference, naming_field='编号', is_grouped=is_grouped)
+    for path in third:
+        with open(path, 'rb') as f1, open(os.path.join(reference, os.path.relpath(path, output_dir)), 'rb') as f2:
+            assert f1.read() == f2.read()
+
+
+@pytest.mark.parametrize("strategy", ["auto", "hardlink", "symlink", "copy"])
+def test_share_distribution(tmp_path, strategy):
+    from core.excel_to_img.share_files import ShareDistributor
+
+    share_dir = tmp_path / "share"
+    share_dir.mkdir()
+    (share_dir / "font.ttf").write_bytes(b"x" * 1000)
+    (share_dir / "readme.txt").write_text("shared")
+    case_dirs = [str(tmp_path / f"case_{i}") for i in range(5)]
+    for case_dir in case_dirs:
+        os.makedirs(case_dir)
+    # 已存在的旧文件会被替换
+    (tmp_path / "case_0" / "readme.txt").write_text("old")
+
+    stats = ShareDistributor(str(share_dir), strategy).distribute_all(case_dirs)
+    assert sum(stats.values()) == 10
+    for case_dir in case_dirs:
+        assert (tmp_path / case_dir / "readme.txt").read_text() == "shared"
+        if strategy == "hardlink":
+            assert os.path.samefile(share_dir / "font.ttf", os.path.join(case_dir, "font.ttf"))
+        if strategy == "symlink":
+            assert os.path.islink(os.path.join(case_dir, "font.ttf"))
+
+    # 再次分发时全部跳过
+    assert ShareDistributor(str(share_dir), strategy).distribute_all(case_dirs) == {'skipped': 10}
+
+
+def test_share_auto_downgrades_only_on_capability_errors(tmp_path, monkeypatch):
+    import errno
+    from core.excel_to_img import share_files
+
+    share_dir = tmp_path / "share"
+    share_dir.mkdir()
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (share_dir / name).write_text(name)
+    failures = {'a.txt': errno.ENOSPC}
+
+    def hardlink(source, target):
+        code = failures.pop(os.path.basename(source), None)
+        if code is not None:
+            raise OSError(code, os.strerror(code), target)
+        os.link(source, target)
+
+    def reflink(source, target):
+        raise OSError(errno.EOPNOTSUPP, os.strerror(errno.EOPNOTSUPP), target)
+
+    monkeypatch.setitem(share_files._METHODS, 'reflink', reflink)
+    monkeypatch.setitem(share_files._METHODS, 'hardlink', hardlink)
+
+    # 与单个文件有关的错误只让该文件改用下一种方式，其余文件仍然使用硬链接
+    distributor = share_files.ShareDistributor(str(share_dir), 'auto')
+    case_dir = tmp_path / "case"
+    case_dir.mkdir()
+    assert distributor.distribute_all([str(case_dir)]) == {'hardlink': 2, 'symlink': 1}
+    assert distributor._methods == ['hardlink', 'symlink', 'copy']
+
+    # 跨设备等表示不支持的错误才让本次运行不再尝试硬链接
+    failures.update({'a.txt': errno.EXDEV})
+    other_dir = tmp_path / "other"
+    other_dir.mkdir()
+    assert distributor.distribute_all([str(other_dir)]) == {'hardlink': 2, 'symlink': 4}
+    assert distributor._methods == ['symlink', 'copy']
+
+
+def test_incremental_keeps_other_sources(tmp_path):
+    excel_path = str(tmp_path / "data.xlsx")
+    with pd.ExcelWriter(excel_path) as writer:
+        pd.DataFrame({'编号': ['a1', 'a2'], '值': [1, 2]}).to_excel(writer, sheet_name='S1', index=False)
+        pd.DataFrame({'编号': ['b1'], '值': [3]}).to_excel(writer, sheet_name='S2', index=False)
+    output_dir = str(tmp_path / "out")
+
+    excel_to_img.generate_images(excel_path, 'S1', output_dir, naming_field='编号', incremental=True)
+    # 另一个 sheet 输出到同一目录，不会删除 S1 的图片
+    excel_to_img.generate_images(excel_path, 'S2', output_dir, naming_field='编号', incremental=True)
+    assert sorted(name for name in os.listdir(output_dir) if name.endswith('.png')) == ['a1.png', 'a2.png', 'b1.png']
+
+    # S1 删除一行后只清理 S1 自己的旧图片
+    pd.DataFrame({'编号': ['a1'], '值': [1]}).to_excel(excel_path, sheet_name='S1', index=False)
+    excel_to_img.generate_images(excel_path, 'S1', output_dir, naming_field='编号', incremental=True)
+    assert sorted(name for name in os.listdir(output_dir) if name.endswith('.png')) == ['a1.png', 'b1.png']
@@ -0,0 +1,349 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import fitz
+import pytest
+from PIL import Image
+
+from core.image_to_tif import image_to_tif
+
+
+@pytest.mark.parametrize("compression", ["raw", "lzw", "jpeg", "tiff_adobe_deflate"])
+def test_streaming_matches_save_all(sample_paths, tmp_path, compression):
+    streamed = str(tmp_path / "streamed.tif")
+    legacy = str(tmp_path / "legacy.tif")
+    image_to_tif.merge_images_to_tif(sample_paths, streamed, compression=compression, jpeg_quality=70)
+    image_to_tif.merge_images_to_tif(sample_paths, legacy, compression=compression, jpeg_quality=70,
+                                     streaming=False)
+
+    with open(streamed, 'rb') as f1, open(legacy, 'rb') as f2:
+        assert f1.read() == f2.read()
+    with Image.open(streamed) as img:
+        assert img.n_frames == 5
+
+
+def test_parallel_matches_sequential(sample_paths, tmp_path):
+    sequential = str(tmp_path / "sequential.tif")
+    parallel = str(tmp_path / "parallel.tif")
+    image_to_tif.merge_images_to_tif(sample_paths * 3, sequential, compression='lzw')
+    image_to_tif.merge_images_to_tif(sample_paths * 3, parallel, compression='lzw', workers=3, max_in_flight=2)
+
+    with open(sequential, 'rb') as f1, open(parallel, 'rb') as f2:
+        assert f1.read() == f2.read()
+
+
+@pytest.mark.parametrize("colorspace, mode", [("rgb", "RGB"), ("gray", "L")])
+def test_pdf_to_image_colorspace(sample_paths, colorspace, mode):
+    images = image_to_tif.pdf_to_image(sample_paths[1], [0, 2], dpi=72, colorspace=colorspace)
+    assert [img.mode for img in images] == [mode, mode]
+    assert images[0].size == (200, 300)
+
+
+def test_iter_pages_is_lazy(sample_paths):
+    pages = image_to_tif.iter_pages(sample_paths, dpi=72)
+    first = next(pages)
+    assert (first.path, first.page_index, first.size) == (sample_paths[0], 0, (400, 300))
+
+    rest = list(pages)
+    assert [(page.page_index, page.size) for page in rest[:3]] == [(0, (200, 300)), (1, (200, 300)), (2, (200, 300))]
+    assert rest[-1].path == sample_paths[2]
+
+
+def test_preview_pdf_first_page(sample_paths):
+    with image_to_tif.preview_image(sample_paths[1], dpi=72) as img:
+        assert img.size == (200, 300)
+
+
+def test_preview_reduced(sample_paths, tmp_path):
+    jpg_path = str(tmp_path / "large.jpg")
+    Image.new('RGB', (1600, 1200), (0, 128, 0)).save(jpg_path)
+
+    with image_to_tif.preview_image(jpg_path, box=(100, 100)) as img:
+        assert img.size == (100, 75)
+    with image_to_tif.preview_image(sample_paths[1], box=(100, 100)) as img:
+        assert img.size[1] == 100
+
+
+@pytest.mark.parametrize("mode, transparent", [("RGBA", (0, 0, 0, 0)), ("LA", (0, 0))])
+@pytest.mark.parametrize("color_mode", ["rgb", "native"])
+def test_transparency_composited_onto_white_in_previews(tmp_path, mode, transparent, color_mode):
+    png_path = str(tmp_path / "alpha.png")
+    img = Image.new(mode, (400, 300), transparent)
+    img.paste(Image.new(mode, (200, 300), (0, 255) if mode == 'LA' else (200, 10, 10, 255)), (0, 0))
+    img.save(png_path)
+
+    # 缩略图中透明区域为白色，不透明区域保持原色
+    with image_to_tif.preview_image(png_path, box=(100, 100)) as preview:
+        assert preview.convert('RGB').getpixel((90, 10)) == (255, 255, 255)
+        assert preview.convert('RGB').getpixel((10, 10)) != (255, 255, 255)
+
+    # 合并的 TIFF 保持原有的转换方式，输出不变
+    output = str(tmp_path / "out.tif")
+    image_to_tif.merge_images_to_tif([png_path], output, compression='tiff_lzw', color_mode=color_mode)
+    expected = img.convert('RGB' if color_mode == 'rgb' else mode[:-1])
+    with Image.open(output) as page:
+        assert page.mode == expected.mode and page.tobytes() == expected.tobytes()
+
+
+def test_merge_without_pages_raises(tmp_path):
+    output = str(tmp_path / "empty.tif")
+    with pytest.raises(ValueError):
+        image_to_tif.merge_images_to_tif([], output)
+    assert not os.path.exists(output)
+
+
+def test_page_cache_reuses_encoded_pages(sample_paths, tmp_path, monkeypatch):
+    from core.image_to_tif.page_cache import EncodedPageCache
+
+    cache = EncodedPageCache(str(tmp_path / "pages"))
+    first = str(tmp_path / "first.tif")
+    image_to_tif.merge_images_to_tif(sample_paths, first, compression='tiff_lzw', page_cache=cache)
+
+    # 调整顺序后重新保存：所有页面都命中缓存，不再解码和编码
+    encoded = []
+    original = image_to_tif._encode_page_job
+    monkeypatch.setattr(image_to_tif, '_encode_page_job',
+                        lambda job, **kwargs: encoded.append(job) or original(job, **kwargs))
+    reordered = sample_paths[::-1]
+    cached = str(tmp_path / "cached.tif")
+    image_to_tif.merge_images_to_tif(reordered, cached, compression='tiff_lzw', page_cache=cache)
+    assert encoded == []
+
+    fresh = str(tmp_path / "fresh.tif")
+    image_to_tif.merge_images_to_tif(reordered, fresh, compression='tiff_lzw')
+    with open(cached, 'rb') as f1, open(fresh, 'rb') as f2:
+        assert f1.read() == f2.read()
+
+    # 修改其中一个文件后只重新编码该文件
+    Image.new('RGB', (400, 300), (0, 0, 200)).save(sample_paths[0])
+    os.utime(sample_paths[0], ns=(0, 10 ** 18))
+    image_to_tif.merge_images_to_tif(reordered, cached, compression='tiff_lzw', page_cache=cache)
+    assert [job[0] for job in encoded] == [sample_paths[0]]
+
+
+def _open_fds(path):
+    fd_dir = '/proc/self/fd'
+    if not os.path.isdir(fd_dir):
+        pytest.skip("需要 /proc/self/fd")
+    found = []
+    for fd in os.listdir(fd_dir):
+        try:
+            if os.readlink(os.path.join(fd_dir, fd)) == path:
+                found.append(fd)
+        except OSError:
+            pass
+    return found
+
+
+@pytest.mark.parametrize("options", [{}, {'workers': 2}])
+def test_pdf_handles_closed_in_caller(sample_paths, tmp_path, options):
+    from core.image_to_tif.page_cache import EncodedPageCache
+
+    # 经页面缓存走逐页编码路径：调用方进程中每次打开的 PDF 都在用完后关闭
+    cache = EncodedPageCache(str(tmp_path / "pages"))
+    output = str(tmp_path / "out.tif")
+    image_to_tif.merge_images_to_tif(sample_paths, output, compression='tiff_lzw', page_cache=cache, **options)
+    assert not hasattr(image_to_tif._worker_state, 'pdf')
+    assert _open_fds(os.path.realpath(sample_paths[1])) == []
+    with Image.open(output) as img:
+        assert img.n_frames == 5
+
+
+def test_pdf_opened_once_per_merge(sample_paths, tmp_path, monkeypatch):
+    from core.image_to_tif.page_cache import EncodedPageCache
+
+    opened = []
+    original = fitz.open
+    monkeypatch.setattr(fitz, 'open', lambda *args, **kwargs: opened.append(args) or original(*args, **kwargs))
+    cache = EncodedPageCache(str(tmp_path / "pages"))
+    image_to_tif.merge_images_to_tif(sample_paths, str(tmp_path / "out.tif"), compression='tiff_lzw',
+                                     page_cache=cache, bigtiff=False)
+    # 扫描页面时打开一次，在当前进程中编码 3 页时共用一个句柄
+    assert [args[0] for args in opened] == [sample_paths[1]] * 2
+    assert _open_fds(os.path.realpath(sample_paths[1])) == []
+
+
+def _frames(path):
+    with Image.open(path) as img:
+        frames = []
+        for i in range(img.n_frames):
+            img.seek(i)
+            frames.append(img.convert('RGB'))
+        return frames
+
+
+@pytest.mark.parametrize("compression", ["raw", "tiff_lzw", "packbits"])
+@pytest.mark.parametrize("tile_size, bigtiff", [(64, False), (None, True), (128, True)])
+def test_block_writer_matches_striped(sample_paths, tmp_path, compression, tile_size, bigtiff):
+    import numpy as np
+
+    striped = str(tmp_path / "striped.tif")
+    blocks = str(tmp_path / "blocks.tif")
+    image_to_tif.merge_images_to_tif(sample_paths, striped, compression=compression)
+    image_to_tif.merge_images_to_tif(sample_paths, blocks, compression=compression, tile_size=tile_size,
+                                     bigtiff=bigtiff)
+
+    with open(blocks, 'rb') as f:
+        assert f.read(4) == (b'II+\x00' if bigtiff else b'II*\x00')
+    with Image.open(blocks) as img:
+        assert (322 in img.tag_v2) == bool(tile_size)
+    expected, actual = _frames(striped), _frames(blocks)
+    assert [img.size for img in expected] == [img.size for img in actual]
+    for a, b in zip(expected, actual):
+        # PDF 页面按带渲染，只允许个别抗锯齿像素有细微差异
+        diff = np.abs(np.asarray(a, dtype=int) - np.asarray(b, dtype=int))
+        assert diff.max() <= 32 and (diff > 0).mean() < 0.001
+
+
+def test_bigtiff_auto(sample_paths, tmp_path, monkeypatch):
+    from core.image_to_tif import tif_writer
+
+    output = str(tmp_path / "out.tif")
+    image_to_tif.merge_images_to_tif(sample_paths, output)
+    with open(output, 'rb') as f:
+        assert f.read(4) == b'II*\x00'
+
+    # 预估大小超过上限时自动改用 BigTIFF
+    monkeypatch.setattr(image_to_tif, 'CLASSIC_TIFF_LIMIT', 100_000)
+    image_to_tif.merge_images_to_tif(sample_paths, output)
+    with open(output, 'rb') as f:
+        assert f.read(4) == b'II+\x00'
+
+    # 强制经典 TIFF 时超过上限报错，不留下损坏的文件
+    monkeypatch.setattr(tif_writer, 'CLASSIC_TIFF_LIMIT', 100_000)
+    os.remove(output)
+    with pytest.raises(Exception, match='4GB'):
+        image_to_tif.merge_images_to_tif(sample_paths, output, bigtiff=False, tile_size=64)
+    assert not os.path.exists(output)
+
+
+@pytest.mark.parametrize("kwargs", [{}, {'workers': 2}, {'streaming': False}])
+def test_bigtiff_auto_retries_after_classic_overflow(sample_paths, tmp_path, monkeypatch, kwargs):
+    from core.image_to_tif import tif_writer
+
+    expected = str(tmp_path / "expected.tif")
+    image_to_tif.merge_images_to_tif(sample_paths, expected, compression='lzw')
+    # 估计仍按真实的 4GB 判断为经典 TIFF，写入时超出上限后改用 BigTIFF 重新生成
+    monkeypatch.setattr(tif_writer, 'CLASSIC_TIFF_LIMIT', 1000)
+    output = str(tmp_path / "out.tif")
+    messages = []
+    image_to_tif.merge_images_to_tif(sample_paths, output, compression='lzw',
+                                     progress_callback=lambda value, msg: messages.append(msg), **kwargs)
+    assert any('BigTIFF' in message for message in messages)
+    with open(output, 'rb') as f:
+        assert f.read(4) == b'II+\x00'
+    assert [img.tobytes() for img in _frames(output)] == [img.tobytes() for img in _frames(expected)]
+
+    with pytest.raises(tif_writer.ClassicTiffLimitError):
+        image_to_tif.merge_images_to_tif(sample_paths, output, compression='lzw', bigtiff=False, **kwargs)
+    assert not os.path.exists(output)
+
+
+@pytest.fixture
+def document_scans(tmp_path):
+    from PIL import ImageDraw
+
+    text = Image.new('L', (320, 240), 255)
+    ImageDraw.Draw(text).rectangle((40, 40, 200, 120), fill=0)
+    bilevel_path = str(tmp_path / "bilevel.png")
+    text.convert('1').save(bilevel_path)
+    # 以 RGB 保存的黑白文字页和灰度照片，auto 模式应分别识别为 1 和 L
+    rgb_text_path = str(tmp_path / "rgb_text.png")
+    text.convert('RGB').save(rgb_text_path)
+    gray_path = str(tmp_path / "gray.jpg")
+    Image.linear_gradient('L').resize((300, 200)).save(gray_path)
+    color_path = str(tmp_path / "color.png")
+    Image.new('RGB', (200, 100), (200, 30, 30)).save(color_path)
+    return [bilevel_path, rgb_text_path, gray_path, color_path]
+
+
+def _frame_info(path):
+    with Image.open(path) as img:
+        info = []
+        for i in range(img.n_frames):
+            img.seek(i)
+            info.append((img.mode, img.tag_v2[259]))
+        return info
+
+
+@pytest.mark.parametrize("color_mode, modes", [
+    ('rgb', ['RGB', 'RGB', 'RGB', 'RGB']),
+    ('native', ['1', 'RGB', 'L', 'RGB']),
+    ('auto', ['1', '1', 'L', 'RGB']),
+    ('gray', ['L', 'L', 'L', 'L']),
+    ('bilevel', ['1', '1', '1', '1']),
+])
+def test_color_mode_policy(document_scans, tmp_path, color_mode, modes):
+    output = str(tmp_path / "out.tif")
+    image_to_tif.merge_images_to_tif(document_scans, output, compression='auto', color_mode=color_mode)
+    # 黑白页使用 CCITT G4 (4)，其余页使用 Deflate (8)
+    assert _frame_info(output) == [(mode, 4 if mode == '1' else 8) for mode in modes]
+
+    for kwargs in ({'workers': 2}, {'streaming': False}, {'tile_size': 64}):
+        other = str(tmp_path / "other.tif")
+        image_to_tif.merge_images_to_tif(document_scans, other, compression='auto', color_mode=color_mode, **kwargs)
+        assert _frame_info(other) == _frame_info(output)
+
+
+def test_compression_aliases_and_fallbacks(document_scans, tmp_path):
+    output = str(tmp_path / "out.tif")
+    image_to_tif.merge_images_to_tif(document_scans[:3], output, compression='lzw', color_mode='native')
+    assert [compression for _, compression in _frame_info(output)] == [5, 5, 5]
+
+    # CCITT 只用于黑白页，JPEG 遇到黑白页改用 CCITT
+    image_to_tif.merge_images_to_tif(document_scans[:3], output, compression='ccittfax4', color_mode='native')
+    assert _frame_info(output) == [('1', 4), ('RGB', 5), ('L', 5)]
+    image_to_tif.merge_images_to_tif(document_scans[:3], output, compression='jpeg', color_mode='native')
+    assert _frame_info(output) == [('1', 4), ('RGB', 7), ('L', 7)]
+
+
+def test_jpeg_passthrough(tmp_path):
+    from PIL import ImageDraw
+
+    photo = Image.linear_gradient('L').resize((320, 240)).convert('RGB')
+    ImageDraw.Draw(photo).ellipse((60, 40, 260, 200), fill=(30, 120, 200))
+    baseline = str(tmp_path / "baseline.jpg")
+    photo.save(baseline, quality=80, subsampling=2)
+    progressive = str(tmp_path / "progressive.jpg")
+    photo.save(progressive, quality=80, progressive=True)
+    gray = str(tmp_path / "gray.jpg")
+    photo.convert('L').save(gray, quality=80)
+    paths = [baseline, progressive, gray]
+
+    output = str(tmp_path / "out.tif")
+    image_to_tif.merge_images_to_tif(paths, output, compression='jpeg', jpeg_quality=30, color_mode='native')
+    with open(baseline, 'rb') as f:
+        baseline_bytes = f.read()
+    with open(output, 'rb') as f:
+        # 基线 JPEG 的码流原样嵌入，不受 jpeg_quality 影响
+        assert baseline_bytes in f.read()
+    assert _frame_info(output) == [('RGB', 7), ('RGB', 7), ('L', 7)]
+    with Image.open(output) as tif, Image.open(baseline) as src:
+        assert tif.convert('RGB').tobytes() == src.convert('RGB').tobytes()
+
+    for kwargs in ({'workers': 2}, {'streaming': False}):
+        other = str(tmp_path / "other.tif")
+        image_to_tif.merge_images_to_tif(paths, other, compression='jpeg', jpeg_quality=30, color_mode='native',
+                                         **kwargs)
+        with open(output, 'rb') as f1, open(other, 'rb') as f2:
+            assert f1.read() == f2.read()
+
+    # BigTIFF 同样支持并行和原样写入，条带数据逐字节复制
+    big = str(tmp_path / "big.tif")
+    image_to_tif.merge_images_to_tif(paths, big, compression='jpeg', jpeg_quality=30, color_mode='native',
+                                     workers=2, bigtiff=True)
+    with open(big, 'rb') as f:
+        data = f.read()
+        assert data[:4] == b'II+\x00' and baseline_bytes in data
+    assert _frame_info(big) == _frame_info(output)
+    assert [img.tobytes() for img in _frames(big)] == [img.tobytes() for img in _frames(output)]
+
+    # 灰度 JPEG 在 rgb 策略下需要转换，关闭直通时全部重新编码
+    image_to_tif.merge_images_to_tif([gray], output, compression='jpeg', color_mode='rgb')
+    assert _frame_info(output) == [('RGB', 7)]
+    image_to_tif.merge_images_to_tif([baseline], output, compression='jpeg', jpeg_passthrough=False)
+    with open(output, 'rb') as f:
+        assert baseline_bytes not in f.read()
@@ -22,5 +22,14 @@ def test_imports():
         print(f"Error: {e}")
         sys.exit(1)
 
+def test_frames_defer_heavy_imports():
+    import subprocess
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    code = ("import sys; "
+            "import app.main_window, app.image_to_tif.image_to_tif_frame, app.excel_to_img.excel_to_img_frame; "
+            "print(sorted(name for name in ('fitz', 'pymupdf', 'pandas', 'numpy') if name in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '[]'
+
 if __name__ == "__main__":
     test_imports()
@@ -0,0 +1,97 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import dataclasses
+
+import fitz
+import pandas as pd
+import pytest
+from PIL import Image
+
+from core.common.preflight import fits_in_memory, format_bytes
+from core.excel_to_img import excel_to_img
+from core.excel_to_img.preflight import preflight_excel
+from core.image_to_tif import image_to_tif
+from core.image_to_tif.preflight import preflight_tif
+
+
+def test_preflight_tif_reads_headers_only(sample_paths, tmp_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("预检不应解码或渲染像素")
+
+    with monkeypatch.context() as m:
+        m.setattr(Image.Image, 'load', fail)
+        m.setattr(fitz.Page, 'get_pixmap', fail)
+        report = preflight_tif(sample_paths, dpi=144, color_mode='native')
+
+    assert report.page_count == 5
+    assert [page.size for page in report.pages] == [(400, 300)] + [(400, 600)] * 3 + [(300, 500)]
+    assert [page.format for page in report.pages] == ['PNG', 'PDF', 'PDF', 'PDF', 'JPEG']
+    assert report.pixels == 400 * 300 + 3 * 400 * 600 + 300 * 500
+
+    output = str(tmp_path / "out.tif")
+    image_to_tif.merge_images_to_tif(sample_paths, output, dpi=144, color_mode='native')
+    # 无压缩时输出大小由像素数决定，估计值不小于实际大小
+    assert os.path.getsize(output) <= report.output_bytes('raw') <= report.max_output_bytes('raw')
+    assert report.output_bytes('raw') < 2 * os.path.getsize(output)
+
+    # JPEG 原样写入时该页的输出即为源文件大小
+    jpeg_page = report.pages[-1]
+    assert report.output_bytes('jpeg') - report.output_bytes('jpeg', jpeg_passthrough=False) \
+        == jpeg_page.output_bytes('jpeg', True) - jpeg_page.output_bytes('jpeg')
+
+    streaming = report.peak_rss_bytes('tiff_lzw')
+    assert report.peak_rss_bytes('tiff_lzw', streaming=False) > streaming
+    assert report.peak_rss_bytes('tiff_lzw', workers=4) > streaming
+
+    summary = report.summary(compressions=['raw', 'lzw'], workers=2)
+    assert summary['pages'] == 5
+    assert set(summary['compressions']) == {'raw', 'lzw'}
+    assert summary['compressions']['lzw']['output_bytes'] < summary['compressions']['raw']['output_bytes']
+
+
+def test_bigtiff_estimate_is_realistic(tmp_path):
+    from core.image_to_tif.preflight import PagePreflight, TifPreflight
+    from core.image_to_tif.tif_writer import CLASSIC_TIFF_LIMIT
+
+    # 400 页 200dpi 的 A4 扫描 JPEG：未压缩约 4.6GB，但实际输出远小于 4GB
+    page = PagePreflight('scan.jpg', 0, (1654, 2339), 'JPEG', 'RGB', 'RGB', file_bytes=60_000)
+    report = TifPreflight([page] * 400, color_mode='rgb')
+    assert report.max_output_bytes('raw') > CLASSIC_TIFF_LIMIT
+    for compression in ('jpeg', 'tiff_lzw', 'tiff_adobe_deflate', 'auto'):
+        assert not report.needs_bigtiff(compression)
+    assert report.output_bytes('jpeg') < 100 * 1024 * 1024
+    assert report.needs_bigtiff('raw')
+
+
+def test_preflight_excel(tmp_path):
+    excel_path = str(tmp_path / "data.xlsx")
+    pd.DataFrame({'编号': [f"A{i}" for i in range(30)], '值': range(30), '备注': ['x'] * 30}) \
+        .to_excel(excel_path, index=False)
+
+    report = preflight_excel(excel_path, 'Sheet1')
+    assert (report.rows, report.columns) == (30, ['编号', '值', '备注'])
+    assert report.supports_streaming
+    # 行数很多时流式读取的内存远小于一次读取整张 sheet
+    large = dataclasses.replace(report, rows=1_000_000)
+    assert large.peak_rss_bytes(streaming=True) < large.peak_rss_bytes(streaming=False)
+    assert large.peak_rss_bytes(workers=4) > large.peak_rss_bytes()
+
+    output_dir = tmp_path / "rows"
+    excel_to_img.generate_images(excel_path, 'Sheet1', str(output_dir), naming_field='编号')
+    with Image.open(output_dir / "A0.png") as img:
+        # 高度主要取决于列数，各行字形不同只会相差几个像素
+        assert abs(img.height - report.image_size[1]) <= 2 * len(report.columns)
+
+    with pytest.raises(ValueError):
+        preflight_excel(excel_path, 'Missing')
+
+
+def test_memory_helpers():
+    assert fits_in_memory(10, budget=100)
+    assert not fits_in_memory(1000, budget=100)
+    assert format_bytes(512) == "512B"
+    assert format_bytes(3 * 1024 * 1024) == "3.0MB"
@@ -0,0 +1,122 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+from PIL import Image
+
+from core.common.pipeline import ordered_map
+from core.common.scheduler import ResourceScheduler
+from core.excel_to_img import excel_to_img
+from core.image_to_tif import image_to_tif
+
+
+def _wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.01)
+
+
+def test_scheduler_applies_backpressure():
+    scheduler = ResourceScheduler(memory_bytes=100, slots=4)
+    first = scheduler.acquire(60)
+    assert scheduler.acquire(60, block=False) is None
+
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(scheduler.acquire(60)))
+    waiter.start()
+    _wait_until(lambda: scheduler.stats()['queued'] == 1)
+    # 已有请求在排队时，即使放得下的小任务也不能插队
+    assert scheduler.acquire(10, block=False) is None
+
+    first.release()
+    waiter.join(5)
+    stats = scheduler.stats()
+    assert (stats['queued'], stats['running'], stats['reserved_bytes']) == (0, 1, 60)
+    assert stats['blocked'] == 3 and stats['admitted'] == 2
+    admitted[0].release()
+
+    # 超出整个预算的任务在没有其他任务运行时单独放行
+    with scheduler.reserve(500):
+        assert scheduler.acquire(1, block=False) is None
+    assert scheduler.stats()['running'] == 0
+    assert scheduler.stats()['peak_reserved_bytes'] == 500
+
+
+def test_scheduler_limits_slots():
+    scheduler = ResourceScheduler(slots=2)
+    held = [scheduler.acquire(0), scheduler.acquire(0)]
+    assert scheduler.acquire(0, block=False) is None
+    held[0].release()
+    held[0].release()  # 重复释放不影响计数
+    assert scheduler.acquire(0, block=False) is not None
+    assert scheduler.stats()['running'] == 2
+
+
+def _square(value):
+    time.sleep(0.01)
+    return value * value
+
+
+@pytest.mark.parametrize("memory_bytes", [1, 25, None])
+def test_ordered_map_admits_against_budget(memory_bytes):
+    scheduler = ResourceScheduler(memory_bytes=memory_bytes, slots=8)
+    results = ordered_map(_square, range(20), workers=4, executor_cls=ThreadPoolExecutor,
+                          admit=lambda item, block: scheduler.acquire(10, block))
+    assert list(results) == [value * value for value in range(20)]
+
+    stats = scheduler.stats()
+    assert (stats['running'], stats['reserved_bytes'], stats['admitted']) == (0, 0, 20)
+    if memory_bytes is not None:
+        # 预算不足一个任务时逐个运行，否则同时运行的任务之和不超过预算
+        assert stats['peak_reserved_bytes'] == max(10, memory_bytes // 10 * 10)
+
+
+@pytest.mark.parametrize("options, admitted", [
+    ({}, 5),
+    ({'workers': 2}, 5),
+    ({'tile_size': 64}, 5),
+    ({'streaming': False}, 1),
+])
+def test_merge_admits_pages(sample_paths, tmp_path, options, admitted):
+    expected = str(tmp_path / "expected.tif")
+    image_to_tif.merge_images_to_tif(sample_paths, expected, compression='tiff_lzw', **options)
+
+    # 预算小于任何一页时每页单独运行，输出不变
+    scheduler = ResourceScheduler(memory_bytes=1)
+    output = str(tmp_path / "out.tif")
+    image_to_tif.merge_images_to_tif(sample_paths, output, compression='tiff_lzw', scheduler=scheduler, **options)
+    with open(output, 'rb') as f, open(expected, 'rb') as g:
+        assert f.read() == g.read()
+
+    stats = scheduler.stats()
+    assert stats['admitted'] == admitted
+    assert stats['running'] == 0
+    # 每页的估计至少包含解码后的像素
+    assert stats['peak_reserved_bytes'] >= 400 * 300 * 3
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_generate_images_admits_chunks(tmp_path, workers):
+    excel_path = str(tmp_path / "data.xlsx")
+    pd.DataFrame({'编号': [f"A{i}" for i in range(5)], '值': range(5)}).to_excel(excel_path, index=False)
+
+    scheduler = ResourceScheduler(memory_bytes=1)
+    output_dir = tmp_path / "rows"
+    excel_to_img.generate_images(excel_path, 'Sheet1', str(output_dir), naming_field='编号', workers=workers,
+                                 chunk_size=2, scheduler=scheduler)
+    assert len(os.listdir(output_dir)) == 5
+
+    stats = scheduler.stats()
+    assert (stats['admitted'], stats['running']) == (3, 0)
+    with Image.open(output_dir / "A0.png") as img:
+        # 渲染前的估计不小于实际图片
+        assert stats['peak_reserved_bytes'] >= 3 * img.width * img.height * 3
@@ -0,0 +1,61 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+
+import pandas as pd
+import pytest
+
+from core.common.telemetry import Telemetry
+from core.excel_to_img import excel_to_img
+from core.image_to_tif import image_to_tif
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_merge_records_stages(sample_paths, tmp_path, workers):
+    output = str(tmp_path / "out.tif")
+    telemetry = Telemetry()
+    image_to_tif.merge_images_to_tif(sample_paths, output, compression='tiff_lzw', workers=workers,
+                                     telemetry=telemetry)
+
+    stages = telemetry.summary()['stages']
+    assert {'open', 'decode', 'rasterize', 'convert', 'encode', 'write'} <= set(stages)
+    assert stages['encode']['count'] == 5
+    assert stages['write']['bytes'] > 0
+    assert telemetry.summary()['peak_rss_bytes'] is None or telemetry.summary()['peak_rss_bytes'] > 0
+
+    trace_path = str(tmp_path / "trace.json")
+    telemetry.write_chrome_trace(trace_path)
+    with open(trace_path, encoding='utf-8') as f:
+        events = json.load(f)['traceEvents']
+    spans = [e for e in events if e['ph'] == 'X']
+    assert len(spans) == sum(stat['count'] for stat in stages.values())
+    assert all(e['dur'] >= 0 for e in spans)
+    assert {e['args']['page'] for e in spans if e['name'] == 'encode'} == {0, 1, 2, 3, 4}
+
+
+def test_merge_without_telemetry_matches(sample_paths, tmp_path):
+    plain = str(tmp_path / "plain.tif")
+    traced = str(tmp_path / "traced.tif")
+    image_to_tif.merge_images_to_tif(sample_paths, plain, compression='tiff_lzw')
+    image_to_tif.merge_images_to_tif(sample_paths, traced, compression='tiff_lzw', telemetry=Telemetry())
+    with open(plain, 'rb') as a, open(traced, 'rb') as b:
+        assert a.read() == b.read()
+
+
+@pytest.mark.parametrize("workers,streaming", [(1, False), (2, False), (1, True)])
+def test_generate_images_records_stages(tmp_path, workers, streaming):
+    excel_path = str(tmp_path / "data.xlsx")
+    pd.DataFrame({'编号': ['A', 'B', 'C'], '值': [1, 2, 3]}).to_excel(excel_path, index=False)
+    output_dir = tmp_path / "rows"
+    telemetry = Telemetry()
+    excel_to_img.generate_images(excel_path, 'Sheet1', str(output_dir), naming_field='编号', workers=workers,
+                                 chunk_size=1, streaming=streaming, telemetry=telemetry)
+
+    stages = telemetry.summary()['stages']
+    assert {'read', 'prepare', 'render', 'encode', 'write'} <= set(stages)
+    assert stages['render']['count'] == 3
+    assert stages['write']['bytes'] == sum(p.stat().st_size for p in output_dir.iterdir())
@@ -0,0 +1,74 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image
+
+from core.common.thumbnail_cache import ThumbnailCache
+
+
+def test_cache_hit_and_invalidation(tmp_path):
+    path = str(tmp_path / "scan.png")
+    Image.new('RGB', (800, 600), (255, 0, 0)).save(path)
+    cache = ThumbnailCache(str(tmp_path / "cache"))
+
+    thumb = cache.get(path, (100, 100))
+    assert thumb.size == (100, 75)
+    # 新实例只能从磁盘命中
+    assert ThumbnailCache(str(tmp_path / "cache")).get(path, (100, 100)).getpixel((0, 0)) == (255, 0, 0)
+
+    Image.new('RGB', (800, 600), (0, 0, 255)).save(path)
+    os.utime(path, ns=(0, 10 ** 18))
+    assert cache.get(path, (100, 100)).getpixel((0, 0)) == (0, 0, 255)
+
+
+def test_disk_eviction(tmp_path):
+    cache = ThumbnailCache(str(tmp_path / "cache"), max_bytes=4000, memory_items=1)
+    for i in range(20):
+        path = str(tmp_path / f"{i}.png")
+        Image.effect_noise((64, 64), 50).save(path)
+        cache.get(path, (64, 64))
+
+    total = sum(os.path.getsize(os.path.join(root, name))
+                for root, _, names in os.walk(tmp_path / "cache") for name in names)
+    assert total <= 4000
+
+
+def test_memory_cache_is_bounded_by_bytes(tmp_path):
+    cache = ThumbnailCache(str(tmp_path / "cache"), memory_bytes=3 * 200 * 150 * 3)
+    for i in range(6):
+        path = str(tmp_path / f"{i}.png")
+        Image.new('RGB', (400, 300), (i, 0, 0)).save(path)
+        cache.get(path, (200, 200))
+    # 每张 200x150 的 RGB 缩略图占 90000 字节，预算内只保留最近的 3 张
+    assert len(cache._memory) == 3 and cache._memory_used == 3 * 200 * 150 * 3
+
+
+def test_service_delivers_and_cancels(tmp_path):
+    import threading
+    from core.common.thumbnail_service import ThumbnailService
+
+    paths = []
+    for i in range(6):
+        path = str(tmp_path / f"{i}.png")
+        Image.new('RGB', (300, 200), (i, 0, 0)).save(path)
+        paths.append(path)
+
+    service = ThumbnailService(ThumbnailCache(str(tmp_path / "cache")), workers=1)
+    results = {}
+    finished = threading.Event()
+
+    def callback(request, image, error):
+        results[request.path] = image.size
+        if len(results) == 5:
+            finished.set()
+
+    requests = [service.request(path, (30, 30), callback) for path in paths]
+    service.cancel(requests[-1])
+    assert finished.wait(10)
+    service.shutdown(wait=True)
+
+    assert set(results) == set(paths[:5])
+    assert results[paths[0]] == (30, 20)